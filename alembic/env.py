@@ -25,6 +25,11 @@ logger = logging.getLogger('alembic.env')
 from db import models
 target_metadata = models.Base.metadata
 
+
+def include_object(object, name, type_, reflected, compare_to):
+    """Leave the full-text search table (and its shadow tables) alone in autogenerate."""
+    return not (type_ == 'table' and name.startswith(models.LINES_FTS_TABLE))
+
 # other values from the config, defined by the needs of env.py,
 # can be acquired:
 # my_important_option = config.get_main_option("my_important_option")
@@ -46,7 +51,8 @@ def run_migrations_offline():
     """
     url = config.get_main_option("sqlalchemy.url")
     context.configure(
-        url=url, target_metadata=target_metadata, literal_binds=True)
+        url=url, target_metadata=target_metadata, literal_binds=True,
+        include_object=include_object)
 
     with context.begin_transaction():
         context.run_migrations()
@@ -79,6 +85,7 @@ def run_migrations_online():
             connection=connection,
             target_metadata=target_metadata,
             process_revision_directives=process_revision_directives,
+            include_object=include_object,
             **current_app.extensions['migrate'].configure_args
         )
 
@@ -0,0 +1,36 @@
+"""lines text search
+
+Revision ID: d41f8e2b6c57
+Revises: b7e21c4d9a30
+Create Date: 2026-10-18 15:21:09.804416
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd41f8e2b6c57'
+down_revision = 'b7e21c4d9a30'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'sqlite':
+        op.execute("CREATE VIRTUAL TABLE lines_fts "
+                   "USING fts5(text, line_id UNINDEXED, tokenize='porter unicode61')")
+        op.execute("INSERT INTO lines_fts (line_id, text) SELECT id, text FROM lines")
+    elif dialect == 'postgresql':
+        op.create_index('ix_lines_text_search', 'lines',
+                        [sa.text("to_tsvector('english', coalesce(text, ''))")],
+                        postgresql_using='gin')
+
+
+def downgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'sqlite':
+        op.execute("DROP TABLE lines_fts")
+    elif dialect == 'postgresql':
+        op.drop_index('ix_lines_text_search', table_name='lines')
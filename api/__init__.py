@@ -1,20 +1,101 @@
+import json
+
+import click
 from flask_migrate import Migrate
 from flask_sqlalchemy import SQLAlchemy
 
+from api.database import RoutingSession
 from config import Config
-from db.models import Base
+from db.models import Base, Line
 
-fdb = SQLAlchemy(model_class=Base)
+fdb = SQLAlchemy(model_class=Base, session_options={'class_': RoutingSession})
 migrate = Migrate(directory='alembic')
 
 # pylint: disable=wrong-import-position, ungrouped-imports
 from api.factory import create_app
-from db.seed import main as seed
+from db.bulk import DEFAULT_BATCH_SIZE
+from db.corpus import Corpus
+from db.instrument import SeedMetrics
+from db.seed import DEFAULT_SEED_MODE, SEED_MODES, main as seed, dedupe
+from db.snapshot_file import write_snapshot
+from db.stats import rebuild_stats
 
 app = create_app(config=Config)
 
 
 @app.cli.command('seed')
-def command_seed():
-    seed()
+@click.option('--mode', type=click.Choice(SEED_MODES),
+              help='incremental: bulk insert changed corpus files with checkpoints, '
+                   'bulk: bulk insert everything in one transaction, orm: session based inserts '
+                   f'[default: {DEFAULT_SEED_MODE}, required with --benchmark].')
+@click.option('--batch-size', default=DEFAULT_BATCH_SIZE, show_default=True,
+              help='Rows per bulk insert batch.')
+@click.option('--workers', default=1, show_default=True,
+              help='Parse the corpus files on a process pool (bulk and incremental mode).')
+@click.option('--metrics', 'metrics_file', type=click.Path(dir_okay=False, writable=True),
+              help='Write timing, throughput, memory and statement counts of every step as JSON.')
+@click.option('--benchmark', is_flag=True,
+              help='Seed a throwaway database and compare the metrics with the stored baseline.')
+@click.option('--benchmark-database-uri',
+              help='Throwaway database of the benchmark [default: temporary SQLite].')
+@click.option('--baseline', type=click.Path(dir_okay=False),
+              help='Baseline file of the benchmark [default: benchmarks/seed_baseline.json].')
+@click.option('--tolerance', type=float,
+              help='Allowed relative throughput and memory regression of the benchmark '
+                   '[default: 0.25].')
+@click.option('--update-baseline', is_flag=True,
+              help='Store the benchmark result as the new baseline.')
+def command_seed(mode, batch_size, workers, metrics_file, benchmark, benchmark_database_uri,
+                 baseline, tolerance, update_baseline):
+    if benchmark:
+        if mode is None:
+            raise click.UsageError("--benchmark needs --mode, baselines are stored per mode.")
+        # Only imported when used, the app does not depend on the benchmarks
+        # pylint: disable-next=import-outside-toplevel
+        from benchmarks.seed import benchmark as run_seed_benchmark
+        options = {'baseline_path': baseline, 'tolerance': tolerance}
+        regressions = run_seed_benchmark(mode, benchmark_database_uri, batch_size, workers,
+                                         update_baseline=update_baseline,
+                                         **{k: v for k, v in options.items() if v is not None})
+        if regressions:
+            raise click.ClickException(
+                f"Ingest benchmark failed against the baseline: {'; '.join(regressions)}")
+        return
+
+    metrics = seed(mode=mode or DEFAULT_SEED_MODE, batch_size=batch_size, workers=workers,
+                   metrics=SeedMetrics() if metrics_file else None)
+    if metrics_file:
+        with open(metrics_file, 'w') as f:
+            f.write(metrics.to_json(indent=2))
     print("Corpus data added to database.")
+
+
+@app.cli.command('dedupe')
+@click.option('--dry-run', is_flag=True, help='Only report the duplicate characters.')
+def command_dedupe(dry_run):
+    report = dedupe(dry_run=dry_run)
+    print(json.dumps(report, indent=2))
+
+
+@app.cli.command('build-snapshot')
+@click.option('--output', type=click.Path(dir_okay=False, writable=True),
+              default=Config.SNAPSHOT_PATH, required=Config.SNAPSHOT_PATH is None,
+              show_default=True, help='Snapshot file to write.')
+def command_build_snapshot(output):
+    """Compile the seeded database into a snapshot file that the API serves with SNAPSHOT_PATH."""
+    with fdb.engine.connect() as connection:
+        corpus = Corpus.load(connection)
+    write_snapshot(corpus, output)
+    print(f"Snapshot of {len(corpus.tables[Line])} lines written to {output}.")
+
+
+@app.cli.command('build-stats')
+def command_build_stats():
+    """
+    Rebuild the aggregate tables of /api/stats from the seeded database.
+
+    The seed does so when the corpus changes.
+    """
+    with fdb.engine.begin() as connection:
+        counts = rebuild_stats(connection)
+    print(', '.join(f"{count} rows in {table}" for table, count in counts.items()) + '.')
@@ -0,0 +1,352 @@
+"""
+ASGI application of the API, with async views of the routes blueprint.
+
+Requests are matched, parsed and answered by the Flask app (URL rules,
+?fields=, errors, before and after request hooks, JSON encoding), only the
+views of the routes blueprint are replaced by coroutines that query the
+database on an asyncio engine and run independent queries concurrently. A
+worker thus keeps serving other requests while it waits for the database.
+Endpoints without an async view are handled by their Flask view in a thread.
+
+Run it with an ASGI server, e.g. uvicorn api.asgi:app.
+"""
+import asyncio
+import contextvars
+import io
+import sys
+from contextlib import aclosing
+
+from flask import Response, abort, current_app, jsonify, request
+from sqlalchemy import select
+
+from api import app as wsgi_app
+from api.async_queries import (
+    COUNT_METHODS,
+    AsyncDatabase,
+    fetch_page,
+    fetch_records,
+    fieldset_select,
+)
+from api.blueprints.routes import (
+    batch_response,
+    dialog_select,
+    movies_cursor_page,
+    movies_page,
+    requested_count_method,
+    requested_cursor,
+    requested_ids,
+    requested_limit,
+    requested_start,
+)
+from api.cache import cached_async_response
+from api.database import engine_options
+from api.factory import create_app
+from api.fieldsets import Fieldset, requested_fieldset
+from api.serializers import serializer_for
+from api.snapshot import current_snapshot
+from api.streaming import NDJSON_MIMETYPE, ndjson_chunk, wants_ndjson
+from db.models import Character, Conversation, Genre, Line, Movie
+
+ASYNC_VIEWS = {}
+
+
+def async_view(endpoint):
+    """Register a coroutine as the async view of a Flask endpoint."""
+    def decorator(view):
+        ASYNC_VIEWS[endpoint] = view
+        return view
+    return decorator
+
+
+class AsyncStreamResponse(Response):
+    """A response whose body is sent from an async iterator of str chunks, see AsyncApp.body."""
+
+    def __init__(self, chunks, **kwargs):
+        super().__init__((), **kwargs)
+        self.chunks = chunks
+
+
+async def run_in_thread(context, func, *args):
+    """Call func in a worker thread within context, like asyncio.to_thread with a given context."""
+    return await asyncio.get_running_loop().run_in_executor(None, context.run, func, *args)
+
+
+def wsgi_environ(scope):
+    """The WSGI environ of the HTTP request of an ASGI scope (without a body)."""
+    server_name, server_port = scope.get('server') or ('localhost', 80)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode().decode('latin-1'),
+        'PATH_INFO': scope['path'].encode().decode('latin-1'),
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+        'SERVER_NAME': server_name,
+        'SERVER_PORT': str(server_port),
+        'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    if scope.get('client'):
+        environ['REMOTE_ADDR'] = scope['client'][0]
+    for name, value in scope.get('headers', ()):
+        name = name.decode('latin-1').upper().replace('-', '_')
+        if name not in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+            name = f'HTTP_{name}'
+        value = value.decode('latin-1')
+        environ[name] = f'{environ[name]},{value}' if name in environ else value
+    return environ
+
+
+class AsyncApp:
+    """ASGI application serving a Flask app of create_app, see the module docstring."""
+
+    def __init__(self, app):
+        self.app = app
+        self._db = None
+
+    @property
+    def db(self):
+        """The AsyncDatabase of ASYNC_DATABASE_URI, created on first use."""
+        if self._db is None:
+            config = self.app.config
+            uri = config['ASYNC_DATABASE_URI'] or config['SQLALCHEMY_DATABASE_URI']
+            self._db = AsyncDatabase(uri, **engine_options(config, uri, poolclass=None))
+        return self._db
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self.lifespan(receive, send)
+        elif scope['type'] == 'http':
+            await self.http(scope, send)
+        else:
+            raise ValueError(f"Unsupported ASGI scope type {scope['type']!r}")
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                if self._db is not None:
+                    await self._db.dispose()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def http(self, scope, send):
+        ctx = self.app.request_context(wsgi_environ(scope))
+        ctx.push()
+        try:
+            view = ASYNC_VIEWS.get(request.endpoint)
+            # Threads of a regular view share one copy of the request context,
+            # its streamed body may leave the context it was generated in
+            context = None
+            if current_snapshot() is not None:
+                # Nothing to wait for, the corpus is in memory
+                response = self.app.full_dispatch_request()
+            elif view is not None:
+                response = await self.dispatch(view)
+            else:
+                context = contextvars.copy_context()
+                response = await run_in_thread(context, self.app.full_dispatch_request)
+            try:
+                await send({
+                    'type': 'http.response.start',
+                    'status': response.status_code,
+                    'headers': [(name.lower().encode('latin-1'), value.encode('latin-1'))
+                                for name, value in response.headers.items()],
+                })
+                async for chunk in self.body(response, context):
+                    await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+                await send({'type': 'http.response.body', 'body': b''})
+            finally:
+                if context is None:
+                    response.close()
+                else:
+                    await run_in_thread(context, response.close)
+        finally:
+            ctx.pop()
+
+    @staticmethod
+    async def body(response, context):
+        """
+        The encoded chunks of the body of response, each sent as soon as it is produced.
+
+        The chunks of a regular view are generated in a worker thread within
+        context (None to generate them on the event loop).
+        """
+        if isinstance(response, AsyncStreamResponse):
+            async with aclosing(response.chunks) as chunks:
+                async for chunk in chunks:
+                    yield chunk.encode()
+        elif context is None:
+            for chunk in response.iter_encoded():
+                yield chunk
+        else:
+            chunks = response.iter_encoded()
+            while (chunk := await run_in_thread(context, next, chunks, None)) is not None:
+                yield chunk
+
+    async def dispatch(self, view):
+        """Like Flask.wsgi_app and full_dispatch_request, with an awaited view."""
+        app = self.app
+        try:
+            try:
+                rv = app.preprocess_request()
+                if rv is None:
+                    rv = await view(self.db, **request.view_args)
+            except Exception as e:  # pylint: disable=broad-except
+                rv = app.handle_user_exception(e)
+            response = app.finalize_request(rv)
+        except Exception as e:  # pylint: disable=broad-except
+            response = app.handle_exception(e)
+        return response
+
+
+async def records_by_id(db, fieldset, ids):
+    records = await fetch_records(db, fieldset, fieldset.model.id.in_(ids))
+    return {record['id']: record for record in records}
+
+
+async def record_or_404(db, fieldset, entity_id):
+    records = await fetch_records(db, fieldset, fieldset.model.id == entity_id)
+    if not records:
+        abort(404)
+    return records[0]
+
+
+async def ndjson_chunks(batches, serialize):
+    """The chunks of a newline delimited JSON body of the row lists of db.stream."""
+    async with aclosing(batches):
+        async for rows in batches:
+            yield ndjson_chunk(rows, serialize)
+
+
+async def lines_response(db, model, entity_id, criterion):
+    """
+    The lines of a movie or conversation.
+
+    JSON lines are selected concurrently with the check that the movie or
+    conversation exists. NDJSON lines are streamed after the check, a batch
+    of STREAM_BATCH_SIZE rows at a time.
+    """
+    serializer = serializer_for(Line)
+    exists = select(model.id).where(model.id == entity_id)
+    lines = dialog_select(model, serializer, criterion)
+    if wants_ndjson():
+        if await db.scalar(exists) is None:
+            abort(404)
+        batches = db.stream(lines, current_app.config['STREAM_BATCH_SIZE'])
+        return AsyncStreamResponse(ndjson_chunks(batches, serializer.from_row),
+                                   mimetype=NDJSON_MIMETYPE)
+
+    exists, rows = await db.gather(exists, lines)
+    if not exists:
+        abort(404)
+    return jsonify([serializer.from_row(row) for row in rows])
+
+
+async def count_movies(db, method='exact'):
+    return await COUNT_METHODS[method](db, Movie)
+
+
+@async_view('routes.get_characters')
+async def get_characters(db):
+    ids = requested_ids()
+    return batch_response(await records_by_id(db, requested_fieldset(Character), ids), ids)
+
+
+@async_view('routes.get_character')
+@cached_async_response
+async def get_character(db, character_id):
+    return jsonify(await record_or_404(db, requested_fieldset(Character), character_id))
+
+
+@async_view('routes.get_conversations')
+async def get_conversations(db):
+    ids = requested_ids(int)
+    return batch_response(await records_by_id(db, requested_fieldset(Conversation), ids), ids)
+
+
+@async_view('routes.get_conversation')
+async def get_conversation(db, conversation_id):
+    return jsonify(await record_or_404(db, requested_fieldset(Conversation), conversation_id))
+
+
+@async_view('routes.get_conversation_lines')
+@cached_async_response
+async def get_conversation_lines(db, conversation_id):
+    return await lines_response(db, Conversation, conversation_id,
+                                Line.conversation_id == conversation_id)
+
+
+@async_view('routes.get_genre')
+async def get_genre(db, genre_id):
+    return jsonify(await record_or_404(db, Fieldset(Genre), genre_id))
+
+
+@async_view('routes.get_lines')
+async def get_lines(db):
+    ids = requested_ids()
+    return batch_response(await records_by_id(db, Fieldset(Line), ids), ids)
+
+
+@async_view('routes.get_line')
+async def get_line(db, line_id):
+    return jsonify(await record_or_404(db, Fieldset(Line), line_id))
+
+
+@async_view('routes.get_movie')
+@cached_async_response
+async def get_movie(db, movie_id):
+    return jsonify(await record_or_404(db, requested_fieldset(Movie), movie_id))
+
+
+@async_view('routes.get_movie_lines')
+async def get_movie_lines(db, movie_id):
+    return await lines_response(db, Movie, movie_id, Line.movie_id == movie_id)
+
+
+@async_view('routes.get_movies')
+async def get_movies(db):
+    fieldset = requested_fieldset(Movie)
+    if 'ids' in request.args:
+        ids = requested_ids()
+        return batch_response(await records_by_id(db, fieldset, ids), ids)
+
+    limit = requested_limit()
+    if 'after' in request.args:
+        return await get_movies_after(db, limit, fieldset)
+
+    start = requested_start()
+    movies_data, total_items = await asyncio.gather(
+        fetch_page(db, fieldset,
+                   fieldset_select(fieldset).order_by(Movie.id).offset(start).limit(limit)),
+        count_movies(db),
+    )
+    return movies_page(movies_data, start, limit, total_items)
+
+
+async def get_movies_after(db, limit, fieldset):
+    last_id = requested_cursor()
+    count = requested_count_method()
+
+    # One extra row tells whether there is a next page
+    statement = fieldset_select(fieldset).order_by(Movie.id).limit(limit + 1)
+    if last_id is not None:
+        statement = statement.where(Movie.id > last_id)
+    if count is None:
+        return movies_cursor_page(await fetch_page(db, fieldset, statement), limit)
+    movies_data, total_items = await asyncio.gather(
+        fetch_page(db, fieldset, statement), count_movies(db, count))
+    return movies_cursor_page(movies_data, limit, total_items)
+
+
+def create_asgi_app(config):
+    return AsyncApp(create_app(config))
+
+
+app = AsyncApp(wsgi_app)
@@ -0,0 +1,161 @@
+"""Queries of the async views on an asyncio engine (aiosqlite or asyncpg)."""
+import asyncio
+import time
+from collections import defaultdict
+
+from flask import current_app
+from sqlalchemy import func, select, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from api.serializers import serializer_for
+
+ASYNC_DRIVERS = {
+    'sqlite': 'aiosqlite',
+    'postgresql': 'asyncpg',
+}
+
+
+def async_database_uri(uri):
+    """The URI of uri's database with its asyncio driver, e.g. sqlite+aiosqlite:// for sqlite://."""
+    url = make_url(uri)
+    backend = url.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise ValueError(f"No asyncio driver for {backend} databases, "
+                         f"choose one of {', '.join(ASYNC_DRIVERS)}")
+    return url.set(drivername=f'{backend}+{ASYNC_DRIVERS[backend]}')
+
+
+class AsyncDatabase:
+    """
+    Execute statements on an async engine.
+
+    Every statement gets its own pooled connection, so that independent
+    statements can run concurrently with gather().
+    """
+
+    def __init__(self, uri, **engine_options):
+        self.engine = create_async_engine(async_database_uri(uri), **engine_options)
+
+    @property
+    def dialect_name(self):
+        return self.engine.dialect.name
+
+    async def all(self, statement, parameters=None):
+        async with self.engine.connect() as connection:
+            result = await connection.execute(statement, parameters)
+            return result.all()
+
+    async def stream(self, statement, batch_size):
+        """The rows of statement in lists of batch_size, fetched with a server side cursor."""
+        async with self.engine.connect() as connection:
+            result = await connection.stream(statement.execution_options(yield_per=batch_size))
+            async for rows in result.partitions():
+                yield rows
+
+    async def scalar(self, statement, parameters=None):
+        rows = await self.all(statement, parameters)
+        return rows[0][0] if rows else None
+
+    async def gather(self, *statements):
+        """The rows of each statement, executed concurrently."""
+        return await asyncio.gather(*(self.all(statement) for statement in statements))
+
+    async def dispose(self):
+        await self.engine.dispose()
+
+
+def fieldset_select(fieldset):
+    """Select the columns of fieldset, as rows in the order of its fields."""
+    return select(*(getattr(fieldset.model, field) for field in fieldset.fields))
+
+
+def include_select(fieldset, include, *criteria):
+    """
+    Select the related rows of an include for the entities matching criteria.
+
+    The first column is the ID of the entity a row belongs to, the others are
+    the columns the include serializes (as attributes of the row), in the
+    order of the relationship.
+    """
+    model = fieldset.model
+    target = include.relationship.property.mapper.class_
+    columns = include.load or serializer_for(target).columns
+    return (
+        select(model.id.label('parent_id'), *columns)
+        .select_from(model)
+        .join(include.relationship)
+        .where(*criteria)
+        .order_by(*include.relationship.property.order_by or ())
+    )
+
+
+def attach_includes(fieldset, rows, related):
+    """Records of the fieldset's rows with the related rows of each include."""
+    records = [dict(zip(fieldset.fields, row)) for row in rows]
+    for (name, include), include_rows in zip(fieldset.includes.items(), related):
+        by_parent = defaultdict(list)
+        for row in include_rows:
+            by_parent[row[0]].append(row)
+        for record in records:
+            record[name] = include.serialize(by_parent.get(record['id'], ()))
+    return records
+
+
+async def fetch_records(db, fieldset, *criteria):
+    """
+    Records of fieldset matching criteria.
+
+    The columns and every included relationship are selected concurrently,
+    each with a statement of its own that repeats the criteria.
+    """
+    statements = [fieldset_select(fieldset).where(*criteria)]
+    statements += [
+        include_select(fieldset, include, *criteria) for include in fieldset.includes.values()
+    ]
+    rows, *related = await db.gather(*statements)
+    return attach_includes(fieldset, rows, related)
+
+
+async def fetch_page(db, fieldset, statement):
+    """
+    Records of the rows of statement (a fieldset_select with offset, limit or order).
+
+    The relationships of the page are selected concurrently once its IDs are known.
+    """
+    rows = await db.all(statement)
+    ids = [row[0] for row in rows]
+    related = await db.gather(*(
+        include_select(fieldset, include, fieldset.model.id.in_(ids))
+        for include in fieldset.includes.values()
+    ))
+    return attach_includes(fieldset, rows, related)
+
+
+async def cached_count(db, model):
+    """Exact number of rows of a model, cached in the cache of api.pagination.cached_count."""
+    cache = current_app.extensions.setdefault('row_counts', {})
+    table_name = model.__table__.name
+    count, expires = cache.get(table_name, (None, 0))
+    if count is None or expires < time.monotonic():
+        count = await db.scalar(select(func.count()).select_from(model))
+        cache[table_name] = (count, time.monotonic() + current_app.config['COUNT_CACHE_TTL'])
+    return count
+
+
+async def estimated_count(db, model):
+    """Planner estimate of the number of rows on PostgreSQL, the cached exact count elsewhere."""
+    if db.dialect_name == 'postgresql':
+        estimate = await db.scalar(
+            text('SELECT reltuples FROM pg_class WHERE oid = CAST(:table AS regclass)'),
+            {'table': model.__table__.name}
+        )
+        if estimate is not None and estimate >= 0:
+            return int(estimate)
+    return await cached_count(db, model)
+
+
+COUNT_METHODS = {
+    'exact': cached_count,
+    'estimate': estimated_count,
+}
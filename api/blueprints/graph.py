@@ -0,0 +1,32 @@
+from flask import Blueprint, abort, jsonify
+
+from api.conditional import add_cache_headers, load_validators
+from api.indexes import current_index
+from config import API_BASE_PATH
+
+bp = Blueprint('graph', __name__, url_prefix=API_BASE_PATH)
+bp.before_request(load_validators)
+bp.after_request(add_cache_headers)
+
+
+@bp.route('/movies/<string:movie_id>/graph', methods=['GET'])
+def get_movie_graph(movie_id):
+    """
+    The characters of a movie (nodes) and who talks to whom (edges).
+
+    Every edge has the number of conversations and lines the two characters
+    share and is listed once, from the character with the lower ID.
+    """
+    graph = current_index('character_graph').movie_graph(movie_id)
+    if graph is None:
+        abort(404)
+    return jsonify(dict(graph, movie_id=movie_id))
+
+
+@bp.route('/characters/<string:character_id>/neighbors', methods=['GET'])
+def get_character_neighbors(character_id):
+    """The conversation partners of a character, most conversations first."""
+    neighbors = current_index('character_graph').neighbors(character_id)
+    if neighbors is None:
+        abort(404)
+    return jsonify({'id': character_id, 'neighbors': neighbors})
@@ -0,0 +1,27 @@
+from flask import Blueprint, current_app, jsonify
+
+from api import fdb
+from api.database import pool_status
+
+from config import API_BASE_PATH
+
+bp = Blueprint('metrics', __name__, url_prefix=API_BASE_PATH)
+
+
+@bp.route('/metrics/cache', methods=['GET'])
+def get_cache_metrics():
+    """Hit, miss and eviction counters and the size of the response cache."""
+    cache = current_app.extensions['response_cache']
+    if cache is None:
+        return jsonify({'enabled': False})
+    return jsonify(dict(cache.stats(), enabled=True))
+
+
+@bp.route('/metrics/pools', methods=['GET'])
+def get_pool_metrics():
+    """Utilization and checkout waits of the connection pools of the primary and the replicas."""
+    replicas = current_app.extensions['replicas']
+    return jsonify({
+        'primary': pool_status(fdb.engine),
+        'replicas': replicas.status() if replicas is not None else {},
+    })
@@ -1,6 +1,13 @@
-from flask import Blueprint, request, jsonify, url_for
-from sqlalchemy import inspect
-
+from flask import Blueprint, abort, current_app, request, jsonify, url_for
+from api import fdb
+from api.cache import cached_response
+from api.conditional import add_cache_headers, load_validators
+from api.database import use_replica
+from api.fieldsets import Fieldset, requested_fieldset
+from api.serializers import serializer_for
+from api.snapshot import current_snapshot
+from api.streaming import ndjson_response, stream_rows, wants_ndjson
+from api.pagination import COUNT_METHODS, decode_cursor, encode_cursor
 from config import API_BASE_PATH
 from db.models import (
     Character,
@@ -10,89 +17,298 @@ from db.models import (
     Movie,
 )
 
+# Integers a SQL BIGINT holds, larger ones cannot even be compared by the database
+BIGINT_RANGE = range(-1 << 63, 1 << 63)
+BIGINT_MAX = BIGINT_RANGE.stop - 1
+
 bp = Blueprint('routes', __name__, url_prefix=API_BASE_PATH)
+bp.before_request(use_replica)
+bp.before_request(load_validators)
+bp.after_request(add_cache_headers)
 
 
-def collect_movie_data(movie):
-    data = object_as_dict(movie)
-    related_data = {
-        'characters': [object_as_dict(char) for char in movie.characters],
-        'conversations': [c.id for c in movie.conversations],
-        'genres': [g.name for g in movie.genres],
-    }
-    data.update(related_data)
-    return data
+def movie_query(fieldset=None):
+    """
+    Query movies with everything collect_movie_data needs for fieldset.
 
+    Relationships are loaded with one query each for all movies of the result
+    (conversations with their IDs only), instead of three queries per movie.
+    By default the movies include their characters, conversations and genres.
+    """
+    return (fieldset or Fieldset(Movie)).query()
 
-def object_as_dict(obj):
+
+def collect_movie_data(movie, fieldset=None):
+    return (fieldset or Fieldset(Movie)).serialize(movie)
+
+
+def requested_ids(id_type=str):
     """
-    Convert sqlalchemy row object to python dict.
+    Return the IDs of a batch request (?ids=a,b,c) in the requested order, without repetitions.
 
-    Reference: https://stackoverflow.com/a/37350445/8074325
+    Aborts with 400 if there are none, more than MAX_BATCH_SIZE or if one is not of id_type
+    (integers also outside of BIGINT_RANGE).
     """
-    return {c.key: getattr(obj, c.key)
-            for c in inspect(obj).mapper.column_attrs}
+    ids = [i for i in request.args.get('ids', '').split(',') if i]
+    if not ids or len(ids) > current_app.config['MAX_BATCH_SIZE']:
+        abort(400)
+    try:
+        ids = [id_type(i) for i in ids]
+    except ValueError:
+        abort(400)
+    if id_type is int and any(i not in BIGINT_RANGE for i in ids):
+        abort(400)
+    return list(dict.fromkeys(ids))
+
+
+def batch_response(records, ids):
+    """Return the records (dicts by ID) of the requested ids in order, report the missing ones."""
+    return jsonify({
+        'results': [records[i] for i in ids if i in records],
+        'missing': [i for i in ids if i not in records],
+    })
+
+
+def records_by_id(fieldset, ids):
+    snapshot = current_snapshot()
+    if snapshot is not None:
+        return snapshot.records_by_id(fieldset, ids)
+    return {record['id']: record for record in fieldset.records(fieldset.model.id.in_(ids))}
+
+
+def record_or_404(fieldset, entity_id):
+    snapshot = current_snapshot()
+    if snapshot is not None:
+        record = snapshot.record(fieldset, entity_id)
+        if record is None:
+            abort(404)
+        return record
+    records = fieldset.records(fieldset.model.id == entity_id)
+    if not records:
+        abort(404)
+    return records[0]
+
+
+def dialog_select(model, serializer, criterion):
+    """Select the lines matching criterion in the order of model.lines, the order of the dialog."""
+    return serializer.select().where(criterion).order_by(*model.lines.property.order_by)
+
+
+def lines_response(model, entity_id, criterion):
+    """The lines of a movie or conversation as JSON or, if requested, as NDJSON."""
+    snapshot = current_snapshot()
+    if snapshot is not None:
+        lines = snapshot.lines(model, entity_id)
+        if lines is None:
+            abort(404)
+        return ndjson_response(lines, dict) if wants_ndjson() else jsonify(lines)
+
+    model.query.get_or_404(entity_id)
+    serializer = serializer_for(Line)
+    statement = dialog_select(model, serializer, criterion)
+    if wants_ndjson():
+        return ndjson_response(stream_rows(statement), serializer.from_row)
+    return jsonify([serializer.from_row(row) for row in fdb.session.execute(statement)])
+
+
+def count_movies(method='exact'):
+    snapshot = current_snapshot()
+    if snapshot is not None:
+        return snapshot.count(Movie)
+    return COUNT_METHODS[method](Movie)
+
+
+def fieldset_args():
+    """The ?fields= and ?include= arguments of the request, for links to other pages."""
+    return {arg: request.args[arg] for arg in ('fields', 'include') if arg in request.args}
+
+
+def object_as_dict(obj):
+    """Convert sqlalchemy row object to python dict."""
+    return serializer_for(type(obj))(obj)
+
+
+@bp.route('/characters', methods=['GET'])
+def get_characters():
+    ids = requested_ids()
+    return batch_response(records_by_id(requested_fieldset(Character), ids), ids)
 
 
 @bp.route('/characters/<string:character_id>', methods=['GET'])
+@cached_response
 def get_character(character_id):
-    character = Character.query.get_or_404(character_id)
-    return jsonify(object_as_dict(character))
+    return jsonify(record_or_404(requested_fieldset(Character), character_id))
 
 
-@bp.route('/conversations/<int:conversation_id>', methods=['GET'])
+@bp.route('/conversations', methods=['GET'])
+def get_conversations():
+    ids = requested_ids(int)
+    return batch_response(records_by_id(requested_fieldset(Conversation), ids), ids)
+
+
+@bp.route(f'/conversations/<int(max={BIGINT_MAX}):conversation_id>', methods=['GET'])
 def get_conversation(conversation_id):
-    conversation = Conversation.query.get_or_404(conversation_id)
-    return jsonify(object_as_dict(conversation))
+    return jsonify(record_or_404(requested_fieldset(Conversation), conversation_id))
 
 
-@bp.route('/conversations/<int:conversation_id>/lines', methods=['GET'])
+@bp.route(f'/conversations/<int(max={BIGINT_MAX}):conversation_id>/lines', methods=['GET'])
+@cached_response
 def get_conversation_lines(conversation_id):
-    conversation = Conversation.query.get_or_404(conversation_id)
-    return jsonify([object_as_dict(l) for l in conversation.lines])
+    return lines_response(Conversation, conversation_id, Line.conversation_id == conversation_id)
 
 
-@bp.route('/genres/<int:genre_id>', methods=['GET'])
+@bp.route(f'/genres/<int(max={BIGINT_MAX}):genre_id>', methods=['GET'])
 def get_genre(genre_id):
-    genre = Genre.query.get_or_404(genre_id)
-    return jsonify(object_as_dict(genre))
+    return jsonify(record_or_404(Fieldset(Genre), genre_id))
+
+
+@bp.route('/lines', methods=['GET'])
+def get_lines():
+    ids = requested_ids()
+    return batch_response(records_by_id(Fieldset(Line), ids), ids)
 
 
 @bp.route('/lines/<string:line_id>', methods=['GET'])
 def get_line(line_id):
-    line = Line.query.get_or_404(line_id)
-    return jsonify(object_as_dict(line))
+    return jsonify(record_or_404(Fieldset(Line), line_id))
 
 
 @bp.route('/movies/<string:movie_id>', methods=['GET'])
+@cached_response
 def get_movie(movie_id):
-    movie = Movie.query.get_or_404(movie_id)
-    return jsonify(collect_movie_data(movie))
+    fieldset = requested_fieldset(Movie)
+    if current_snapshot() is not None:
+        return jsonify(record_or_404(fieldset, movie_id))
+    movie = movie_query(fieldset).filter_by(id=movie_id).first_or_404()
+    return jsonify(collect_movie_data(movie, fieldset))
 
 
-@bp.route('/movies', methods=['GET'])
-def get_movies():
+@bp.route('/movies/<string:movie_id>/lines', methods=['GET'])
+def get_movie_lines(movie_id):
+    return lines_response(Movie, movie_id, Line.movie_id == movie_id)
+
+
+def requested_limit():
     limit = request.args.get('limit', 5, type=int)
+    if limit < 1:
+        abort(400)
+    return limit
+
+
+def requested_start():
     start = request.args.get('start', 0, type=int)
-    page_number = int(start / limit) + 1
+    if start < 0:
+        abort(400)
+    return start
+
+
+def requested_cursor():
+    """The ID after which a page of ?after=<cursor> starts, None for the first page."""
+    cursor = request.args['after']
+    if not cursor:
+        return None
+    last_id = decode_cursor(cursor).get('id')
+    if not isinstance(last_id, str):
+        abort(400)
+    return last_id
+
 
-    paginated = Movie.query.paginate(page=page_number, per_page=limit)
-    movies_data = [collect_movie_data(m) for m in paginated.items]
+def requested_count_method():
+    """The ?count= method of a cursor page, None if no count was requested."""
+    count = request.args.get('count')
+    if count is not None and count not in COUNT_METHODS:
+        abort(400)
+    return count
+
+
+def movies_page(movies_data, start, limit, total_items):
+    """The response of a page of the ?start=&limit= offset pagination."""
+    if not movies_data and start > 0:
+        abort(404)
 
     meta_data = {
-        'page': page_number,
+        'page': start // limit + 1,
         'start': start,
         'limit': limit,
-        'total_pages': paginated.pages,
-        'total_items': paginated.total
+        'total_pages': -(-total_items // limit),
+        'total_items': total_items
     }
 
     links = {}
-    if paginated.has_next:
+    if start + limit < total_items:
         next_ = start + limit
-        links['next'] = url_for('.get_movies', limit=limit, start=next_)
-    if paginated.has_prev:
-        prev = start - limit
-        links['prev'] = url_for('.get_movies', limit=limit, start=prev)
+        links['next'] = url_for('.get_movies', limit=limit, start=next_, **fieldset_args())
+    if start > 0:
+        prev = max(start - limit, 0)
+        links['prev'] = url_for('.get_movies', limit=limit, start=prev, **fieldset_args())
 
     return jsonify({'results': movies_data, 'meta': meta_data, 'links': links})
+
+
+def movies_cursor_page(movies_data, limit, total_items=None):
+    """
+    The response of a page of the ?after= cursor pagination.
+
+    movies_data has one extra movie if there are more.
+    """
+    has_next = len(movies_data) > limit
+    movies_data = movies_data[:limit]
+
+    meta_data = {'after': request.args['after'], 'limit': limit}
+    if total_items is not None:
+        meta_data['total_items'] = total_items
+
+    links = {}
+    if has_next:
+        next_ = encode_cursor(id=movies_data[-1]['id'])
+        links['next'] = url_for('.get_movies', limit=limit, after=next_, **fieldset_args())
+
+    return jsonify({'results': movies_data, 'meta': meta_data, 'links': links})
+
+
+@bp.route('/movies', methods=['GET'])
+def get_movies():
+    """
+    List movies.
+
+    With ?after=<cursor> (empty for the first page) movies are paginated by
+    seeking on the primary key, so deep pages cost the same as the first one;
+    ?count=exact|estimate adds the total number of movies. Without a cursor
+    the ?start=&limit= offset pagination is used. ?ids=m1,m2 returns just
+    these movies. ?fields= and ?include= select the columns and relationships
+    of the movies.
+    """
+    fieldset = requested_fieldset(Movie)
+    if 'ids' in request.args:
+        ids = requested_ids()
+        return batch_response(records_by_id(fieldset, ids), ids)
+
+    limit = requested_limit()
+    if 'after' in request.args:
+        return get_movies_after(limit, fieldset)
+
+    start = requested_start()
+    snapshot = current_snapshot()
+    if snapshot is not None:
+        movies_data = snapshot.movies(fieldset, start, limit)
+    else:
+        movies = movie_query(fieldset).order_by(Movie.id).offset(start).limit(limit)
+        movies_data = [collect_movie_data(m, fieldset) for m in movies]
+    return movies_page(movies_data, start, limit, count_movies())
+
+
+def get_movies_after(limit, fieldset):
+    last_id = requested_cursor()
+    count = requested_count_method()
+
+    # One extra row tells whether there is a next page
+    snapshot = current_snapshot()
+    if snapshot is not None:
+        movies_data = snapshot.movies_after(fieldset, last_id, limit + 1)
+    else:
+        query = movie_query(fieldset).order_by(Movie.id)
+        if last_id is not None:
+            query = query.filter(Movie.id > last_id)
+        movies_data = [collect_movie_data(m, fieldset) for m in query.limit(limit + 1)]
+    total_items = count_movies(count) if count is not None else None
+    return movies_cursor_page(movies_data, limit, total_items)
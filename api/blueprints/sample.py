@@ -0,0 +1,67 @@
+import random
+
+from flask import Blueprint, abort, current_app, g, jsonify, request
+
+from api.blueprints.routes import records_by_id
+from api.conditional import add_cache_headers, load_validators
+from api.database import use_replica
+from api.fieldsets import requested_fieldset
+from api.indexes import current_index
+from config import API_BASE_PATH
+from db.models import Conversation, Line
+
+# Seeds that every JSON backend can echo back in meta
+SEED_RANGE = range(1 << 63)
+
+bp = Blueprint('sample', __name__, url_prefix=API_BASE_PATH)
+bp.before_request(use_replica)
+bp.after_request(add_cache_headers)
+
+
+@bp.before_request
+def load_seeded_validators():
+    """Validators of samples of a given ?seed=, a drawn sample must not be reused."""
+    if 'seed' in request.args:
+        return load_validators()
+    return None
+
+
+def sample_response(model, index_name):
+    """
+    Up to ?n= random records of model, from the movies of ?genre= if given.
+
+    The same ?seed= returns the same sample for the same corpus version.
+    Without a seed one is drawn and returned in meta; such a response must
+    not be reused, so it gets no ETag and is not cached.
+    """
+    n = request.args.get('n', 100, type=int)
+    if not 0 < n <= current_app.config['SAMPLE_MAX_SIZE']:
+        abort(400)
+    seed = request.args.get('seed', type=int)
+    if seed is None:
+        if 'seed' in request.args:
+            abort(400)
+        seed = random.getrandbits(32)
+    elif seed not in SEED_RANGE:
+        abort(400)
+    genre = request.args.get('genre')
+
+    ids = current_index(index_name).sample(n, seed, genre)
+    records = records_by_id(requested_fieldset(model), ids)
+    response = jsonify({
+        'results': [records[i] for i in ids if i in records],
+        'meta': {'n': n, 'seed': seed, 'genre': genre},
+    })
+    if 'etag' not in g:
+        response.cache_control.no_store = True
+    return response
+
+
+@bp.route('/sample/lines', methods=['GET'])
+def get_sample_lines():
+    return sample_response(Line, 'line_sample')
+
+
+@bp.route('/sample/conversations', methods=['GET'])
+def get_sample_conversations():
+    return sample_response(Conversation, 'conversation_sample')
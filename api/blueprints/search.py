@@ -0,0 +1,47 @@
+from flask import Blueprint, abort, current_app, jsonify, request, url_for
+
+from api import fdb
+from api.conditional import add_cache_headers, load_validators
+from api.database import use_replica
+from config import API_BASE_PATH
+from db.search import search_lines, search_terms
+
+bp = Blueprint('search', __name__, url_prefix=API_BASE_PATH)
+bp.before_request(use_replica)
+bp.before_request(load_validators)
+bp.after_request(add_cache_headers)
+
+FILTERS = ('movie_id', 'character_id', 'genre')
+
+
+@bp.route('/search/lines', methods=['GET'])
+def get_search_lines():
+    """
+    Search the text of the lines for all words of ?q=, best matches first.
+
+    Results can be filtered with ?movie_id=, ?character_id= and ?genre= and
+    are paginated with ?start=&limit= (at most SEARCH_MAX_LIMIT).
+    """
+    terms = search_terms(request.args.get('q', ''))
+    if not terms:
+        abort(400)
+    start = request.args.get('start', 0, type=int)
+    limit = request.args.get('limit', 20, type=int)
+    if start < 0 or not 0 < limit <= current_app.config['SEARCH_MAX_LIMIT']:
+        abort(400)
+    filters = {f: request.args[f] for f in FILTERS if f in request.args}
+
+    statement = search_lines(fdb.engine.dialect.name, terms, **filters)
+    # One extra row tells whether there is a next page
+    rows = fdb.session.execute(statement.offset(start).limit(limit + 1)).all()
+    results = [dict(row._mapping) for row in rows[:limit]]
+
+    links = {}
+    args = dict(filters, q=request.args['q'], limit=limit)
+    if len(rows) > limit:
+        links['next'] = url_for('.get_search_lines', start=start + limit, **args)
+    if start > 0:
+        links['prev'] = url_for('.get_search_lines', start=max(start - limit, 0), **args)
+
+    meta_data = {'q': request.args['q'], 'start': start, 'limit': limit}
+    return jsonify({'results': results, 'meta': meta_data, 'links': links})
@@ -0,0 +1,64 @@
+from flask import Blueprint, abort, jsonify
+
+from api import fdb
+from api.conditional import add_cache_headers, load_validators
+from api.database import use_replica
+from api.serializers import serializer_for
+from config import API_BASE_PATH
+from db.models import CharacterPairStats, CharacterStats, GenreStats, MovieStats, YearStats
+
+bp = Blueprint('stats', __name__, url_prefix=API_BASE_PATH)
+bp.before_request(use_replica)
+bp.before_request(load_validators)
+bp.after_request(add_cache_headers)
+
+
+def stats_rows(model, *criteria, order_by=()):
+    """The rows of an aggregate table as dicts, looked up by its primary key (or all of them)."""
+    serializer = serializer_for(model)
+    statement = serializer.select().where(*criteria).order_by(*order_by)
+    return [serializer.from_row(row) for row in fdb.session.execute(statement)]
+
+
+def stats_or_404(model, *criteria):
+    rows = stats_rows(model, *criteria)
+    if not rows:
+        abort(404)
+    return rows[0]
+
+
+@bp.route('/stats/movies/<string:movie_id>', methods=['GET'])
+def get_movie_stats(movie_id):
+    """Number of characters, conversations, lines and words of a movie."""
+    return jsonify(stats_or_404(MovieStats, MovieStats.movie_id == movie_id))
+
+
+@bp.route('/stats/characters/<string:character_id>', methods=['GET'])
+def get_character_stats(character_id):
+    """
+    Conversations, lines, words and number of partners of a character.
+
+    pairs has the conversations and lines with each partner, most
+    conversations first.
+    """
+    stats = stats_or_404(CharacterStats, CharacterStats.character_id == character_id)
+    stats['pairs'] = [
+        {key: row[key] for key in ('partner_id', 'conversations', 'lines')}
+        for row in stats_rows(
+            CharacterPairStats, CharacterPairStats.character_id == character_id,
+            order_by=(CharacterPairStats.conversations.desc(), CharacterPairStats.partner_id),
+        )
+    ]
+    return jsonify(stats)
+
+
+@bp.route('/stats/genres', methods=['GET'])
+def get_genre_stats():
+    """Movies, lines and words per genre."""
+    return jsonify(stats_rows(GenreStats, order_by=(GenreStats.name,)))
+
+
+@bp.route('/stats/years', methods=['GET'])
+def get_year_stats():
+    """Movies, lines and words per release year."""
+    return jsonify(stats_rows(YearStats, order_by=(YearStats.year,)))
@@ -0,0 +1,301 @@
+"""Caches of serialized response bodies, in-process or shared through a Redis-protocol store."""
+import hashlib
+import logging
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager
+from functools import wraps
+
+from flask import current_app, request
+
+from api.conditional import corpus_version, entity_key
+from api.streaming import wants_ndjson
+
+
+class KeyLocks:
+    """Per-key locks of one process, removed again when nobody holds or waits for them."""
+
+    def __init__(self):
+        self._locks = {}  # key: [lock, users]
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def hold(self, key):
+        with self._lock:
+            entry = self._locks.setdefault(key, [threading.Lock(), 0])
+            entry[1] += 1
+        try:
+            with entry[0]:
+                yield
+        finally:
+            with self._lock:
+                entry[1] -= 1
+                if not entry[1]:
+                    del self._locks[key]
+
+
+class ResponseCache:
+    """
+    LRU cache of response bodies in this process, bounded by the total size of the bodies in bytes.
+
+    Entries expire ttl seconds after they were stored. The cache belongs to
+    one corpus version: looking up a key with another version clears it, so
+    a reseed invalidates every entry.
+    """
+
+    backend = 'local'
+
+    def __init__(self, max_bytes, ttl, clock=time.monotonic):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.clock = clock
+        self.version = None
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self._entries = OrderedDict()  # key: (body, mimetype, expires)
+        self._lock = threading.Lock()
+        self._key_locks = KeyLocks()
+
+    def get(self, key, version, record=True):
+        """Return the (body, mimetype) stored for key under version, or None."""
+        with self._lock:
+            if version != self.version:
+                self._clear()
+                self.version = version
+            entry = self._entries.get(key)
+            if entry is not None and entry[2] <= self.clock():
+                self._remove(key)
+                self.expirations += 1
+                entry = None
+            if entry is None:
+                self.misses += record
+                return None
+            self._entries.move_to_end(key)
+            self.hits += record
+            return entry[:2]
+
+    def set(self, key, body, mimetype, version, ttl=None):
+        if len(body) > self.max_bytes:
+            return
+        with self._lock:
+            if version != self.version:
+                return
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (body, mimetype, self.clock() + (ttl or self.ttl))
+            self.size += len(body)
+            while self.size > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    @contextmanager
+    def key_lock(self, key, version):
+        """Hold the lock of key, so that only one request at a time renders it."""
+        with self._key_locks.hold(key):
+            yield
+
+    def clear(self):
+        with self._lock:
+            self._clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'backend': self.backend,
+                'entries': len(self._entries),
+                'bytes': self.size,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+            }
+
+    def _remove(self, key):
+        body, _, _ = self._entries.pop(key)
+        self.size -= len(body)
+
+    def _clear(self):
+        self._entries.clear()
+        self.size = 0
+
+
+class RedisCache:
+    """
+    Response bodies shared by all workers through a Redis-protocol store.
+
+    Keys are namespaced by prefix and corpus version, so entries of an old
+    corpus are never read again and expire with their TTL; memory is bounded
+    by the maxmemory policy of the server. Renders of a key are coalesced
+    across processes with a lock key (SET NX PX): while one worker renders,
+    the others poll for its result for up to lock_timeout seconds.
+
+    client needs get, set (with ex, px and nx), exists and delete, as in
+    redis-py.
+    """
+
+    backend = 'redis'
+
+    def __init__(self, client, ttl, prefix='cornell', lock_timeout=5.0, poll_interval=0.01):
+        self.client = client
+        self.ttl = ttl
+        self.prefix = prefix
+        self.lock_timeout = lock_timeout
+        self.poll_interval = poll_interval
+        self.hits = 0
+        self.misses = 0
+        self.lock_waits = 0
+        self._counter_lock = threading.Lock()
+        self._key_locks = KeyLocks()
+
+    def name(self, key, version):
+        return '{}:{}:{}'.format(self.prefix, version, hashlib.sha1(key.encode()).hexdigest())
+
+    def get(self, key, version, record=True):
+        value = self.client.get(self.name(key, version))
+        with self._counter_lock:
+            if value is None:
+                self.misses += record
+                return None
+            self.hits += record
+        mimetype, _, body = value.partition(b'\n')
+        return body, mimetype.decode()
+
+    def set(self, key, body, mimetype, version, ttl=None):
+        self.client.set(self.name(key, version), mimetype.encode() + b'\n' + body,
+                        ex=ttl or self.ttl)
+
+    @contextmanager
+    def key_lock(self, key, version):
+        """
+        Hold the lock of key in this process and, if it can be taken in time, in the store.
+
+        If another worker holds the store lock, wait until its result is
+        stored or the lock timeout passes; the caller checks the cache again
+        either way.
+        """
+        with self._key_locks.hold(key):
+            name = self.name(key, version)
+            lock_name = name + ':lock'
+            token = uuid.uuid4().hex
+            deadline = time.monotonic() + self.lock_timeout
+            locked = self.client.set(lock_name, token, px=int(self.lock_timeout * 1000), nx=True)
+            if not locked:
+                with self._counter_lock:
+                    self.lock_waits += 1
+                while not self.client.exists(name) and time.monotonic() < deadline:
+                    time.sleep(self.poll_interval)
+            try:
+                yield
+            finally:
+                if locked and self.client.get(lock_name) == token.encode():
+                    self.client.delete(lock_name)
+
+    def clear(self):
+        pass  # entries of old versions are not read again and expire on their own
+
+    def stats(self):
+        with self._counter_lock:
+            return {
+                'backend': self.backend,
+                'hits': self.hits,
+                'misses': self.misses,
+                'lock_waits': self.lock_waits,
+            }
+
+
+def redis_cache(config, client=None):
+    """RedisCache for config, connecting to CACHE_REDIS_URL unless a client is given."""
+    if client is None:
+        import redis  # pylint: disable=import-outside-toplevel
+        client = redis.Redis.from_url(config['CACHE_REDIS_URL'])
+    return RedisCache(client, config['RESPONSE_CACHE_TTL'], prefix=config['CACHE_KEY_PREFIX'],
+                      lock_timeout=config['CACHE_LOCK_TIMEOUT'])
+
+
+def init_app(app):
+    """
+    Create the response cache of the app according to CACHE_BACKEND (local, redis or none).
+
+    If the redis package is not installed the local cache is used.
+    """
+    backend = app.config['CACHE_BACKEND']
+    cache = None
+    if backend == 'redis':
+        try:
+            cache = redis_cache(app.config)
+        except ImportError:
+            logging.warning("redis is not installed, falling back to the local response cache")
+            backend = 'local'
+    if backend == 'local' and app.config['RESPONSE_CACHE_MAX_BYTES']:
+        cache = ResponseCache(app.config['RESPONSE_CACHE_MAX_BYTES'],
+                              app.config['RESPONSE_CACHE_TTL'])
+    elif backend not in ('local', 'redis', 'none'):
+        raise ValueError(f"Unknown cache backend {backend!r}, choose one of local, redis or none")
+    app.extensions['response_cache'] = cache
+
+
+def cached_response(view):
+    """
+    Serve the JSON body of view from the response cache of the app.
+
+    Concurrent misses of the same key are coalesced: one request renders the
+    response while the others wait for it and are answered from the cache.
+    Only successful, non-streamed responses are stored, and only while the
+    corpus version is known. RESPONSE_CACHE_TTLS can override the TTL per
+    endpoint.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        cache = current_app.extensions['response_cache']
+        version = corpus_version()
+        if cache is None or version is None or wants_ndjson():
+            return view(*args, **kwargs)
+
+        key = entity_key()
+        entry = cache.get(key, version.version)
+        if entry is None:
+            with cache.key_lock(key, version.version):
+                entry = cache.get(key, version.version, record=False)
+                if entry is None:
+                    return store_response(cache, key, version, view(*args, **kwargs))
+        body, mimetype = entry
+        return current_app.response_class(body, mimetype=mimetype)
+    return wrapper
+
+
+def cached_async_response(view):
+    """
+    cached_response of a coroutine view (see api.asgi).
+
+    Misses are not coalesced: waiting for the render of another request would
+    block the event loop that this request shares with all others.
+    """
+    @wraps(view)
+    async def wrapper(*args, **kwargs):
+        cache = current_app.extensions['response_cache']
+        version = corpus_version()
+        if cache is None or version is None or wants_ndjson():
+            return await view(*args, **kwargs)
+
+        key = entity_key()
+        entry = cache.get(key, version.version)
+        if entry is None:
+            return store_response(cache, key, version, await view(*args, **kwargs))
+        body, mimetype = entry
+        return current_app.response_class(body, mimetype=mimetype)
+    return wrapper
+
+
+def store_response(cache, key, version, rv):
+    """Make the response of a view's return value, cache it if it is successful and not streamed."""
+    response = current_app.make_response(rv)
+    if response.status_code == 200 and not response.is_streamed:
+        ttl = current_app.config['RESPONSE_CACHE_TTLS'].get(request.endpoint)
+        cache.set(key, response.get_data(), response.mimetype, version.version, ttl=ttl)
+    return response
@@ -0,0 +1,114 @@
+"""Conditional GET with ETags and Last-Modified derived from the version of the seeded corpus."""
+import datetime
+import hashlib
+import logging
+import time
+
+from flask import current_app, g, request
+from sqlalchemy.exc import SQLAlchemyError
+
+from api import fdb
+from api.streaming import wants_ndjson
+from db.manifest import load_corpus_version
+
+
+def init_app(app):
+    with app.app_context():
+        refresh_corpus_version(app)
+
+
+def refresh_corpus_version(app):
+    try:
+        with fdb.engine.connect() as connection:
+            version = load_corpus_version(connection)
+    except SQLAlchemyError:
+        logging.warning("could not load the corpus version, responses are sent without ETags")
+        version = None
+    expires = time.monotonic() + app.config['CORPUS_VERSION_TTL']
+    app.extensions['corpus_version'] = (version, expires)
+    return version
+
+
+def corpus_version():
+    """
+    The (version, seeded_at) of the seeded corpus, or None if it is unknown.
+
+    It is loaded when the app starts and reloaded after CORPUS_VERSION_TTL
+    seconds, so that requests are answered without a query. A snapshot
+    serves the version it was loaded with.
+    """
+    snapshot = current_app.extensions.get('snapshot')
+    if snapshot is not None:
+        return snapshot.version
+    version, expires = current_app.extensions['corpus_version']
+    if time.monotonic() >= expires:
+        app = current_app._get_current_object()  # pylint: disable=protected-access
+        version = refresh_corpus_version(app)
+    return version
+
+
+def entity_key():
+    """
+    Key of the requested resource that covers everything its body depends on besides the data.
+
+    That is the path with its query string, the representation and the encoder.
+    """
+    return '\0'.join((
+        request.full_path,
+        'ndjson' if wants_ndjson() else 'json',
+        current_app.extensions['json_backend'],
+    ))
+
+
+def entity_etag(version):
+    """Strong ETag of the requested resource: the corpus version and a hash of the entity key."""
+    digest = hashlib.blake2b(entity_key().encode(), digest_size=8).hexdigest()
+    return '{}-{}'.format(version.version[:16], digest)
+
+
+def load_validators():
+    """
+    Remember the ETag and Last-Modified of the requested resource for add_cache_headers.
+
+    ETags are only sent with successful responses, so a request that names
+    the current one is answered with 304 Not Modified before the database is
+    queried. If-Modified-Since and If-None-Match: * are decided after the view.
+    """
+    if request.method not in ('GET', 'HEAD'):
+        return None
+    version = corpus_version()
+    if version is None:
+        return None
+    g.etag = entity_etag(version)
+    g.last_modified = version.seeded_at.replace(microsecond=0, tzinfo=datetime.timezone.utc)
+    if not request.if_none_match.star_tag and request.if_none_match.contains_weak(g.etag):
+        return current_app.response_class(status=304)
+    return None
+
+
+def not_modified():
+    """Whether the client has the current version of the resource according to its validators."""
+    if request.if_none_match:
+        return request.if_none_match.contains(g.etag)
+    return request.if_modified_since is not None and g.last_modified <= request.if_modified_since
+
+
+def add_cache_headers(response):
+    """
+    Add ETag, Last-Modified and Cache-Control to successful responses.
+
+    A successful response is replaced by 304 Not Modified if the client has
+    the current version of the resource. It is decided after the view, so
+    that errors are answered as such whatever the validators of the request.
+    """
+    if 'etag' not in g or response.status_code not in (200, 304):
+        return response
+    if response.status_code == 200 and not_modified():
+        response.close()
+        response = current_app.response_class(status=304)
+    response.set_etag(g.etag)
+    response.last_modified = g.last_modified
+    response.cache_control.public = True
+    response.cache_control.max_age = current_app.config['CACHE_MAX_AGE']
+    response.vary.add('Accept')
+    return response
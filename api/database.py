@@ -0,0 +1,238 @@
+"""Connection pools of the database engines and routing of read-only requests to replicas."""
+import itertools
+import logging
+import threading
+import time
+
+from flask import current_app, request
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import SQLAlchemyError, TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import QueuePool
+
+REPLICA_BIND_PREFIX = 'replica_'
+REPLICA_KEY = 'replica'
+
+
+class PoolStats:
+    """How often and how long checkouts of a pool waited for a connection."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+
+    def record(self, seconds, timed_out=False):
+        with self.lock:
+            if timed_out:
+                self.timeouts += 1
+            else:
+                self.checkouts += 1
+            self.wait_seconds += seconds
+            self.max_wait_seconds = max(self.max_wait_seconds, seconds)
+
+    def as_dict(self):
+        with self.lock:
+            waits = self.checkouts + self.timeouts
+            return {
+                'checkouts': self.checkouts,
+                'timeouts': self.timeouts,
+                'wait_seconds_total': self.wait_seconds,
+                'wait_seconds_avg': self.wait_seconds / waits if waits else 0.0,
+                'wait_seconds_max': self.max_wait_seconds,
+            }
+
+
+class InstrumentedQueuePool(QueuePool):
+    """QueuePool that records the time of every checkout, connecting included, in its PoolStats."""
+
+    def __init__(self, creator, pool_size=5, max_overflow=10, **kwargs):
+        super().__init__(creator, pool_size=pool_size, max_overflow=max_overflow, **kwargs)
+        self.max_overflow = max_overflow
+        self.stats = PoolStats()
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except PoolTimeoutError:
+            self.stats.record(time.perf_counter() - start, timed_out=True)
+            raise
+        self.stats.record(time.perf_counter() - start)
+        return connection
+
+    def recreate(self):
+        pool = super().recreate()
+        pool.stats = self.stats
+        return pool
+
+
+def is_memory_database(uri):
+    url = make_url(uri)
+    return url.get_backend_name() == 'sqlite' and url.database in (None, '', ':memory:')
+
+
+def engine_options(config, uri, poolclass=InstrumentedQueuePool):
+    """
+    Pool options of an engine of uri from the DB_POOL_* settings.
+
+    An in-memory SQLite database has a single static connection and no
+    options. Without poolclass the dialect's default queue pool is used (for
+    asyncio engines).
+    """
+    if is_memory_database(uri):
+        return {}
+    options = {
+        'pool_size': config['DB_POOL_SIZE'],
+        'max_overflow': config['DB_MAX_OVERFLOW'],
+        'pool_timeout': config['DB_POOL_TIMEOUT'],
+        'pool_recycle': config['DB_POOL_RECYCLE'],
+        'pool_pre_ping': config['DB_POOL_PRE_PING'],
+    }
+    if poolclass is not None:
+        options['poolclass'] = poolclass
+    return options
+
+
+def pool_status(engine):
+    """Size, connections in use, utilization and checkout waits of an engine's pool."""
+    pool = engine.pool
+    status = {'pool': type(pool).__name__}
+    if isinstance(pool, InstrumentedQueuePool):
+        checked_out = pool.checkedout()
+        capacity = pool.size() + max(pool.max_overflow, 0)
+        status.update({
+            'size': pool.size(),
+            'max_overflow': pool.max_overflow,
+            'checked_out': checked_out,
+            'checked_in': pool.checkedin(),
+            'overflow': max(pool.overflow(), 0),
+            'utilization': checked_out / capacity if capacity else 0.0,
+        })
+        status.update(pool.stats.as_dict())
+    return status
+
+
+class ReplicaSet:
+    """
+    The replica engines of an app, handed out in turn while they are healthy.
+
+    A replica is checked with a connection checkout (pinged with
+    DB_POOL_PRE_PING) before it is used and again every check_interval
+    seconds. A replica that fails the check, or loses its connection while a
+    statement is executed, is skipped for retry_interval seconds.
+    """
+
+    def __init__(self, engines, check_interval=5.0, retry_interval=30.0, clock=time.monotonic):
+        self.engines = engines
+        self.check_interval = check_interval
+        self.retry_interval = retry_interval
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.checked_until = {}
+        self.down_until = {}
+        self.failures = dict.fromkeys(engines, 0)
+        self._turn = itertools.count()
+        for name, engine in engines.items():
+            event.listen(engine, 'handle_error', self._error_handler(name))
+
+    def _error_handler(self, name):
+        def handle_error(context):
+            if context.is_disconnect or context.connection is None:
+                self.mark_down(name)
+        return handle_error
+
+    def mark_down(self, name):
+        with self.lock:
+            if self.down_until.get(name, 0) <= self.clock():
+                logging.warning("replica %s is unavailable, skipping it for %s seconds", name,
+                                self.retry_interval)
+                self.failures[name] += 1
+            self.down_until[name] = self.clock() + self.retry_interval
+            self.checked_until.pop(name, None)
+
+    def is_healthy(self, name):
+        now = self.clock()
+        if self.down_until.get(name, 0) > now:
+            return False
+        if self.checked_until.get(name, 0) > now:
+            return True
+        try:
+            with self.engines[name].connect():
+                pass
+        except SQLAlchemyError:
+            self.mark_down(name)
+            return False
+        self.checked_until[name] = now + self.check_interval
+        return True
+
+    def choose(self):
+        """The engine of the next healthy replica, None if no replica is healthy."""
+        names = list(self.engines)
+        start = next(self._turn)
+        for i in range(len(names)):
+            name = names[(start + i) % len(names)]
+            if self.is_healthy(name):
+                return self.engines[name]
+        return None
+
+    def status(self):
+        now = self.clock()
+        return {
+            name: dict(pool_status(engine), healthy=self.down_until.get(name, 0) <= now,
+                       failures=self.failures[name])
+            for name, engine in self.engines.items()
+        }
+
+
+class RoutingSession(Session):
+    """Session that sends statements outside of flushes to the replica of the request, if any."""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        replica = self.info.get(REPLICA_KEY)
+        if bind is None and replica is not None and not self._flushing:
+            return replica
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def use_replica():
+    """Send the queries of a GET request to a healthy replica, or to the primary if none is."""
+    replicas = current_app.extensions['replicas']
+    if replicas is None or request.method != 'GET':
+        return
+    engine = replicas.choose()
+    if engine is not None:
+        current_app.extensions['sqlalchemy'].session.info[REPLICA_KEY] = engine
+
+
+def init_app(app, db):
+    """
+    Configure the pools of the primary and the REPLICA_URIS, then initialize db.
+
+    Every replica becomes a bind of db (replica_0, replica_1, ...).
+    """
+    config = app.config
+    config['SQLALCHEMY_ENGINE_OPTIONS'] = dict(
+        engine_options(config, config['SQLALCHEMY_DATABASE_URI']),
+        **config.get('SQLALCHEMY_ENGINE_OPTIONS', {})
+    )
+    binds = dict(config.get('SQLALCHEMY_BINDS') or {})
+    replica_names = []
+    for i, uri in enumerate(config['REPLICA_URIS']):
+        name = f'{REPLICA_BIND_PREFIX}{i}'
+        binds[name] = dict(engine_options(config, uri), url=uri)
+        replica_names.append(name)
+    config['SQLALCHEMY_BINDS'] = binds
+
+    db.init_app(app)
+
+    replicas = None
+    if replica_names:
+        with app.app_context():
+            replicas = ReplicaSet({name: db.engines[name] for name in replica_names},
+                                  check_interval=config['REPLICA_CHECK_INTERVAL'],
+                                  retry_interval=config['REPLICA_RETRY_INTERVAL'])
+    app.extensions['replicas'] = replicas
@@ -1,15 +1,33 @@
 from flask import Flask
 from werkzeug.utils import find_modules, import_string
 
-from api import fdb, migrate # pylint: disable=cyclic-import
-
-
-def create_app(config):
+from api import ( # pylint: disable=cyclic-import
+    cache,
+    conditional,
+    database,
+    fdb,
+    indexes,
+    instrument,
+    json_backends,
+    migrate,
+    serializers,
+    snapshot,
+)
+
+
+def create_app(config, json_backend=None):
     app = Flask(__name__)
     app.config.from_object(config)
+    json_backends.init_app(app, json_backend)
 
-    fdb.init_app(app)
+    database.init_app(app, fdb)
     migrate.init_app(app, fdb)
+    instrument.init_app(app)
+    serializers.init_app(app)
+    conditional.init_app(app)
+    snapshot.init_app(app)
+    cache.init_app(app)
+    indexes.init_app(app)
 
     register_blueprints(app)
 
@@ -0,0 +1,131 @@
+"""Sparse fieldsets (?fields=) and relationship includes (?include=) of entity responses."""
+from flask import abort, request
+from sqlalchemy import select
+from sqlalchemy.orm import load_only, selectinload
+
+from api import fdb
+from api.serializers import serializer_for
+from db.models import Character, Conversation, Genre, Line, Movie
+
+
+def ids(objects):
+    return [obj.id for obj in objects]
+
+
+def names(objects):
+    return [obj.name for obj in objects]
+
+
+def characters(objects):
+    serialize = serializer_for(Character)
+    return [serialize(obj) for obj in objects]
+
+
+class Include:
+    """A relationship that can be included, the related columns it needs and its serializer."""
+
+    def __init__(self, relationship, serialize, load=None):
+        self.relationship = relationship
+        self.serialize = serialize
+        self.load = load
+
+    def option(self):
+        option = selectinload(self.relationship)
+        return option.load_only(*self.load) if self.load else option
+
+
+INCLUDES = {
+    Movie: {
+        'characters': Include(Movie.characters, characters),
+        'conversations': Include(Movie.conversations, ids, load=(Conversation.id,)),
+        'genres': Include(Movie.genres, names, load=(Genre.name,)),
+    },
+    Character: {
+        'conversations': Include(Character.conversations, ids, load=(Conversation.id,)),
+        'lines': Include(Character.lines, ids, load=(Line.id,)),
+    },
+    Conversation: {
+        'characters': Include(Conversation.characters, ids, load=(Character.id,)),
+        'lines': Include(Conversation.lines, ids, load=(Line.id,)),
+    },
+}
+DEFAULT_INCLUDES = {Movie: ('characters', 'conversations', 'genres')}
+
+
+class Fieldset:
+    """
+    The columns and relationships of a model that a response contains.
+
+    Only these columns are selected and only these relationships are loaded,
+    with one query each. By default all columns and the default includes of
+    the model.
+    """
+
+    def __init__(self, model, fields=None, include=None):
+        self.model = model
+        self.serializer = serializer_for(model)
+        self.fields = tuple(fields) if fields is not None else self.serializer.keys
+        if include is None:
+            include = DEFAULT_INCLUDES.get(model, ())
+        self.includes = {name: INCLUDES[model][name] for name in include}
+
+    @property
+    def all_fields(self):
+        return self.fields == self.serializer.keys
+
+    def options(self):
+        options = []
+        if not self.all_fields:
+            options.append(load_only(*(getattr(self.model, f) for f in self.fields)))
+        return options + [include.option() for include in self.includes.values()]
+
+    def query(self):
+        return self.model.query.options(*self.options())
+
+    def serialize(self, obj):
+        if self.all_fields:
+            data = self.serializer(obj)
+        else:
+            data = {field: getattr(obj, field) for field in self.fields}
+        for name, include in self.includes.items():
+            data[name] = include.serialize(getattr(obj, name))
+        return data
+
+    def records(self, *criteria):
+        """
+        Serialize the objects matching criteria.
+
+        Without includes the columns are selected as plain rows, without
+        building ORM objects.
+        """
+        if self.includes:
+            return [self.serialize(obj) for obj in self.query().filter(*criteria)]
+        columns = (getattr(self.model, f) for f in self.fields)
+        rows = fdb.session.execute(select(*columns).where(*criteria))
+        return [dict(zip(self.fields, row)) for row in rows]
+
+
+def split_names(value):
+    return list(dict.fromkeys(name for name in value.split(',') if name))
+
+
+def requested_fieldset(model):
+    """
+    Fieldset of ?fields=a,b and ?include=c,d of the request.
+
+    id is always part of the fields. If fields are given but no includes, no
+    relationships are included. Aborts with 400 for unknown names.
+    """
+    fields = request.args.get('fields')
+    include = request.args.get('include')
+    if fields is not None:
+        fields = ['id'] + [f for f in split_names(fields) if f != 'id']
+        if not set(fields) <= set(serializer_for(model).keys):
+            abort(400)
+    if include is not None:
+        include = split_names(include)
+        if not set(include) <= set(INCLUDES.get(model, ())):
+            abort(400)
+    elif fields is not None:
+        include = ()
+    return Fieldset(model, fields, include)
@@ -0,0 +1,52 @@
+"""In-memory indexes of the corpus, built on first use and again for every new corpus version."""
+import logging
+import threading
+import time
+from functools import partial
+
+from flask import current_app
+
+from api import fdb
+from api.conditional import corpus_version
+from db.graph import CharacterGraph
+from db.models import Conversation, Line
+from db.sampling import SampleIndex
+
+INDEXES = {
+    'character_graph': CharacterGraph.load,
+    'conversation_sample': partial(SampleIndex.load, model=Conversation),
+    'line_sample': partial(SampleIndex.load, model=Line),
+}
+
+
+class VersionedIndex:
+    """The index build(connection) returned for the corpus version it was built for."""
+
+    def __init__(self, name, build):
+        self.name = name
+        self.build = build
+        self.lock = threading.Lock()
+        self.index = None
+        self.version = None
+
+    def get(self, version):
+        """The index of version, built from the database if the current one is missing or older."""
+        with self.lock:
+            if self.index is None or self.version != version:
+                start = time.perf_counter()
+                with fdb.engine.connect() as connection:
+                    self.index = self.build(connection)
+                self.version = version
+                logging.info("built %s in %.3fs", self.name, time.perf_counter() - start)
+            return self.index
+
+
+def current_index(name):
+    """The index name of INDEXES for the current corpus version."""
+    return current_app.extensions['corpus_indexes'][name].get(corpus_version())
+
+
+def init_app(app):
+    app.extensions['corpus_indexes'] = {
+        name: VersionedIndex(name, build) for name, build in INDEXES.items()
+    }
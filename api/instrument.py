@@ -0,0 +1,34 @@
+"""Count the SQL queries issued while handling a request."""
+from flask import g, has_app_context
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+QUERY_COUNT_HEADER = 'X-Query-Count'
+
+
+def count_query(*args):
+    if has_app_context():
+        g.query_count = g.get('query_count', 0) + 1
+
+
+def get_query_count():
+    """Number of SQL queries of the current request so far."""
+    return g.get('query_count', 0)
+
+
+def reset_query_count():
+    g.query_count = 0
+
+
+def add_query_count_header(response):
+    response.headers[QUERY_COUNT_HEADER] = str(get_query_count())
+    return response
+
+
+def init_app(app):
+    if not event.contains(Engine, 'before_cursor_execute', count_query):
+        event.listen(Engine, 'before_cursor_execute', count_query)
+
+    app.before_request(reset_query_count)
+    if app.config.get('QUERY_COUNT_HEADER'):
+        app.after_request(add_query_count_header)
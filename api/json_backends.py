@@ -0,0 +1,88 @@
+"""JSON encoders for responses, selected with the JSON_BACKEND setting."""
+import importlib
+import logging
+
+from flask.json.provider import DefaultJSONProvider
+
+
+class OrjsonProvider(DefaultJSONProvider):
+    """Encode with orjson, which writes bytes and keeps non-ASCII characters as UTF-8."""
+
+    library = 'orjson'
+
+    def __init__(self, app):
+        super().__init__(app)
+        self.orjson = importlib.import_module(self.library)
+
+    def _option(self, indent=None):
+        option = self.orjson.OPT_NON_STR_KEYS
+        if self.sort_keys:
+            option |= self.orjson.OPT_SORT_KEYS
+        if indent:
+            option |= self.orjson.OPT_INDENT_2
+        return option
+
+    def dumps(self, obj, **kwargs):
+        return self.dump_bytes(obj, indent=kwargs.get('indent')).decode()
+
+    def dump_bytes(self, obj, indent=None):
+        return self.orjson.dumps(obj, default=self.default, option=self._option(indent))
+
+    def loads(self, s, **kwargs):
+        return self.orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        indent = (self.compact is None and self._app.debug) or self.compact is False
+        return self._app.response_class(self.dump_bytes(obj, indent=indent) + b'\n',
+                                        mimetype=self.mimetype)
+
+
+class UjsonProvider(DefaultJSONProvider):
+    """Encode with ujson."""
+
+    library = 'ujson'
+
+    def __init__(self, app):
+        super().__init__(app)
+        self.ujson = importlib.import_module(self.library)
+
+    def dumps(self, obj, **kwargs):
+        return self.ujson.dumps(
+            obj,
+            default=self.default,
+            ensure_ascii=self.ensure_ascii,
+            sort_keys=self.sort_keys,
+            escape_forward_slashes=False,
+            indent=kwargs.get('indent') or 0,
+        )
+
+    def loads(self, s, **kwargs):
+        return self.ujson.loads(s)
+
+
+JSON_BACKENDS = {
+    'stdlib': DefaultJSONProvider,
+    'orjson': OrjsonProvider,
+    'ujson': UjsonProvider,
+}
+
+
+def init_app(app, backend=None):
+    """
+    Encode the JSON of jsonify, flask.json.dumps and thus all responses with backend.
+
+    backend defaults to the JSON_BACKEND setting. If its library is not
+    installed the stdlib encoder is used.
+    """
+    backend = backend or app.config['JSON_BACKEND']
+    if backend not in JSON_BACKENDS:
+        raise ValueError(
+            f"Unknown JSON backend {backend!r}, choose one of {', '.join(JSON_BACKENDS)}")
+    try:
+        app.json = JSON_BACKENDS[backend](app)
+    except ImportError:
+        logging.warning("JSON backend %s is not installed, falling back to stdlib", backend)
+        backend = 'stdlib'
+        app.json = DefaultJSONProvider(app)
+    app.extensions['json_backend'] = backend
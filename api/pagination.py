@@ -0,0 +1,62 @@
+"""Cursors and row counts for paginated collections."""
+import base64
+import binascii
+import json
+import time
+
+from flask import abort, current_app
+from sqlalchemy import func, select, text
+
+from api import fdb
+
+
+def encode_cursor(**position):
+    """Return an opaque cursor for the position after a row, e.g. encode_cursor(id='m42')."""
+    data = json.dumps(position, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(data).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Return the position of a cursor, abort with 400 if it is malformed."""
+    try:
+        data = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        position = json.loads(data)
+    except (binascii.Error, ValueError):
+        abort(400)
+    if not isinstance(position, dict):
+        abort(400)
+    return position
+
+
+def cached_count(model):
+    """
+    Exact number of rows of a model, cached for COUNT_CACHE_TTL seconds.
+
+    The corpus does not change between reseeds, so there is no need for a
+    COUNT(*) on every request.
+    """
+    cache = current_app.extensions.setdefault('row_counts', {})
+    table_name = model.__table__.name
+    count, expires = cache.get(table_name, (None, 0))
+    if count is None or expires < time.monotonic():
+        count = fdb.session.execute(select(func.count()).select_from(model)).scalar()
+        cache[table_name] = (count, time.monotonic() + current_app.config['COUNT_CACHE_TTL'])
+    return count
+
+
+def estimated_count(model):
+    """Planner estimate of the number of rows on PostgreSQL, the cached exact count elsewhere."""
+    if fdb.session.get_bind().dialect.name == 'postgresql':
+        estimate = fdb.session.execute(
+            text('SELECT reltuples FROM pg_class WHERE oid = CAST(:table AS regclass)'),
+            {'table': model.__table__.name}
+        ).scalar()
+        if estimate is not None and estimate >= 0:
+            return int(estimate)
+    return cached_count(model)
+
+
+COUNT_METHODS = {
+    'exact': cached_count,
+    'estimate': estimated_count,
+}
@@ -0,0 +1,49 @@
+"""Serializers that turn model instances and result rows into dicts, built once per model."""
+from operator import attrgetter
+
+from sqlalchemy import inspect, select
+
+from db.models import Base
+
+_serializers = {}
+
+
+class ModelSerializer:
+    """
+    Serialize instances of a model, or rows of its columns, to dicts.
+
+    The column keys and an attrgetter for them are looked up once, instead of
+    inspecting the mapper for every object.
+    """
+
+    def __init__(self, model):
+        column_attrs = inspect(model).column_attrs
+        self.model = model
+        self.keys = tuple(attr.key for attr in column_attrs)
+        self.columns = tuple(getattr(model, key) for key in self.keys)
+        getter = attrgetter(*self.keys)
+        self._values = getter if len(self.keys) > 1 else lambda obj: (getter(obj),)
+
+    def __call__(self, obj):
+        return dict(zip(self.keys, self._values(obj)))
+
+    def from_row(self, row):
+        """Serialize a Core row or tuple with the values of self.columns, in that order."""
+        return dict(zip(self.keys, row))
+
+    def select(self):
+        """Select the columns of the model, for rows that can be passed to from_row."""
+        return select(*self.columns)
+
+
+def serializer_for(model):
+    serializer = _serializers.get(model)
+    if serializer is None:
+        serializer = _serializers[model] = ModelSerializer(model)
+    return serializer
+
+
+def init_app(app):
+    """Build the serializers of all mapped models at startup."""
+    for mapper in Base.registry.mappers:
+        serializer_for(mapper.class_)
@@ -0,0 +1,134 @@
+"""Read-only snapshot of the corpus, to serve the API without the database."""
+import logging
+import os
+import time
+from bisect import bisect_right
+
+from flask import current_app
+
+from api import fdb
+from db.corpus import Corpus
+from db.models import Character, Conversation, Genre, Line, Movie
+from db.snapshot_file import open_snapshot
+
+# The related model of each relationship that can be included and how it is
+# serialized, as in fieldsets.INCLUDES: as records, IDs or names
+INCLUDES = {
+    (Movie, 'characters'): (Character, 'records'),
+    (Movie, 'conversations'): (Conversation, 'ids'),
+    (Movie, 'genres'): (Genre, 'names'),
+    (Character, 'conversations'): (Conversation, 'ids'),
+    (Character, 'lines'): (Line, 'ids'),
+    (Conversation, 'characters'): (Character, 'ids'),
+    (Conversation, 'lines'): (Line, 'ids'),
+}
+
+
+class SortedIds:
+    """The IDs of a table in ID order, as a sequence for bisect."""
+
+    def __init__(self, table):
+        self.ids = table.ids
+        self.rows = table.rows_by_id()
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __getitem__(self, i):
+        return self.ids[self.rows[i]]
+
+
+class Snapshot:
+    """
+    Serve records of a Corpus, loaded from the database or memory-mapped from a snapshot file.
+
+    Responses are the same byte for byte as those of the SQL-backed routes.
+    """
+
+    def __init__(self, corpus):
+        self.tables = corpus.tables
+        self.relations = corpus.relations
+        self.version = corpus.version
+
+    def related_records(self, model, name, row):
+        target_model, kind = INCLUDES[model, name]
+        target = self.tables[target_model]
+        related = self.relations[model, name][row]
+        if kind == 'records':
+            return [target.record(i) for i in related]
+        if kind == 'names':
+            return [target.columns['name'][i] for i in related]
+        return [target.ids[i] for i in related]
+
+    def serialize(self, fieldset, row):
+        data = self.tables[fieldset.model].record(row, fieldset.fields)
+        for name in fieldset.includes:
+            data[name] = self.related_records(fieldset.model, name, row)
+        return data
+
+    def record(self, fieldset, entity_id):
+        """The record of entity_id, or None if there is none."""
+        row = self.tables[fieldset.model].index.get(entity_id)
+        return self.serialize(fieldset, row) if row is not None else None
+
+    def records_by_id(self, fieldset, ids):
+        index = self.tables[fieldset.model].index
+        records = {}
+        for entity_id in ids:
+            row = index.get(entity_id)
+            if row is not None:
+                records[entity_id] = self.serialize(fieldset, row)
+        return records
+
+    def lines(self, model, entity_id):
+        """The line records of a movie or conversation, or None if it does not exist."""
+        row = self.tables[model].index.get(entity_id)
+        if row is None:
+            return None
+        lines = self.tables[Line]
+        return [lines.record(i) for i in self.relations[model, 'lines'][row]]
+
+    def movies(self, fieldset, start, limit):
+        """A page of movies in ID order, like ?start=&limit=."""
+        rows = self.tables[Movie].rows_by_id()[start:start + limit]
+        return [self.serialize(fieldset, row) for row in rows]
+
+    def movies_after(self, fieldset, last_id, limit):
+        """Up to limit movies with IDs after last_id in ID order, like ?after=."""
+        movies = self.tables[Movie]
+        start = bisect_right(SortedIds(movies), last_id) if last_id is not None else 0
+        rows = movies.rows_by_id()[start:start + limit]
+        return [self.serialize(fieldset, row) for row in rows]
+
+    def count(self, model):
+        return len(self.tables[model])
+
+
+def current_snapshot():
+    """The snapshot the app serves from, or None if it is backed by the database."""
+    return current_app.extensions['snapshot']
+
+
+def init_app(app):
+    """
+    Load the snapshot of the corpus at startup.
+
+    With SNAPSHOT_PATH the snapshot file built by flask build-snapshot is
+    memory-mapped, with SNAPSHOT_MODE the corpus is loaded from the database.
+    """
+    start = time.perf_counter()
+    path = app.config['SNAPSHOT_PATH']
+    if path and not os.path.exists(path):
+        logging.warning("snapshot file %s does not exist, run flask build-snapshot", path)
+        path = None
+    if path:
+        corpus = open_snapshot(path)
+    elif app.config['SNAPSHOT_MODE']:
+        with app.app_context(), fdb.engine.connect() as connection:
+            corpus = Corpus.load(connection)
+    else:
+        app.extensions['snapshot'] = None
+        return
+    app.extensions['snapshot'] = Snapshot(corpus)
+    logging.info("loaded snapshot of %s lines in %.3fs", len(corpus.tables[Line]),
+                 time.perf_counter() - start)
@@ -0,0 +1,48 @@
+"""Streaming responses for large collections."""
+from flask import Response, current_app, json, request, stream_with_context
+
+from api import fdb
+
+NDJSON_MIMETYPE = 'application/x-ndjson'
+
+
+def wants_ndjson():
+    """True if the client asked for newline delimited JSON (?stream=1 or the Accept header)."""
+    if request.args.get('stream', 0, type=int) == 1:
+        return True
+    best = request.accept_mimetypes.best_match(['application/json', NDJSON_MIMETYPE])
+    return best == NDJSON_MIMETYPE
+
+
+def stream_rows(statement):
+    """Execute statement once iterated, fetching STREAM_BATCH_SIZE rows at a time with yield_per."""
+    batch_size = current_app.config['STREAM_BATCH_SIZE']
+    yield from fdb.session.execute(statement.execution_options(yield_per=batch_size))
+
+
+def ndjson_chunk(rows, serialize):
+    """One chunk of a newline delimited JSON body: a line for every row."""
+    return '\n'.join(json.dumps(serialize(row)) for row in rows) + '\n'
+
+
+def ndjson_response(rows, serialize):
+    """
+    Stream rows as newline delimited JSON.
+
+    rows is consumed while the response is sent (e.g. stream_rows of a
+    statement) and every STREAM_BATCH_SIZE rows are sent as one chunk, so
+    memory per request stays flat regardless of the result size.
+    """
+    batch_size = current_app.config['STREAM_BATCH_SIZE']
+
+    def generate():
+        chunk = []
+        for row in rows:
+            chunk.append(row)
+            if len(chunk) == batch_size:
+                yield ndjson_chunk(chunk, serialize)
+                chunk = []
+        if chunk:
+            yield ndjson_chunk(chunk, serialize)
+
+    return Response(stream_with_context(generate()), mimetype=NDJSON_MIMETYPE)
@@ -0,0 +1 @@
+"""Benchmarks for the seed pipeline and the API, run as ``python -m benchmarks.<name>``."""
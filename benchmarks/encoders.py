@@ -0,0 +1,52 @@
+"""Compare the encode throughput of the JSON backends on the movie documents of the API."""
+import argparse
+import time
+
+from api.blueprints.routes import collect_movie_data, movie_query
+from api.factory import create_app
+from api.json_backends import JSON_BACKENDS
+from config import Config
+
+
+def movie_payloads(app):
+    with app.app_context():
+        return [collect_movie_data(movie) for movie in movie_query()]
+
+
+def encode_rate(app, payloads, repeat):
+    """Documents and bytes encoded per second by the JSON provider of app."""
+    encoded = 0
+    with app.app_context():
+        start = time.perf_counter()
+        for _ in range(repeat):
+            for payload in payloads:
+                encoded += len(app.json.response(payload).get_data())
+        elapsed = time.perf_counter() - start
+    return len(payloads) * repeat / elapsed, encoded / elapsed
+
+
+def run(repeat):
+    payloads = movie_payloads(create_app(Config, json_backend='stdlib'))
+    print(f"{len(payloads)} movie documents")
+    print(f"{'backend':<8} {'docs/s':>10} {'MB/s':>8} {'speedup':>8}")
+    baseline = None
+    for backend in JSON_BACKENDS:
+        app = create_app(Config, json_backend=backend)
+        if app.extensions['json_backend'] != backend:
+            print(f"{backend:<8} not installed")
+            continue
+        docs_per_second, bytes_per_second = encode_rate(app, payloads, repeat)
+        baseline = baseline or docs_per_second
+        print(f"{backend:<8} {docs_per_second:>10.0f} {bytes_per_second / 1e6:>8.1f} "
+              f"{docs_per_second / baseline:>7.2f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+    run(args.repeat)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+"""Compare peak memory of the line to conversation mapping: dict vs. LineConversationMap."""
+import argparse
+import multiprocessing
+import resource
+import tracemalloc
+
+from db import seed
+from db.linemap import LineConversationMap
+from db.models import Conversation
+
+
+def conversations():
+    rows = seed.prepare_data(seed.CONVERSATION_DATA, Conversation.file_mapping)
+    return (line_ids for _, line_ids in rows)
+
+
+def conversation_line_ids(scale, max_line):
+    """Yield (line_id, conv_id) of the corpus, repeated scale times with shifted IDs."""
+    conv_id = 0
+    for copy in range(scale):
+        for line_ids in conversations():
+            conv_id += 1
+            for l_id in line_ids:
+                yield f"L{int(l_id[1:]) + copy * max_line}", conv_id
+
+
+def measure(args):
+    corpus_path, mapping_type, scale = args
+    seed.CORPUS_PATH = corpus_path
+    max_line = max(int(l_id[1:]) for line_ids in conversations() for l_id in line_ids) + 1
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    # Like seeding: line IDs are parsed from the file and only the mapping keeps them
+    tracemalloc.start()
+    mapping = {} if mapping_type == 'dict' else LineConversationMap()
+    count = 0
+    for line_id, conv_id in conversation_line_ids(scale, max_line):
+        mapping[line_id] = conv_id
+        count += 1
+    for line_id, conv_id in conversation_line_ids(scale, max_line):
+        assert mapping[line_id] >= conv_id
+    size, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    rss_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return mapping_type, count, size, peak, rss_before, rss_after
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--corpus', default=seed.CORPUS_PATH,
+                        help='directory with the corpus files')
+    parser.add_argument('--scale', type=int, default=1,
+                        help='repeat the corpus to simulate larger ones')
+    args = parser.parse_args()
+
+    # Fresh process per mapping, so the peak RSS of one does not hide the other
+    context = multiprocessing.get_context('spawn')
+    print(f"{'mapping':<8} {'lines':>9} {'size (MiB)':>11} {'peak (MiB)':>11} "
+          f"{'RSS before (MiB)':>17} {'peak RSS (MiB)':>15}")
+    for mapping_type in ('dict', 'compact'):
+        with context.Pool(1) as pool:
+            result = pool.apply(measure, ((args.corpus, mapping_type, args.scale),))
+        name, count, size, peak, rss_before, rss_after = result
+        print(f"{name:<8} {count:>9} {size / 2**20:>11.1f} {peak / 2**20:>11.1f} "
+              f"{rss_before / 1024:>17.1f} {rss_after / 1024:>15.1f}")
+
+
+if __name__ == '__main__':
+    main()
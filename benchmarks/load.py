@@ -0,0 +1,183 @@
+"""
+Load test the WSGI and the ASGI app with many concurrent keep-alive clients.
+
+Each client requests the paths in turn for the given duration; the result is
+the throughput, latency percentiles and errors of each server. With --serve
+the WSGI app is started with gunicorn (sync workers) and the ASGI app with
+uvicorn, with the same number of worker processes each.
+"""
+import argparse
+import asyncio
+import socket
+import subprocess
+import sys
+import time
+from urllib.parse import urlsplit
+
+from config import API_BASE_PATH
+
+DEFAULT_PATHS = (
+    '/movies/m0',
+    '/movies?limit=20',
+    '/characters/u0?include=conversations,lines',
+    '/conversations/1/lines',
+    '/lines?ids=L1045,L985,L984',
+)
+SERVERS = {
+    'wsgi': [sys.executable, '-m', 'gunicorn', '--workers', '{workers}', '--bind', '{host}:{port}',
+             'api:app'],
+    'asgi': [sys.executable, '-m', 'uvicorn', '--workers', '{workers}', '--host', '{host}',
+             '--port', '{port}', '--no-access-log', 'api.asgi:app'],
+}
+
+
+async def read_response(reader):
+    """Read one HTTP/1.1 response, return its status and whether the connection stays open."""
+    status_line = await reader.readline()
+    if not status_line:
+        raise ConnectionError('connection closed by the server')
+    status = int(status_line.split()[1])
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+
+    if headers.get('transfer-encoding') == 'chunked':
+        while True:
+            size = int((await reader.readline()).split(b';')[0], 16)
+            await reader.readexactly(size + 2)
+            if size == 0:
+                break
+    else:
+        await reader.readexactly(int(headers.get('content-length', 0)))
+    return status, headers.get('connection', '').lower() != 'close'
+
+
+async def client(host, port, requests, deadline, latencies, errors):
+    """Send requests one after another on a keep-alive connection until deadline."""
+    reader = writer = None
+    i = 0
+    while time.perf_counter() < deadline:
+        request = requests[i % len(requests)]
+        i += 1
+        start = time.perf_counter()
+        try:
+            if writer is None:
+                reader, writer = await asyncio.open_connection(host, port)
+            writer.write(request)
+            status, keep_alive = await read_response(reader)
+        except (ConnectionError, OSError, asyncio.IncompleteReadError, ValueError, IndexError):
+            errors.append(None)
+            keep_alive = False
+        else:
+            latencies.append(time.perf_counter() - start)
+            if status != 200:
+                errors.append(status)
+        if not keep_alive and writer is not None:
+            writer.close()
+            reader = writer = None
+    if writer is not None:
+        writer.close()
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * fraction))]
+
+
+async def load(url, paths, concurrency, duration):
+    """Run concurrency clients against url for duration seconds, return the statistics."""
+    parts = urlsplit(url)
+    host, port = parts.hostname, parts.port or 80
+    requests = [
+        (f'GET {parts.path.rstrip("/")}{API_BASE_PATH}{path} HTTP/1.1\r\n'
+         f'Host: {parts.netloc}\r\nConnection: keep-alive\r\n\r\n').encode()
+        for path in paths
+    ]
+    latencies, errors = [], []
+    start = time.perf_counter()
+    deadline = start + duration
+    await asyncio.gather(*(
+        client(host, port, requests[i % len(requests):] + requests[:i % len(requests)], deadline,
+               latencies, errors)
+        for i in range(concurrency)
+    ))
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    return {
+        'requests': len(latencies),
+        'requests_per_second': len(latencies) / elapsed,
+        'p50_ms': percentile(latencies, 0.5) * 1000,
+        'p99_ms': percentile(latencies, 0.99) * 1000,
+        'errors': len(errors),
+    }
+
+
+def wait_for_port(host, port, timeout=30.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection((host, port), timeout=1):
+                return
+        except OSError:
+            time.sleep(0.1)
+    raise TimeoutError(f"Nothing listens on {host}:{port} after {timeout} seconds")
+
+
+def serve(kind, host, port, workers):
+    command = [arg.format(workers=workers, host=host, port=port) for arg in SERVERS[kind]]
+    process = subprocess.Popen(command, stdout=subprocess.DEVNULL)
+    try:
+        wait_for_port(host, port)
+    except TimeoutError:
+        process.terminate()
+        raise
+    return process
+
+
+def run(name, url, paths, concurrency, duration):
+    stats = asyncio.run(load(url, paths, concurrency, duration))
+    print(f"{name:<8} {stats['requests']:>9} {stats['requests_per_second']:>9.0f} "
+          f"{stats['p50_ms']:>8.1f} {stats['p99_ms']:>8.1f} {stats['errors']:>7}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--wsgi-url', help='Base URL of a running WSGI server.')
+    parser.add_argument('--asgi-url', help='Base URL of a running ASGI server.')
+    parser.add_argument('--serve', action='store_true', help='Start both servers on localhost.')
+    parser.add_argument('--workers', type=int, default=2,
+                        help='Worker processes of each server (with --serve).')
+    parser.add_argument('--concurrency', type=int, default=256)
+    parser.add_argument('--duration', type=float, default=10.0, help='Seconds per server.')
+    parser.add_argument('--path', action='append', dest='paths',
+                        help=f'Path below {API_BASE_PATH} to request, repeatable '
+                             '[default: a mix of endpoints].')
+    args = parser.parse_args()
+
+    paths = args.paths or DEFAULT_PATHS
+    urls = (('wsgi', args.wsgi_url), ('asgi', args.asgi_url))
+    targets = [(name, url) for name, url in urls if url]
+    if not targets and not args.serve:
+        parser.error('give --wsgi-url and/or --asgi-url, or --serve')
+
+    print(f"{args.concurrency} clients, {args.duration:.0f}s, {len(paths)} paths")
+    print(f"{'server':<8} {'requests':>9} {'req/s':>9} {'p50 ms':>8} {'p99 ms':>8} {'errors':>7}")
+    for name, url in targets:
+        run(name, url, paths, args.concurrency, args.duration)
+    if args.serve:
+        for port, kind in enumerate(SERVERS, start=8101):
+            process = serve(kind, '127.0.0.1', port, args.workers)
+            try:
+                run(kind, f'http://127.0.0.1:{port}', paths, args.concurrency, args.duration)
+            finally:
+                process.terminate()
+                process.wait()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,48 @@
+"""Compare db.seed.prepare_data with the parallel chunked parser on the corpus files."""
+import argparse
+import os
+import time
+
+from db import seed
+from db.models import Character, Conversation, Line, Movie
+from db.parse import DEFAULT_CHUNK_SIZE, parallel_prepare_data
+
+CORPUS_FILES = (
+    (seed.MOVIE_DATA, Movie.file_mapping),
+    (seed.CHARACTERS_DATA, Character.file_mapping),
+    (seed.CONVERSATION_DATA, Conversation.file_mapping),
+    (seed.LINE_DATA, Line.file_mapping),
+)
+
+
+def time_rows(rows):
+    start = time.perf_counter()
+    count = sum(1 for _ in rows)
+    return count, time.perf_counter() - start
+
+
+def run(corpus_path, workers, chunk_size):
+    seed.CORPUS_PATH = corpus_path
+    print(f"{'file':<32} {'rows':>8} {'serial (s)':>11} {'parallel (s)':>13} {'speedup':>8}")
+    for file_name, fields in CORPUS_FILES:
+        count, serial = time_rows(seed.prepare_data(file_name, fields))
+        batches = parallel_prepare_data(os.path.join(corpus_path, file_name), fields, workers,
+                                        chunk_size)
+        _, parallel = time_rows(row for batch in batches for row in batch)
+        print(f"{file_name:<32} {count:>8} {serial:>11.3f} {parallel:>13.3f} "
+              f"{serial / parallel:>7.2f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--corpus', default=seed.CORPUS_PATH,
+                        help='directory with the corpus files')
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE,
+                        help='bytes per chunk')
+    args = parser.parse_args()
+    run(args.corpus, args.workers, args.chunk_size)
+
+
+if __name__ == '__main__':
+    main()
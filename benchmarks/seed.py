@@ -0,0 +1,126 @@
+"""Run the seed pipeline against a throwaway database and compare it with a stored baseline."""
+import argparse
+import json
+import os
+import sys
+import tempfile
+
+from sqlalchemy import create_engine
+
+from db import seed
+from db.bulk import DEFAULT_BATCH_SIZE
+from db.instrument import SeedMetrics
+from db.models import Base
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'seed_baseline.json')
+DEFAULT_TOLERANCE = 0.25
+
+
+def run_benchmark(mode='bulk', database_uri=None, batch_size=DEFAULT_BATCH_SIZE, workers=1):
+    """
+    Seed an empty database and return the metrics report.
+
+    Without database_uri a temporary SQLite database is used. A given database
+    is treated as throwaway: all tables are dropped and created again.
+    """
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        database_uri = database_uri or 'sqlite:///' + os.path.join(tmp_dir, 'benchmark.db')
+        engine = create_engine(database_uri)
+        Base.metadata.drop_all(engine)
+        Base.metadata.create_all(engine)
+        engine.dispose()
+
+        metrics = seed.main(mode=mode, batch_size=batch_size, workers=workers,
+                            database_uri=database_uri, metrics=SeedMetrics())
+    return metrics.report()
+
+
+def load_baseline(path=BASELINE_PATH):
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_baseline(report, path=BASELINE_PATH):
+    baseline = load_baseline(path)
+    baseline[report['info']['mode']] = report
+    with open(path, 'w') as f:
+        json.dump(baseline, f, indent=2, sort_keys=True)
+
+
+def compare(report, baseline, tolerance=DEFAULT_TOLERANCE):
+    """
+    Return the regressions of report against the baseline report of the same mode.
+
+    A step regresses if its throughput dropped by more than tolerance or if it
+    executed more SQL statements. Memory is compared by the peak RSS of the
+    whole run, the per-step growth is too noisy to compare.
+    """
+    regressions = []
+    if report['peak_rss_kib'] > baseline['peak_rss_kib'] * (1 + tolerance):
+        regressions.append(f"peak RSS {report['peak_rss_kib']} KiB, "
+                           f"baseline {baseline['peak_rss_kib']} KiB")
+    for name, expected in baseline['steps'].items():
+        current = report['steps'].get(name)
+        if current is None:
+            continue
+        if current['rows_per_second'] < expected['rows_per_second'] * (1 - tolerance):
+            regressions.append(f"{name}: {current['rows_per_second']:.0f} rows/s, "
+                               f"baseline {expected['rows_per_second']:.0f} rows/s")
+        if current['statements'] > expected['statements']:
+            regressions.append(f"{name}: {current['statements']} statements, "
+                               f"baseline {expected['statements']}")
+    return regressions
+
+
+def benchmark(mode='bulk', database_uri=None, batch_size=DEFAULT_BATCH_SIZE, workers=1,
+              baseline_path=BASELINE_PATH, tolerance=DEFAULT_TOLERANCE, update_baseline=False):
+    """
+    Run the benchmark, print the report as JSON and return the regressions.
+
+    Without a baseline for the mode there is nothing to pass, that is returned
+    as a failure too (unless update_baseline stores one).
+    """
+    report = run_benchmark(mode, database_uri, batch_size, workers)
+    print(json.dumps(report, indent=2))
+
+    if update_baseline:
+        save_baseline(report, baseline_path)
+        print(f"Baseline for mode {mode!r} written to {baseline_path}.", file=sys.stderr)
+        return []
+
+    baseline = load_baseline(baseline_path).get(mode)
+    if baseline is None:
+        failure = (f"no baseline for mode {mode!r} in {baseline_path}, "
+                   "store one with --update-baseline")
+        print(f"FAILED {failure}", file=sys.stderr)
+        return [failure]
+
+    regressions = compare(report, baseline, tolerance)
+    for regression in regressions:
+        print(f"REGRESSION {regression}", file=sys.stderr)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--corpus', default=seed.CORPUS_PATH,
+                        help='directory with the corpus files')
+    parser.add_argument('--mode', choices=seed.SEED_MODES, default='bulk')
+    parser.add_argument('--database-uri', help='throwaway database, default: temporary SQLite file')
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--baseline', default=BASELINE_PATH)
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE)
+    parser.add_argument('--update-baseline', action='store_true')
+    args = parser.parse_args()
+
+    seed.CORPUS_PATH = args.corpus
+    regressions = benchmark(args.mode, args.database_uri, args.batch_size, args.workers,
+                            args.baseline, args.tolerance, args.update_baseline)
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == '__main__':
+    main()
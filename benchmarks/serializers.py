@@ -0,0 +1,55 @@
+"""Compare serializing lines with per-object inspect(), precompiled serializers and Core rows."""
+import argparse
+import time
+
+from sqlalchemy import create_engine, inspect, select
+from sqlalchemy.orm import Session
+
+from api.serializers import serializer_for
+from config import Config
+from db.models import Line
+
+
+def inspect_as_dict(obj):
+    """The previous object_as_dict, which inspects the mapper for every object."""
+    return {c.key: getattr(obj, c.key)
+            for c in inspect(obj).mapper.column_attrs}
+
+
+def objects_per_second(serialize, items, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for item in items:
+            serialize(item)
+    return len(items) * repeat / (time.perf_counter() - start)
+
+
+def run(database_uri, limit, repeat):
+    engine = create_engine(database_uri)
+    serializer = serializer_for(Line)
+    with Session(engine) as session:
+        objects = session.scalars(select(Line).limit(limit)).all()
+        rows = session.execute(serializer.select().limit(limit)).all()
+
+    results = (
+        ('inspect per object', objects_per_second(inspect_as_dict, objects, repeat)),
+        ('precompiled, ORM objects', objects_per_second(serializer, objects, repeat)),
+        ('precompiled, Core rows', objects_per_second(serializer.from_row, rows, repeat)),
+    )
+    baseline = results[0][1]
+    print(f"{'serializer':<26} {'objects/s':>12} {'speedup':>8}")
+    for name, rate in results:
+        print(f"{name:<26} {rate:>12.0f} {rate / baseline:>7.2f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--database-uri', default=Config.SQLALCHEMY_DATABASE_URI)
+    parser.add_argument('--limit', type=int, default=10000, help='number of lines to serialize')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+    run(args.database_uri, args.limit, args.repeat)
+
+
+if __name__ == '__main__':
+    main()
@@ -9,10 +9,43 @@ class Config:
     SECRET_KEY = os.getenv('SECRET_KEY', 'dev')
     SQLALCHEMY_DATABASE_URI = os.getenv('DATABASE_URI')
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    # Read-only replicas of the GET routes
+    REPLICA_URIS = [uri for uri in os.getenv('REPLICA_URIS', '').split(',') if uri]
+    # Seconds a healthy replica is not checked again and a failed one is skipped
+    REPLICA_CHECK_INTERVAL = float(os.getenv('REPLICA_CHECK_INTERVAL', 5))
+    REPLICA_RETRY_INTERVAL = float(os.getenv('REPLICA_RETRY_INTERVAL', 30))
+    DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', 5))  # connections kept open per engine and process
+    DB_MAX_OVERFLOW = int(os.getenv('DB_MAX_OVERFLOW', 10))  # connections beyond DB_POOL_SIZE
+    DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', 30))  # seconds to wait for a connection
+    DB_POOL_RECYCLE = int(os.getenv('DB_POOL_RECYCLE', 1800))  # seconds until replaced, -1 never
+    DB_POOL_PRE_PING = os.getenv('DB_POOL_PRE_PING', '1') == '1'  # test connections on checkout
+    ASYNC_DATABASE_URI = os.getenv('ASYNC_DATABASE_URI')  # for the ASGI app, default: DATABASE_URI
+    MAX_BATCH_SIZE = int(os.getenv('MAX_BATCH_SIZE', 100))  # IDs per batch request
+    SEARCH_MAX_LIMIT = int(os.getenv('SEARCH_MAX_LIMIT', 100))  # results per search page
+    SAMPLE_MAX_SIZE = int(os.getenv('SAMPLE_MAX_SIZE', 1000))  # rows per random sample
+    COUNT_CACHE_TTL = int(os.getenv('COUNT_CACHE_TTL', 300))  # seconds
+    STREAM_BATCH_SIZE = int(os.getenv('STREAM_BATCH_SIZE', 500))  # rows per NDJSON chunk
+    QUERY_COUNT_HEADER = os.getenv('QUERY_COUNT_HEADER', '') == '1'  # X-Query-Count response header
+    CACHE_MAX_AGE = int(os.getenv('CACHE_MAX_AGE', 3600))  # seconds clients may reuse a response
+    CORPUS_VERSION_TTL = int(os.getenv('CORPUS_VERSION_TTL', 60))  # seconds the version is cached
+    CACHE_BACKEND = os.getenv('CACHE_BACKEND', 'local')  # response cache: local, redis or none
+    CACHE_REDIS_URL = os.getenv('CACHE_REDIS_URL', 'redis://localhost:6379/0')
+    CACHE_KEY_PREFIX = os.getenv('CACHE_KEY_PREFIX', 'cornell')  # namespace of the keys in Redis
+    CACHE_LOCK_TIMEOUT = float(os.getenv('CACHE_LOCK_TIMEOUT', 5))  # seconds to wait for a render
+    # Size of the local cache, 0 disables it
+    RESPONSE_CACHE_MAX_BYTES = int(os.getenv('RESPONSE_CACHE_MAX_BYTES', 64 << 20))
+    RESPONSE_CACHE_TTL = int(os.getenv('RESPONSE_CACHE_TTL', 300))  # seconds
+    RESPONSE_CACHE_TTLS = {}  # seconds per endpoint, e.g. {'routes.get_movie': 3600}
+    # Serve the entity, list and batch routes from an in-memory snapshot; search, stats,
+    # graph and sample routes still use the database
+    SNAPSHOT_MODE = os.getenv('SNAPSHOT_MODE', '') == '1'
+    SNAPSHOT_PATH = os.getenv('SNAPSHOT_PATH')  # memory-map this file of build-snapshot
+    JSON_BACKEND = os.getenv('JSON_BACKEND', 'orjson')  # orjson, ujson or stdlib
     DEBUG = False
     TESTING = False
 
 
 class TestingConfig(Config):
     TESTING = True
+    QUERY_COUNT_HEADER = True
     SQLALCHEMY_DATABASE_URI = os.getenv('TEST_DATABASE_URI', 'sqlite://')  # Use SQLite as fallback
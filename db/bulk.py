@@ -0,0 +1,104 @@
+import io
+import logging
+import time
+from collections import Counter, defaultdict
+
+from db.instrument import get_metrics
+
+DEFAULT_BATCH_SIZE = 10000
+
+
+def batched(iterable, size):
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def supports_copy(connection):
+    dialect = connection.dialect
+    return dialect.name == 'postgresql' and dialect.driver == 'psycopg2'
+
+
+def copy_value(value):
+    """Encode a value for PostgreSQL's COPY text format."""
+    if value is None:
+        return '\\N'
+    return (str(value)
+            .replace('\\', '\\\\')
+            .replace('\t', '\\t')
+            .replace('\n', '\\n')
+            .replace('\r', '\\r'))
+
+
+def copy_rows(connection, table, rows):
+    """Stream rows (dicts) into table with COPY FROM STDIN."""
+    preparer = connection.dialect.identifier_preparer
+    columns = list(rows[0])
+
+    buffer = io.StringIO()
+    for row in rows:
+        buffer.write('\t'.join(copy_value(row[c]) for c in columns))
+        buffer.write('\n')
+    buffer.seek(0)
+
+    statement = 'COPY {} ({}) FROM STDIN'.format(
+        preparer.format_table(table),
+        ', '.join(preparer.quote(c) for c in columns)
+    )
+    cursor = connection.connection.cursor()
+    try:
+        cursor.copy_expert(statement, buffer)
+    finally:
+        cursor.close()
+
+
+class BulkLoader:
+    """
+    Write plain rows to tables in batches and keep per-table throughput stats.
+
+    Rows are written with COPY when the connection is PostgreSQL/psycopg2 and
+    with a batched executemany of a Core insert() on any other dialect.
+    """
+
+    def __init__(self, connection, batch_size=DEFAULT_BATCH_SIZE):
+        self.connection = connection
+        self.batch_size = batch_size
+        self.use_copy = supports_copy(connection)
+        self.counts = Counter()
+        self.timings = defaultdict(float)
+
+    def write(self, table, rows):
+        """Write a single batch of rows."""
+        if not rows:
+            return 0
+        start = time.perf_counter()
+        with get_metrics().phase('flush'):
+            if self.use_copy:
+                copy_rows(self.connection, table, rows)
+            else:
+                self.connection.execute(table.insert(), rows)
+        self.timings[table.name] += time.perf_counter() - start
+        self.counts[table.name] += len(rows)
+        return len(rows)
+
+    def write_all(self, table, rows):
+        """Write an iterable of rows in batches of batch_size."""
+        return sum(self.write(table, batch) for batch in batched(rows, self.batch_size))
+
+    def rows_per_second(self, table_name):
+        elapsed = self.timings[table_name]
+        return self.counts[table_name] / elapsed if elapsed else 0.0
+
+    def report(self):
+        """Log and return rows written and rows/sec for each table."""
+        stats = {}
+        for table_name, count in self.counts.items():
+            rate = self.rows_per_second(table_name)
+            logging.info("inserted %s rows into %s (%.0f rows/s)", count, table_name, rate)
+            stats[table_name] = {'rows': count, 'rows_per_second': rate}
+        return stats
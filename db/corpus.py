@@ -0,0 +1,155 @@
+"""The seeded corpus as column tables and relationship offsets, loaded from the database."""
+from array import array
+
+from sqlalchemy import inspect, select
+
+from db.manifest import load_corpus_version
+from db.models import Character, Conversation, Genre, Line, Movie, convs_chars, movies_genres
+
+MODELS = (Movie, Character, Conversation, Genre, Line)
+
+
+def column_keys(model):
+    return tuple(attr.key for attr in inspect(model).column_attrs)
+
+
+class Table:
+    """The rows of a model as one list per column, with the row numbers by ID."""
+
+    def __init__(self, model, rows):
+        self.keys = column_keys(model)
+        columns = list(zip(*rows)) or [()] * len(self.keys)
+        self.columns = {key: list(column) for key, column in zip(self.keys, columns)}
+        self.ids = self.columns['id']
+        self.index = {id_: row for row, id_ in enumerate(self.ids)}
+        self._rows_by_id = None
+
+    def __len__(self):
+        return len(self.ids)
+
+    def record(self, row, fields=None):
+        return {field: self.columns[field][row] for field in fields or self.keys}
+
+    def rows_by_id(self):
+        """Row numbers in the order of their IDs."""
+        if self._rows_by_id is None:
+            self._rows_by_id = array('q', sorted(range(len(self)), key=self.ids.__getitem__))
+        return self._rows_by_id
+
+
+class Relation:
+    """
+    The related rows of every row of a table in compressed sparse row form.
+
+    The rows related to row i are targets[offsets[i]:offsets[i + 1]], in the
+    order of the pairs they were built from.
+    """
+
+    def __init__(self, offsets, targets):
+        self.offsets = offsets
+        self.targets = targets
+
+    @classmethod
+    def from_pairs(cls, size, pairs):
+        pairs = list(pairs)
+        offsets = array('q', bytes(8 * (size + 1)))
+        for source, _ in pairs:
+            offsets[source + 1] += 1
+        for i in range(size):
+            offsets[i + 1] += offsets[i]
+        targets = array('q', bytes(8 * len(pairs)))
+        fill = array('q', offsets[:-1])
+        for source, target in pairs:
+            targets[fill[source]] = target
+            fill[source] += 1
+        return cls(offsets, targets)
+
+    def __getitem__(self, row):
+        return self.targets[self.offsets[row]:self.offsets[row + 1]]
+
+
+def referencing(index, keys, rows=None):
+    """
+    Row number pairs (referenced row, row) of a foreign key column.
+
+    Keys that are not in index are skipped. The rows are visited in table
+    order, or in the order of rows if given.
+    """
+    for row in range(len(keys)) if rows is None else rows:
+        referenced = index.get(keys[row])
+        if referenced is not None:
+            yield referenced, row
+
+
+def linked(source_index, target_index, links):
+    """Row number pairs of the (source ID, target ID) rows of an association table."""
+    for source_id, target_id in links:
+        source = source_index.get(source_id)
+        target = target_index.get(target_id)
+        if source is not None and target is not None:
+            yield source, target
+
+
+def by_target(links):
+    """The (source ID, target ID) rows of an association table in target ID order."""
+    return sorted(links, key=lambda link: link[1])
+
+
+def dialog_key(lines):
+    """Sort key of line rows like models.DIALOG_ORDER, where NULL comes first."""
+    positions = lines.columns['position']
+    return lambda row: (positions[row] is not None, positions[row] or 0, lines.ids[row])
+
+
+class Corpus:
+    """
+    All movies, characters, conversations, genres and lines with their relationships.
+
+    Related rows are in ID order, like the order_by of the relationships the
+    SQL-backed routes load. The lines of movies and conversations are in
+    dialog order, like Movie.lines and Conversation.lines.
+    """
+
+    def __init__(self, tables, relations, version):
+        self.tables = tables
+        self.relations = relations
+        self.version = version
+
+    @classmethod
+    def load(cls, connection):
+        def load_table(model):
+            columns = [getattr(model, key) for key in column_keys(model)]
+            return Table(model, connection.execute(select(*columns)))
+
+        tables = {model: load_table(model) for model in MODELS}
+        movies, characters, conversations, genres, lines = (tables[model] for model in MODELS)
+
+        lines_by_character = list(
+            zip(lines.columns['character_id'], lines.columns['character_name']))
+        dialog_order = sorted(range(len(lines)), key=dialog_key(lines))
+        character_keys = zip(characters.ids, characters.columns['name'])
+        characters_by_key = {key: row for row, key in enumerate(character_keys)}
+        character_links = connection.execute(
+            select(convs_chars.c.character_id, convs_chars.c.conversation_id)).all()
+        genre_links = connection.execute(select(movies_genres.c.movie_id, movies_genres.c.genre_id))
+        relations = {
+            (Movie, 'characters'): referencing(
+                movies.index, characters.columns['movie_id'], characters.rows_by_id()),
+            (Movie, 'conversations'): referencing(
+                movies.index, conversations.columns['movie_id'], conversations.rows_by_id()),
+            (Movie, 'genres'): linked(movies.index, genres.index, by_target(genre_links)),
+            (Movie, 'lines'): referencing(movies.index, lines.columns['movie_id'], dialog_order),
+            (Character, 'conversations'): linked(
+                characters.index, conversations.index, by_target(character_links)),
+            (Character, 'lines'): referencing(
+                characters_by_key, lines_by_character, lines.rows_by_id()),
+            (Conversation, 'characters'): linked(
+                conversations.index, characters.index,
+                by_target((conv, char) for char, conv in character_links)),
+            (Conversation, 'lines'): referencing(
+                conversations.index, lines.columns['conversation_id'], dialog_order),
+        }
+        relations = {
+            key: Relation.from_pairs(len(tables[key[0]]), pairs) for key, pairs in relations.items()
+        }
+        return cls(tables, relations, load_corpus_version(connection))
@@ -0,0 +1,155 @@
+"""Merge duplicate characters, i.e. characters with the same movie and name."""
+import logging
+from collections import defaultdict
+
+from sqlalchemy import Column, MetaData, String, Table, func, select
+
+from db.models import Character, CharacterAlias, Conversation, Line, convs_chars
+
+alias_table = CharacterAlias.__table__
+
+
+def find_duplicate_characters(connection):
+    """
+    Map the ID of each duplicate character to the (id, name) of the character that replaces it.
+
+    The character with the lowest ID of each group is kept.
+    """
+    groups = (
+        select(Character.movie_id, Character.name)
+        .where(Character.name.isnot(None))
+        .group_by(Character.movie_id, Character.name)
+        .having(func.count() > 1)
+        .subquery()
+    )
+    rows = connection.execute(
+        select(Character.id, Character.movie_id, Character.name)
+        .join(groups, (Character.movie_id == groups.c.movie_id) & (Character.name == groups.c.name))
+    )
+
+    characters = defaultdict(list)
+    for char_id, movie_id, name in rows:
+        characters[movie_id, name].append(char_id)
+
+    duplicates = {}
+    for (_, name), char_ids in characters.items():
+        real_id, *dup_ids = sorted(char_ids, key=lambda c: (len(c), c))  # 'u999' < 'u1000'
+        for dup_id in dup_ids:
+            duplicates[dup_id] = (real_id, name)
+    return duplicates
+
+
+def load_aliases(connection):
+    """The duplicates merged so far, in the format of find_duplicate_characters."""
+    return {
+        row.dup_id: (row.real_id, row.real_name)
+        for row in connection.execute(select(alias_table))
+    }
+
+
+def save_aliases(connection, duplicates):
+    """
+    Record the merged duplicates, so that reloaded lines and conversations are mapped as well.
+
+    Earlier aliases that point to a character merged now are pointed to its
+    replacement.
+    """
+    aliases = load_aliases(connection)
+    for dup_id, (real_id, real_name) in aliases.items():
+        if real_id in duplicates:
+            aliases[dup_id] = duplicates[real_id]
+    aliases.update(duplicates)
+    connection.execute(alias_table.delete())
+    connection.execute(alias_table.insert(), [
+        {'dup_id': dup_id, 'real_id': real_id, 'real_name': real_name}
+        for dup_id, (real_id, real_name) in aliases.items()
+    ])
+
+
+def duplicates_table():
+    return Table(
+        'character_duplicates',
+        MetaData(),
+        Column('dup_id', String, primary_key=True),
+        Column('real_id', String),
+        Column('real_name', String),
+        prefixes=['TEMPORARY'],
+    )
+
+
+def count_references(connection, dup_ids):
+    return {
+        'lines': connection.execute(
+            select(func.count()).where(Line.character_id.in_(dup_ids))
+        ).scalar(),
+        'conversations': connection.execute(
+            select(func.count()).where(
+                Conversation.first_char_id.in_(dup_ids) | Conversation.second_char_id.in_(dup_ids)
+            )
+        ).scalar(),
+        'convs_chars': connection.execute(
+            select(func.count()).where(convs_chars.c.character_id.in_(dup_ids))
+        ).scalar(),
+    }
+
+
+def merge_duplicates(connection, table):
+    """Point all references to the replacing characters and delete the duplicates."""
+    dup_ids = select(table.c.dup_id)
+
+    def replacement(column, key):
+        return select(table.c[column]).where(table.c.dup_id == key).scalar_subquery()
+
+    connection.execute(
+        Line.__table__.update()
+        .where(Line.character_id.in_(dup_ids))
+        .values(character_id=replacement('real_id', Line.character_id),
+                character_name=replacement('real_name', Line.character_id))
+    )
+    for key in (Conversation.first_char_id, Conversation.second_char_id):
+        connection.execute(
+            Conversation.__table__.update()
+            .where(key.in_(dup_ids))
+            .values({key.key: replacement('real_id', key)})
+        )
+    connection.execute(
+        convs_chars.update()
+        .where(convs_chars.c.character_id.in_(dup_ids))
+        .values(character_id=replacement('real_id', convs_chars.c.character_id))
+    )
+    connection.execute(Character.__table__.delete().where(Character.id.in_(dup_ids)))
+
+
+def dedupe_characters(connection, dry_run=False):
+    """
+    Merge duplicate characters into the character with the lowest ID.
+
+    Lines, conversations and convs_chars are updated with a fixed number of
+    statements, independent of how many rows refer to the duplicates. Returns a
+    report of the duplicates and the number of rows that refer to them; with
+    dry_run nothing is changed.
+    """
+    duplicates = find_duplicate_characters(connection)
+    report = {
+        'duplicates': {dup_id: real_id for dup_id, (real_id, _) in duplicates.items()},
+        'references': count_references(connection, list(duplicates)),
+        'dry_run': dry_run,
+    }
+    if not duplicates:
+        logging.info("no duplicate characters found")
+        return report
+    logging.info("%s duplicate characters found", len(duplicates))
+    if dry_run:
+        return report
+
+    # Created in the current transaction, a failure rolls the table back as well
+    table = duplicates_table()
+    table.create(connection)
+    connection.execute(table.insert(), [
+        {'dup_id': dup_id, 'real_id': real_id, 'real_name': real_name}
+        for dup_id, (real_id, real_name) in duplicates.items()
+    ])
+    merge_duplicates(connection, table)
+    table.drop(connection)
+    save_aliases(connection, duplicates)
+    return report
@@ -0,0 +1,106 @@
+"""Who talks to whom: the characters and their weighted conversation edges as an adjacency array."""
+from array import array
+from itertools import groupby
+
+from sqlalchemy import select
+
+from db.corpus import Relation
+from db.models import Character, CharacterPairStats, Movie
+
+
+class CharacterGraph:
+    """
+    The characters of all movies and the edges between conversation partners.
+
+    Characters are numbered by (movie_id, id), so the characters of a movie
+    are the consecutive rows movie_rows[movie_id]. The edges of row i are
+    adjacency[i], numbers into the partners, conversations and lines arrays,
+    most conversations first. Every edge is stored in both directions.
+    """
+
+    def __init__(self, ids, names, movie_rows, adjacency, partners, conversations, lines):
+        self.ids = ids
+        self.names = names
+        self.index = {id_: row for row, id_ in enumerate(ids)}
+        self.movie_rows = movie_rows
+        self.adjacency = adjacency
+        self.partners = partners
+        self.conversations = conversations
+        self.lines = lines
+
+    @classmethod
+    def load(cls, connection):
+        """Build the graph from the characters and character_pair_stats tables."""
+        characters = connection.execute(
+            select(Character.id, Character.name, Character.movie_id)
+            .order_by(Character.movie_id, Character.id)
+        ).all()
+        ids = [row.id for row in characters]
+        names = [row.name for row in characters]
+
+        movie_ids = connection.execute(select(Movie.id)).scalars()
+        movie_rows = {movie_id: range(0) for movie_id in movie_ids}
+        for movie_id, rows in groupby(range(len(characters)),
+                                      key=lambda row: characters[row].movie_id):
+            rows = list(rows)
+            if movie_id in movie_rows:
+                movie_rows[movie_id] = range(rows[0], rows[-1] + 1)
+
+        index = {id_: row for row, id_ in enumerate(ids)}
+        pairs = connection.execute(
+            select(CharacterPairStats.character_id, CharacterPairStats.partner_id,
+                   CharacterPairStats.conversations, CharacterPairStats.lines)
+        )
+        edges = sorted(
+            (index[character_id], -conversations, index[partner_id], lines)
+            for character_id, partner_id, conversations, lines in pairs
+            if character_id in index and partner_id in index
+        )
+        adjacency = Relation.from_pairs(
+            len(ids), ((edge[0], number) for number, edge in enumerate(edges)))
+        return cls(
+            ids, names, movie_rows, adjacency,
+            partners=array('q', (edge[2] for edge in edges)),
+            conversations=array('q', (-edge[1] for edge in edges)),
+            lines=array('q', (edge[3] for edge in edges)),
+        )
+
+    def node(self, row):
+        return {'id': self.ids[row], 'name': self.names[row]}
+
+    def neighbors(self, character_id):
+        """
+        The partners of a character with the conversations and lines they share.
+
+        None for unknown IDs.
+        """
+        row = self.index.get(character_id)
+        if row is None:
+            return None
+        return [
+            dict(self.node(self.partners[edge]), conversations=self.conversations[edge],
+                 lines=self.lines[edge])
+            for edge in self.adjacency[row]
+        ]
+
+    def movie_graph(self, movie_id):
+        """
+        The characters of a movie and the edges between them, each edge once.
+
+        None for unknown movie IDs.
+        """
+        rows = self.movie_rows.get(movie_id)
+        if rows is None:
+            return None
+        edges = [
+            {
+                'source': self.ids[row],
+                'target': self.ids[self.partners[edge]],
+                'conversations': self.conversations[edge],
+                'lines': self.lines[edge],
+            }
+            for row in rows
+            for edge in self.adjacency[row]
+            if row < self.partners[edge] < rows.stop
+        ]
+        return {'nodes': [self.node(row) for row in rows], 'edges': edges}
@@ -0,0 +1,211 @@
+"""Timing, throughput, memory and SQL statement metrics of the seed pipeline."""
+import json
+import resource
+import sys
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+from sqlalchemy import event
+
+PHASES = ('parse', 'build', 'flush', 'commit')
+
+# The SeedMetrics that get_metrics() returns, set by SeedMetrics.activate()
+_active = None
+
+
+def peak_rss_kib():
+    """High-water mark of the resident set size of this process in KiB."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak // 1024 if sys.platform == 'darwin' else peak  # bytes on macOS
+
+
+class StatementCounter:
+    """Count the SQL statements executed on an engine (an executemany counts once)."""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.count = 0
+
+    def _before_cursor_execute(self, *args):
+        self.count += 1
+
+    def __enter__(self):
+        event.listen(self.engine, 'before_cursor_execute', self._before_cursor_execute)
+        return self
+
+    def __exit__(self, *exc_info):
+        event.remove(self.engine, 'before_cursor_execute', self._before_cursor_execute)
+
+
+class Step:
+
+    def __init__(self, name):
+        self.name = name
+        self.rows = 0
+        self.phases = Counter()
+        self.seconds = 0.0
+        self.statements = 0
+        self.rss_growth_kib = 0
+
+    def as_dict(self):
+        phases = dict(self.phases)
+        # Whatever is not parsing or talking to the database is spent building objects/rows
+        phases['build'] = max(0.0, self.seconds - sum(phases.values()))
+        return {
+            'rows': self.rows,
+            'seconds': self.seconds,
+            'rows_per_second': self.rows / self.seconds if self.seconds else 0.0,
+            'phases': {phase: phases.get(phase, 0.0) for phase in PHASES},
+            'statements': self.statements,
+            'rss_growth_kib': self.rss_growth_kib,
+        }
+
+
+class SeedMetrics:
+    """
+    Collect per-step metrics of a seed run.
+
+    A step is one table (or the cleanup); its time is split into the phases
+    parse, build, flush and commit. Activate an instance so that the seed
+    functions can report to it through get_metrics().
+    """
+
+    def __init__(self, **info):
+        self.info = info
+        self.steps = {}
+        self.current = None
+        self.counter = None
+        self.seconds = 0.0
+
+    @contextmanager
+    def activate(self, engine=None):
+        """Report to this instance, counting the statements executed on engine."""
+        global _active  # pylint: disable=global-statement
+        previous, _active = _active, self
+        start = time.perf_counter()
+        try:
+            if engine is not None:
+                with StatementCounter(engine) as self.counter:
+                    yield self
+            else:
+                yield self
+        finally:
+            self.seconds += time.perf_counter() - start
+            _active = previous
+
+    @contextmanager
+    def step(self, name):
+        step = self.steps.setdefault(name, Step(name))
+        previous, self.current = self.current, step
+        statements = self.counter.count if self.counter else 0
+        peak = peak_rss_kib()
+        start = time.perf_counter()
+        try:
+            yield step
+        finally:
+            step.seconds += time.perf_counter() - start
+            step.statements += (self.counter.count if self.counter else 0) - statements
+            # The peak only ever grows, what it grew by during the step is the step's share
+            step.rss_growth_kib += peak_rss_kib() - peak
+            self.current = previous
+
+    @contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            if self.current is not None:
+                self.current.phases[name] += time.perf_counter() - start
+
+    def add_phase_time(self, name, seconds):
+        if self.current is not None:
+            self.current.phases[name] += seconds
+
+    def timed(self, rows, phase='parse'):
+        """Wrap an iterator of parsed rows, count them and time the parsing."""
+        rows = iter(rows)
+        clock = time.perf_counter
+        while True:
+            start = clock()
+            try:
+                row = next(rows)
+            except StopIteration:
+                return
+            finally:
+                self.add_phase_time(phase, clock() - start)
+            if self.current is not None:
+                self.current.rows += 1
+            yield row
+
+    def instrument_session(self, session):
+        """Time flushes and commits of an ORM session."""
+        flush_start = []
+        commit_start = []
+
+        @event.listens_for(session, 'before_flush')
+        def before_flush(*args):  # pylint: disable=unused-variable
+            flush_start.append(time.perf_counter())
+
+        @event.listens_for(session, 'after_flush_postexec')
+        def after_flush(*args):  # pylint: disable=unused-variable
+            elapsed = time.perf_counter() - flush_start.pop()
+            self.add_phase_time('flush', elapsed)
+            if commit_start:
+                commit_start[-1][1] += elapsed  # do not count the flush of a commit twice
+
+        @event.listens_for(session, 'before_commit')
+        def before_commit(*args):  # pylint: disable=unused-variable
+            commit_start.append([time.perf_counter(), 0.0])
+
+        @event.listens_for(session, 'after_commit')
+        def after_commit(*args):  # pylint: disable=unused-variable
+            start, flushed = commit_start.pop()
+            self.add_phase_time('commit', time.perf_counter() - start - flushed)
+
+        return session
+
+    def report(self):
+        return {
+            'info': self.info,
+            'seconds': self.seconds,
+            'statements': self.counter.count if self.counter else 0,
+            'peak_rss_kib': peak_rss_kib(),
+            'steps': {name: step.as_dict() for name, step in self.steps.items()},
+        }
+
+    def to_json(self, **kwargs):
+        return json.dumps(self.report(), **kwargs)
+
+
+class NullMetrics:
+    """Stand-in that is used while no SeedMetrics is active."""
+
+    @contextmanager
+    def activate(self, engine=None):
+        yield self
+
+    @contextmanager
+    def step(self, name):
+        yield None
+
+    @contextmanager
+    def phase(self, name):
+        yield
+
+    def add_phase_time(self, name, seconds):
+        pass
+
+    def timed(self, rows, phase='parse'):
+        return rows
+
+    def instrument_session(self, session):
+        return session
+
+
+_null = NullMetrics()
+
+
+def get_metrics():
+    return _active if _active is not None else _null
@@ -0,0 +1,100 @@
+"""Memory-compact mapping of line IDs to conversation IDs used while seeding."""
+import heapq
+from array import array
+from bisect import bisect_right
+
+RUN_SIZE = 1 << 16
+CONV_BITS = 32
+CONV_MASK = (1 << CONV_BITS) - 1
+NUMBER_LIMIT = 1 << (64 - CONV_BITS)  # line numbers from here on do not fit into an entry
+
+
+def line_number(line_id):
+    """Return the number of a line ID like 'L1045', or None if it has another format."""
+    digits = line_id[1:]
+    if line_id[:1] == 'L' and digits.isdigit() and (digits == '0' or digits[0] != '0'):
+        return int(digits)
+    return None
+
+
+class LineConversationMap:
+    """
+    Map line IDs to conversation IDs with 8 bytes per line.
+
+    Line IDs are parsed to integers and packed together with the conversation
+    ID into a single unsigned 64 bit integer. Entries are collected in sorted
+    runs and merged into one sorted array on the first lookup, which then uses
+    binary search. IDs that are not 'L<number>', and lines whose number or
+    conversation ID does not fit into 32 bits, are kept in a plain dict.
+
+    If a line is mapped more than once the highest conversation ID wins, which
+    matches the last assignment of a dict while seeding (conversation IDs
+    increase with every row).
+    """
+
+    def __init__(self):
+        self._runs = []
+        self._buffer = array('Q')
+        self._entries = None
+        self._other = {}
+
+    def __setitem__(self, line_id, conv_id):
+        number = line_number(line_id)
+        if number is None or number >= NUMBER_LIMIT or conv_id > CONV_MASK:
+            self._other[line_id] = conv_id
+            return
+        if self._entries is not None:
+            # Mapping again after a lookup, start a new collection phase
+            self._runs.append(self._entries)
+            self._entries = None
+        self._buffer.append(number << CONV_BITS | conv_id)
+        if len(self._buffer) >= RUN_SIZE:
+            self._flush_buffer()
+
+    def __getitem__(self, line_id):
+        # Checked first: an entry here is newer than a packed entry of the same line,
+        # conversation IDs only grow
+        if line_id in self._other:
+            return self._other[line_id]
+        number = line_number(line_id)
+        if number is None or number >= NUMBER_LIMIT:
+            raise KeyError(line_id)
+
+        entries = self._merged()
+        i = bisect_right(entries, number << CONV_BITS | CONV_MASK)
+        if i and entries[i - 1] >> CONV_BITS == number:
+            return entries[i - 1] & CONV_MASK
+        raise KeyError(line_id)
+
+    def __contains__(self, line_id):
+        try:
+            self[line_id]
+        except KeyError:
+            return False
+        return True
+
+    def get(self, line_id, default=None):
+        try:
+            return self[line_id]
+        except KeyError:
+            return default
+
+    def nbytes(self):
+        """Size of the packed entries in bytes (without the dict of other IDs)."""
+        runs = self._runs + [self._buffer, self._entries or array('Q')]
+        return sum(run.itemsize * len(run) for run in runs)
+
+    def _flush_buffer(self):
+        if self._buffer:
+            self._runs.append(array('Q', sorted(self._buffer)))
+            self._buffer = array('Q')
+
+    def _merged(self):
+        if self._entries is None:
+            self._flush_buffer()
+            if len(self._runs) == 1:
+                self._entries = self._runs[0]
+            else:
+                self._entries = array('Q', heapq.merge(*self._runs))
+            self._runs = []
+        return self._entries
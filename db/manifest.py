@@ -0,0 +1,71 @@
+"""Per corpus file checkpoints of the incremental seed and the version of the seeded corpus."""
+import datetime
+import hashlib
+
+from sqlalchemy import select
+
+from db.models import CorpusVersion, SeedManifest
+
+manifest_table = SeedManifest.__table__
+version_table = CorpusVersion.__table__
+
+
+def file_hash(path, block_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def load_manifest(connection):
+    return {row.file_name: row for row in connection.execute(select(manifest_table))}
+
+
+def save_checkpoint(connection, file_name, **values):
+    """Insert or update the manifest entry of file_name."""
+    values['updated_at'] = datetime.datetime.utcnow()
+    result = connection.execute(
+        manifest_table.update().where(manifest_table.c.file_name == file_name).values(**values)
+    )
+    if result.rowcount == 0:
+        connection.execute(manifest_table.insert().values(file_name=file_name, **values))
+
+
+def clear_manifest(connection, file_names):
+    if file_names:
+        connection.execute(
+            manifest_table.delete().where(manifest_table.c.file_name.in_(file_names)))
+
+
+def content_version(paths):
+    """Version of a corpus, derived from the contents of its files."""
+    digest = hashlib.sha256()
+    for path in paths:
+        digest.update(file_hash(path).encode())
+    return digest.hexdigest()
+
+
+def load_corpus_version(connection):
+    """The (version, seeded_at) row of the seeded corpus, or None if no version was recorded."""
+    return connection.execute(
+        select(version_table).order_by(version_table.c.seeded_at.desc()).limit(1)
+    ).first()
+
+
+def save_corpus_version(connection, version):
+    """Record version as the version of the seeded corpus if it is not, True if it changed."""
+    current = load_corpus_version(connection)
+    if current is not None and current.version == version:
+        return False
+    connection.execute(version_table.delete())
+    connection.execute(
+        version_table.insert().values(version=version, seeded_at=datetime.datetime.utcnow()))
+    return True
+
+
+def bump_corpus_version(connection, reason):
+    """Record a new version after the seeded data was changed in place (e.g. by dedupe)."""
+    current = load_corpus_version(connection)
+    previous = current.version if current is not None else ''
+    save_corpus_version(connection, hashlib.sha256(f'{previous}:{reason}'.encode()).hexdigest())
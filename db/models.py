@@ -1,5 +1,7 @@
 from sqlalchemy import (
+    Boolean,
     Column,
+    DateTime,
     Float,
     ForeignKey,
     ForeignKeyConstraint,
@@ -7,10 +9,11 @@ from sqlalchemy import (
     Integer,
     String,
     Table,
+    event,
 )
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
-from sqlalchemy.schema import MetaData
+from sqlalchemy.schema import DDL, MetaData
 
 metadata = MetaData(
     naming_convention={
@@ -23,26 +26,31 @@ metadata = MetaData(
 )
 Base = declarative_base(metadata=metadata)
 
+# The order of the dialog, lines without a position first on every database
+DIALOG_ORDER = '(Line.position.nulls_first(), Line.id)'
+
 convs_chars = Table(
     'convs_chars',
     Base.metadata,
     Column(
         'conversation_id',
         Integer,
-        ForeignKey('conversations.id', onupdate='CASCADE', ondelete='SET NULL')
+        ForeignKey('conversations.id', onupdate='CASCADE', ondelete='SET NULL'),
+        index=True
     ),
     Column(
         'character_id',
         String,
-        ForeignKey('characters.id', onupdate='CASCADE', ondelete='SET NULL')
+        ForeignKey('characters.id', onupdate='CASCADE', ondelete='SET NULL'),
+        index=True
     )
 )
 
 movies_genres = Table(
     'movie_genres',
     Base.metadata,
-    Column('movie_id', String, ForeignKey('movies.id')),
-    Column('genre_id', Integer, ForeignKey('genres.id'))
+    Column('movie_id', String, ForeignKey('movies.id'), index=True),
+    Column('genre_id', Integer, ForeignKey('genres.id'), index=True)
 )
 
 
@@ -57,10 +65,12 @@ class Movie(Base):
 
     __table_args__ = (Index('ix_movies_id_movie_title', 'id', 'title', unique=True), {})
 
-    characters = relationship('Character', back_populates='movie')
-    conversations = relationship('Conversation', back_populates='movie')
-    genres = relationship('Genre', secondary=movies_genres, back_populates='movies')
-    lines = relationship('Line', back_populates='movie')
+    characters = relationship('Character', back_populates='movie', order_by='Character.id')
+    conversations = relationship('Conversation', back_populates='movie',
+                                 order_by='Conversation.id')
+    genres = relationship('Genre', secondary=movies_genres, back_populates='movies',
+                          order_by='Genre.id')
+    lines = relationship('Line', back_populates='movie', order_by=DIALOG_ORDER)
 
     file_mapping = [
         'id',
@@ -92,7 +102,7 @@ class Character(Base):
 
     credit_pos = Column(Integer, nullable=True)
     gender = Column(String, nullable=True)
-    movie_id = Column(String)
+    movie_id = Column(String, index=True)
     movie_title = Column(String)
     name = Column(String)
 
@@ -105,9 +115,10 @@ class Character(Base):
     conversations = relationship(
         'Conversation',
         secondary=convs_chars,
-        back_populates='characters'
+        back_populates='characters',
+        order_by='Conversation.id'
     )
-    lines = relationship('Line', back_populates='character')
+    lines = relationship('Line', back_populates='character', order_by='Line.id')
     movie = relationship('Movie', back_populates='characters')
 
     file_mapping = [
@@ -127,14 +138,18 @@ class Line(Base):
     __tablename__ = 'lines'
     id = Column(String, primary_key=True)
 
-    character_id = Column(String)
+    character_id = Column(String, index=True)
     character_name = Column(String)
     conversation_id = Column(Integer, ForeignKey('conversations.id'))
     movie_id = Column(String, ForeignKey('movies.id'))
+    # Number of the ID ('L1045' is 1045), the order of the lines in the dialog
+    position = Column(Integer, nullable=True)
     text = Column(String)
 
     __table_args__ = (
         ForeignKeyConstraint([character_id, character_name], [Character.id, Character.name]),
+        Index('ix_lines_conversation_id_position', 'conversation_id', 'position', 'id'),
+        Index('ix_lines_movie_id_position', 'movie_id', 'position', 'id'),
         {}
     )
 
@@ -154,6 +169,23 @@ class Line(Base):
         return ('<Line {!r}>').format(self.id)
 
 
+# Full-text index of Line.text: an FTS5 table on SQLite (filled by the seed),
+# an expression GIN index on PostgreSQL (maintained by the database).
+LINES_FTS_TABLE = 'lines_fts'
+LINES_TSVECTOR = "to_tsvector('english', coalesce(text, ''))"
+
+event.listen(Line.__table__, 'after_create', DDL(
+    f"CREATE VIRTUAL TABLE {LINES_FTS_TABLE} "
+    "USING fts5(text, line_id UNINDEXED, tokenize='porter unicode61')"
+).execute_if(dialect='sqlite'))
+event.listen(Line.__table__, 'after_create', DDL(
+    f"CREATE INDEX ix_lines_text_search ON lines USING gin ({LINES_TSVECTOR})"
+).execute_if(dialect='postgresql'))
+event.listen(Line.__table__, 'before_drop', DDL(
+    f"DROP TABLE IF EXISTS {LINES_FTS_TABLE}"
+).execute_if(dialect='sqlite'))
+
+
 class Conversation(Base):
     __tablename__ = 'conversations'
     id = Column(Integer, primary_key=True)
@@ -166,10 +198,11 @@ class Conversation(Base):
         String,
         ForeignKey('characters.id', onupdate='CASCADE', ondelete='SET NULL')
     )
-    movie_id = Column(String, ForeignKey('movies.id'))
+    movie_id = Column(String, ForeignKey('movies.id'), index=True)
 
-    characters = relationship('Character', secondary=convs_chars, back_populates='conversations')
-    lines = relationship('Line', back_populates='conversation')
+    characters = relationship('Character', secondary=convs_chars, back_populates='conversations',
+                              order_by='Character.id')
+    lines = relationship('Line', back_populates='conversation', order_by=DIALOG_ORDER)
     movie = relationship('Movie', back_populates='conversations')
 
     file_mapping = [
@@ -184,3 +217,109 @@ class Conversation(Base):
             self.first_char_id,
             self.second_char_id
         )
+
+
+class CharacterAlias(Base):
+    """A duplicate character merged into the character that replaces it, applied to every reload."""
+    __tablename__ = 'character_aliases'
+    dup_id = Column(String, primary_key=True)
+
+    real_id = Column(String)
+    real_name = Column(String)
+
+    def __repr__(self):
+        return ('<CharacterAlias {!r} -> {!r}>').format(self.dup_id, self.real_id)
+
+
+class SeedManifest(Base):
+    __tablename__ = 'seed_manifest'
+    file_name = Column(String, primary_key=True)
+
+    batch_size = Column(Integer)
+    completed = Column(Boolean, default=False)
+    content_hash = Column(String)
+    last_batch = Column(Integer, default=0)
+    row_count = Column(Integer, default=0)
+    updated_at = Column(DateTime)
+
+    def __repr__(self):
+        return ('<SeedManifest {!r} (batch {})>').format(self.file_name, self.last_batch)
+
+
+class CorpusVersion(Base):
+    __tablename__ = 'corpus_version'
+    version = Column(String, primary_key=True)
+
+    seeded_at = Column(DateTime)
+
+    def __repr__(self):
+        return ('<CorpusVersion {!r} ({})>').format(self.version, self.seeded_at)
+
+
+# Aggregates of the corpus, rebuilt by the seed (db.stats) whenever the corpus changes.
+# Derived data without foreign keys, so that the seed can delete and merge rows first.
+
+class MovieStats(Base):
+    __tablename__ = 'movie_stats'
+    movie_id = Column(String, primary_key=True)
+
+    characters = Column(Integer)
+    conversations = Column(Integer)
+    lines = Column(Integer)
+    words = Column(Integer)
+
+    def __repr__(self):
+        return ('<MovieStats {!r}>').format(self.movie_id)
+
+
+class CharacterStats(Base):
+    __tablename__ = 'character_stats'
+    character_id = Column(String, primary_key=True)
+
+    conversations = Column(Integer)
+    lines = Column(Integer)
+    movie_id = Column(String)
+    partners = Column(Integer)
+    words = Column(Integer)
+
+    def __repr__(self):
+        return ('<CharacterStats {!r}>').format(self.character_id)
+
+
+class CharacterPairStats(Base):
+    """Conversations of a character with another one, stored for both characters of a pair."""
+    __tablename__ = 'character_pair_stats'
+    character_id = Column(String, primary_key=True)
+    partner_id = Column(String, primary_key=True)
+
+    conversations = Column(Integer)
+    lines = Column(Integer)
+    movie_id = Column(String)
+
+    def __repr__(self):
+        return ('<CharacterPairStats {!r} {!r}>').format(self.character_id, self.partner_id)
+
+
+class GenreStats(Base):
+    __tablename__ = 'genre_stats'
+    genre_id = Column(Integer, primary_key=True)
+
+    lines = Column(Integer)
+    movies = Column(Integer)
+    name = Column(String)
+    words = Column(Integer)
+
+    def __repr__(self):
+        return ('<GenreStats {!r}>').format(self.name)
+
+
+class YearStats(Base):
+    __tablename__ = 'year_stats'
+    year = Column(String, primary_key=True)
+
+    lines = Column(Integer)
+    movies = Column(Integer)
+    words = Column(Integer)
+
+    def __repr__(self):
+        return ('<YearStats {!r}>').format(self.year)
@@ -0,0 +1,104 @@
+"""Chunked, parallel parsing of the corpus files."""
+import io
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+DELIMITER = ' +++$+++ '
+DEFAULT_CHUNK_SIZE = 1 << 20  # bytes
+
+
+def parse_list(value):
+    """
+    Parse the list syntax used in the corpus files, e.g. "['L1', 'L2']".
+
+    Replaces ast.literal_eval for the only literal the corpus contains: a flat
+    list of quoted strings without escape sequences.
+    """
+    if not (value.startswith('[') and value.endswith(']')):
+        raise ValueError(f"malformed list: {value!r}")
+    if value == '[]':
+        return []
+
+    # Fast path: only single quoted items separated by "', '"
+    items = value[2:-2].split("', '")
+    if value[1] == "'" and value[-2] == "'" and value.count("'") == 2 * len(items):
+        return items
+
+    items = []
+    pos, end = 1, len(value) - 1
+    while pos < end:
+        char = value[pos]
+        if char in ', ':
+            pos += 1
+        elif char in '\'"':
+            closing = value.find(char, pos + 1)
+            if closing == -1:
+                raise ValueError(f"malformed list: {value!r}")
+            items.append(value[pos + 1:closing])
+            pos = closing + 1
+        else:
+            raise ValueError(f"malformed list: {value!r}")
+    return items
+
+
+def process_line(line):
+    split_line = line.split(DELIMITER)
+    split_line[-1] = split_line[-1][:-1]  # Remove newline char
+    split_line = [(None if item == '?' else item) for item in split_line]
+    if split_line[-1] is None:
+        return split_line
+    if split_line[-1].startswith('[') and not split_line[0].startswith('L'):
+        split_line[-1] = parse_list(split_line[-1])  # Get it as a list
+        # Enforce uniqueness of items, but keep their order: a set would iterate
+        # differently after being pickled by a parser process
+        split_line[-1] = list(dict.fromkeys(split_line[-1]))
+    return split_line
+
+
+def chunk_ranges(path, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Yield (start, end) byte offsets of chunks that end on a line boundary."""
+    size = os.path.getsize(path)
+    with open(path, 'rb') as f:
+        start = 0
+        while start < size:
+            f.seek(min(start + chunk_size, size))
+            f.readline()
+            end = min(f.tell(), size)
+            yield start, end
+            start = end
+
+
+def read_chunk(path, start, end):
+    """Return the decoded lines of a chunk, with the same newline handling as open()."""
+    with open(path, 'rb') as f:
+        f.seek(start)
+        data = f.read(end - start)
+    return io.StringIO(data.decode('latin-1'), newline=None)
+
+
+def parse_chunk(path, start, end, table_fields):
+    batch = []
+    for line in read_chunk(path, start, end):
+        data = process_line(line)
+        batch.append(({k: v for k, v in zip(table_fields, data)}, data[-1]))
+    return batch
+
+
+def parallel_prepare_data(path, table_fields, workers=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Parse a corpus file on a process pool and yield the parsed batches in file order.
+
+    Each batch holds the rows of one chunk in the format of db.seed.prepare_data.
+    At most two chunks per worker are in flight, so memory stays bounded when
+    the consumer is slower than the parser.
+    """
+    workers = workers or os.cpu_count()
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        for start, end in chunk_ranges(path, chunk_size):
+            pending.append(executor.submit(parse_chunk, path, start, end, table_fields))
+            if len(pending) >= 2 * workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
@@ -0,0 +1,74 @@
+"""Reproducible random samples of lines and conversations, drawn from a dense numbering of IDs."""
+import random
+from bisect import bisect_right
+from collections import defaultdict
+from collections.abc import Sequence
+from itertools import accumulate, groupby
+
+from sqlalchemy import select
+
+from db.models import Genre, movies_genres
+
+
+class Ranges(Sequence):
+    """Several ranges of row numbers as one sequence, without materializing them."""
+
+    def __init__(self, ranges):
+        self.ranges = [rows for rows in ranges if rows]
+        self.ends = list(accumulate(len(rows) for rows in self.ranges))
+
+    def __len__(self):
+        return self.ends[-1] if self.ends else 0
+
+    def __getitem__(self, i):
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        j = bisect_right(self.ends, i)
+        return self.ranges[j][i - (self.ends[j - 1] if j else 0)]
+
+
+class SampleIndex:
+    """
+    The IDs of a table numbered 0..n-1 in (movie_id, id) order.
+
+    The rows of a movie are the consecutive numbers movie_rows[movie_id], the
+    rows of a genre the ranges of its movies. A sample draws row numbers and
+    looks up their IDs, so it costs one list access per row, no matter how
+    large the table is. The order is computed in Python, so a seed draws the
+    same sample on every database with the same corpus.
+    """
+
+    def __init__(self, ids, movie_rows, genre_movies):
+        self.ids = ids
+        self.movie_rows = movie_rows
+        self.genre_movies = genre_movies
+
+    @classmethod
+    def load(cls, connection, model):
+        """Number the rows of model, which has an id and a movie_id column."""
+        rows = sorted(connection.execute(select(model.id, model.movie_id)),
+                      key=lambda row: (row.movie_id is not None, row.movie_id or '', row.id))
+        movie_rows = {}
+        for movie_id, numbers in groupby(range(len(rows)), key=lambda i: rows[i].movie_id):
+            numbers = list(numbers)
+            movie_rows[movie_id] = range(numbers[0], numbers[-1] + 1)
+
+        genre_movies = defaultdict(set)
+        genre_links = select(Genre.name, movies_genres.c.movie_id).join(movies_genres)
+        for name, movie_id in connection.execute(genre_links):
+            genre_movies[name].add(movie_id)
+        genre_movies = {name: sorted(movie_ids) for name, movie_ids in genre_movies.items()}
+        return cls([row.id for row in rows], movie_rows, genre_movies)
+
+    def population(self, genre=None):
+        """The row numbers of all rows, or of the rows of the movies of genre."""
+        if genre is None:
+            return range(len(self.ids))
+        movie_ids = self.genre_movies.get(genre, ())
+        return Ranges(self.movie_rows.get(movie_id, range(0)) for movie_id in movie_ids)
+
+    def sample(self, n, seed, genre=None):
+        """The IDs of up to n different rows drawn with seed, the same ones for the same seed."""
+        population = self.population(genre)
+        rows = random.Random(seed).sample(population, min(n, len(population)))
+        return [self.ids[row] for row in rows]
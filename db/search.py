@@ -0,0 +1,69 @@
+"""Full-text search over the text of the lines."""
+import re
+
+from sqlalchemy import column, func, literal, select, table, text
+
+from db.models import LINES_FTS_TABLE, LINES_TSVECTOR, Genre, Line, movies_genres
+
+lines_fts = table(LINES_FTS_TABLE, column('line_id'), column('text'), column('rank'))
+
+
+def search_terms(query):
+    """The words of a search query, without any operators of the search syntax."""
+    return re.findall(r'\w+', query)
+
+
+def rebuild_search_index(connection):
+    """
+    Fill the FTS5 table with the lines (SQLite).
+
+    The PostgreSQL index is kept up to date by the database.
+    """
+    if connection.dialect.name != 'sqlite':
+        return
+    connection.execute(lines_fts.delete())
+    connection.execute(
+        lines_fts.insert().from_select(['line_id', 'text'], select(Line.id, Line.text)))
+
+
+def search_lines(dialect_name, terms, movie_id=None, character_id=None, genre=None):
+    """
+    Select the lines that contain all terms, best matches first, with a score column.
+
+    On SQLite the FTS5 table is searched and ranked with bm25, on PostgreSQL
+    the GIN index with ts_rank. Other dialects fall back to a LIKE scan.
+    """
+    columns = [c for c in Line.__table__.c]
+    if dialect_name == 'sqlite':
+        match = ' '.join('"{}"'.format(term.replace('"', '""')) for term in terms)
+        statement = (
+            select(*columns, (-lines_fts.c.rank).label('score'))
+            .select_from(lines_fts)
+            .join(Line.__table__, Line.id == lines_fts.c.line_id)
+            .where(text(f'{LINES_FTS_TABLE} MATCH :match').bindparams(match=match))
+            .order_by(lines_fts.c.rank)
+        )
+    elif dialect_name == 'postgresql':
+        tsquery = func.plainto_tsquery('english', ' '.join(terms))
+        tsvector = text(LINES_TSVECTOR)
+        score = func.ts_rank(tsvector, tsquery)
+        statement = (
+            select(*columns, score.label('score'))
+            .where(tsvector.op('@@')(tsquery))
+            .order_by(score.desc())
+        )
+    else:
+        statement = select(*columns, literal(0.0).label('score')).where(
+            *(Line.text.ilike(f'%{term}%') for term in terms)
+        )
+    statement = statement.order_by(Line.id)
+
+    if movie_id is not None:
+        statement = statement.where(Line.movie_id == movie_id)
+    if character_id is not None:
+        statement = statement.where(Line.character_id == character_id)
+    if genre is not None:
+        statement = statement.where(Line.movie_id.in_(
+            select(movies_genres.c.movie_id).join(Genre).where(Genre.name == genre)
+        ))
+    return statement
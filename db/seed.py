@@ -1,18 +1,39 @@
 #!/usr/bin/env python3
-import ast
+import argparse
 import logging
 import os
-from sqlalchemy import create_engine
+from collections import deque
+from itertools import chain
+from sqlalchemy import create_engine, select
 from sqlalchemy.orm import sessionmaker
 
 from config import Config
+from db.bulk import DEFAULT_BATCH_SIZE, BulkLoader, batched
 from db.models import (
     Character,
+    CharacterAlias,
     Conversation,
     Genre,
     Line,
     Movie,
+    convs_chars,
+    movies_genres,
 )
+from db.dedupe import dedupe_characters, find_duplicate_characters, load_aliases
+from db.instrument import NullMetrics, SeedMetrics, get_metrics
+from db.linemap import LineConversationMap, line_number
+from db.manifest import (
+    bump_corpus_version,
+    clear_manifest,
+    content_version,
+    file_hash,
+    load_manifest,
+    save_checkpoint,
+    save_corpus_version,
+)
+from db.parse import parallel_prepare_data, process_line
+from db.search import rebuild_search_index
+from db.stats import rebuild_stats
 
 DATABASE_URI = Config.SQLALCHEMY_DATABASE_URI
 DIRECTORY = os.path.abspath(os.getcwd())
@@ -23,6 +44,29 @@ CONVERSATION_DATA = 'movie_conversations.txt'
 LINE_DATA = 'movie_lines.txt'
 MOVIE_DATA = 'movie_titles_metadata.txt'
 
+# Corpus files in insertion order, with the tables filled from them (dependents first)
+SEED_FILES = (MOVIE_DATA, CHARACTERS_DATA, CONVERSATION_DATA, LINE_DATA)
+SEED_TABLES = {
+    MOVIE_DATA: (movies_genres, Movie.__table__, Genre.__table__),
+    CHARACTERS_DATA: (CharacterAlias.__table__, Character.__table__),
+    CONVERSATION_DATA: (convs_chars, Conversation.__table__),
+    LINE_DATA: (Line.__table__,),
+}
+
+STEP_NAMES = {
+    MOVIE_DATA: 'movies',
+    CHARACTERS_DATA: 'characters',
+    CONVERSATION_DATA: 'conversations',
+    LINE_DATA: 'lines',
+}
+
+SEED_MODES = ('orm', 'bulk', 'incremental')
+DEFAULT_SEED_MODE = 'incremental'
+
+# Manifest entry of the steps after loading the files (cleanup, search index, stats),
+# completed once they all ran for the loaded files
+POST_LOAD_STEP = 'post-load'
+
 
 def get_data(path):
     with open(os.path.join(CORPUS_PATH, path), encoding='latin-1') as f:
@@ -30,23 +74,19 @@ def get_data(path):
             yield line
 
 
-def process_line(line):
-    delimiter = ' +++$+++ '
-    split_line = line.split(delimiter)
-    split_line[-1] = split_line[-1][:-1]  # Remove newline char
-    split_line = [(None if item == '?' else item) for item in split_line]
-    if split_line[-1] is None:
-        return split_line
-    if split_line[-1].startswith('[') and not split_line[0].startswith('L'):
-        split_line[-1] = ast.literal_eval(split_line[-1])  # Get it as a list
-        split_line[-1] = set(split_line[-1])  # Enfore uniqueness of items
-    return split_line
+def prepare_data(path, table_fields):
+    data_stream = (process_line(line) for line in get_data(path))
+    return get_metrics().timed(
+        ({k: v for k, v in zip(table_fields, data)}, data[-1]) for data in data_stream
+    )
 
 
-def prepare_data(path, table_fields):
-    for line in get_data(path):
-        data = process_line(line)
-        yield {k: v for k, v in zip(table_fields, data)}, data[-1]
+def stream_data(path, table_fields, workers=1):
+    """Like prepare_data, but parse on a process pool when workers > 1."""
+    if workers > 1:
+        batches = parallel_prepare_data(os.path.join(CORPUS_PATH, path), table_fields, workers)
+        return get_metrics().timed(chain.from_iterable(batches))
+    return prepare_data(path, table_fields)
 
 
 def insert_movies(session):
@@ -92,7 +132,7 @@ def insert_lines(session, line_to_conv_mapping):
         line_data, _ = data
         conv_id = line_to_conv_mapping[line_data['id']]
 
-        line = Line(conversation_id=conv_id, **line_data)
+        line = Line(conversation_id=conv_id, position=line_number(line_data['id']), **line_data)
         session.add(line)
         print(f"lines {count}\r", end="")
 
@@ -109,7 +149,7 @@ def insert_conversations(session):
     # faster. session should usually not be used for caching, but it works here
     characters = session.query(Character).all()
 
-    line_to_conv_mapping = {}
+    line_to_conv_mapping = LineConversationMap()
     characters = {}
     for conv_id, data in enumerate(data_stream, 1):
         conv_data, line_ids = data
@@ -137,45 +177,307 @@ def insert_conversations(session):
     return line_to_conv_mapping
 
 
-def clean_records(session):
-    real_ids = {'u5784': 'u5783', 'u5786': 'u5785', 'u6564': 'u6563'}
+def movie_rows(workers=1):
+    return stream_data(MOVIE_DATA, Movie.file_mapping, workers)
+
 
-    for dup_char_id, real_char_id in real_ids.items():
-        dup_char = session.query(Character).get(dup_char_id)
-        real_char = session.query(Character).get(real_char_id)
+def character_rows(workers=1):
+    rows = stream_data(CHARACTERS_DATA, Character.file_mapping, workers)
+    return (character_data for character_data, _ in rows)
 
-        for line in dup_char.lines:
-            # Delay autoflush to prevent violating foreign key constraint
-            with session.no_autoflush:
-                line.character_id = real_char.id
-                line.character_name = real_char.name
 
-        # Commit to make new character assignment persistent
-        session.commit()
+def conversation_rows(line_to_conv_mapping, workers=1):
+    """Yield conversation rows and fill line_to_conv_mapping on the way."""
+    data_stream = stream_data(CONVERSATION_DATA, Conversation.file_mapping, workers)
+    for conv_id, (conv_data, line_ids) in enumerate(data_stream, 1):
+        for l_id in line_ids:
+            line_to_conv_mapping[l_id] = conv_id
+        yield dict(conv_data, id=conv_id)
+
+
+def line_rows(line_to_conv_mapping, workers=1):
+    data_stream = stream_data(LINE_DATA, Line.file_mapping, workers)
+    for line_data, _ in data_stream:
+        line_id = line_data['id']
+        yield dict(line_data, conversation_id=line_to_conv_mapping[line_id],
+                   position=line_number(line_id))
 
-        for conv in dup_char.conversations:
-            if dup_char_id == conv.first_char_id:
-                conv.first_char_id = real_char_id
-            else:
-                conv.second_char_id = real_char_id
 
-            real_char.conversations.append(conv)
+def write_movies(loader, batch):
+    def get_genre_ids():
+        return dict(loader.connection.execute(select(Genre.name, Genre.id)).fetchall())
 
-        session.delete(dup_char)
+    genre_ids = get_genre_ids()
+    new_genres = {}  # dict keeps the order in which genres first appear
+    for _, genres in batch:
+        for g in genres:
+            if g not in genre_ids:
+                new_genres.setdefault(g, None)
+    if new_genres:
+        loader.write(Genre.__table__, [{'name': g} for g in new_genres])
+        genre_ids = get_genre_ids()
+
+    loader.write(Movie.__table__, [movie_data for movie_data, _ in batch])
+    loader.write(movies_genres, [
+        {'movie_id': movie_data['id'], 'genre_id': genre_ids[g]}
+        for movie_data, genres in batch for g in genres
+    ])
+
+
+def write_characters(loader, batch):
+    loader.write(Character.__table__, batch)
+
+
+def write_conversations(loader, batch, aliases):
+    conv_char_rows = []
+    for conv in batch:
+        for key in ('first_char_id', 'second_char_id'):
+            if conv[key] in aliases:
+                conv[key] = aliases[conv[key]][0]
+            conv_char_rows.append({'conversation_id': conv['id'], 'character_id': conv[key]})
+
+    # Conversations have to exist before the association rows refer to them
+    loader.write(Conversation.__table__, batch)
+    loader.write(convs_chars, conv_char_rows)
+
+
+def write_lines(loader, batch, aliases):
+    for line in batch:
+        if line['character_id'] in aliases:
+            line['character_id'], line['character_name'] = aliases[line['character_id']]
+    loader.write(Line.__table__, batch)
+
+
+def seed_writers(loader, workers=1):
+    """
+    Return (rows, write_batch) for each corpus file, in insertion order.
+
+    Rows of duplicate characters are written with the ID of the character that
+    replaces them, so lines and conversations never refer to deleted characters.
+    These are the duplicates among the characters and those merged by earlier
+    runs, whose rows are gone when characters.txt is not reloaded.
+    The line mapping is shared: line rows can only be joined after the
+    conversation rows have been consumed.
+    """
+    line_to_conv_mapping = LineConversationMap()
+    aliases = {}
+
+    def character_aliases():
+        # Characters are complete once the first conversation batch is written
+        if 'characters' not in aliases:
+            aliases['characters'] = {**load_aliases(loader.connection),
+                                     **find_duplicate_characters(loader.connection)}
+        return aliases['characters']
+
+    return {
+        MOVIE_DATA: (lambda: movie_rows(workers), write_movies),
+        CHARACTERS_DATA: (lambda: character_rows(workers), write_characters),
+        CONVERSATION_DATA: (
+            lambda: conversation_rows(line_to_conv_mapping, workers),
+            lambda loader, batch: write_conversations(loader, batch, character_aliases())
+        ),
+        LINE_DATA: (
+            lambda: line_rows(line_to_conv_mapping, workers),
+            lambda loader, batch: write_lines(loader, batch, character_aliases())
+        ),
+    }
+
+
+def clean_records(session, dry_run=False):
+    report = dedupe_characters(session.connection(), dry_run=dry_run)
     session.commit()
+    return report
 
 
-def main():
+def run_clean_records(engine):
+    metrics = get_metrics()
+    session = metrics.instrument_session(sessionmaker(bind=engine)())
+    try:
+        with metrics.step('cleanup'):
+            clean_records(session)
+    except:
+        session.rollback()
+        raise
+    finally:
+        session.close()
+
+
+def bulk_main(engine, batch_size=DEFAULT_BATCH_SIZE, workers=1):
+    """
+    Insert the corpus with Core inserts (COPY on PostgreSQL) instead of the ORM.
+
+    Produces the same database contents as the session based insert functions,
+    relationships are written directly as association rows. With workers > 1
+    the corpus files are parsed on a process pool.
+    """
+    metrics = get_metrics()
+    with engine.connect() as connection, connection.begin() as transaction:
+        loader = BulkLoader(connection, batch_size=batch_size)
+        for file_name, (rows, write_batch) in seed_writers(loader, workers).items():
+            logging.info("bulk inserting %s ...", file_name)
+            with metrics.step(STEP_NAMES[file_name]):
+                for batch in batched(rows(), batch_size):
+                    write_batch(loader, batch)
+        with metrics.step('commit'), metrics.phase('commit'):
+            transaction.commit()
+        loader.report()
+
+    run_clean_records(engine)
+
+
+def plan_seed(manifest, hashes):
+    """
+    Decide for each corpus file whether to skip, resume or (re)load it.
+
+    Files are skipped when they are unchanged and completely loaded. The first
+    file that is not skipped is resumed after its last committed batch if it is
+    unchanged, every file after it depends on its rows and is reloaded.
+    """
+    plan = {}
+    upstream_changed = False
+    for file_name in SEED_FILES:
+        entry = manifest.get(file_name)
+        unchanged = entry is not None and entry.content_hash == hashes[file_name]
+        if upstream_changed or not unchanged:
+            plan[file_name] = ('load', 0)
+        elif entry.completed:
+            plan[file_name] = ('skip', entry.last_batch)
+            continue
+        else:
+            plan[file_name] = ('resume', entry.last_batch)
+        upstream_changed = True
+    return plan
+
+
+def incremental_main(engine, batch_size=DEFAULT_BATCH_SIZE, workers=1):
+    """
+    Insert only the corpus files that changed since the last run.
+
+    Every batch is committed together with a checkpoint in the seed manifest, so
+    a run that fails halfway resumes after the last committed batch.
+    """
+    metrics = get_metrics()
+    hashes = {f: file_hash(os.path.join(CORPUS_PATH, f)) for f in SEED_FILES}
+
+    with engine.connect() as connection:
+        with connection.begin():
+            manifest = load_manifest(connection)
+            plan = plan_seed(manifest, hashes)
+            reload_files = [f for f in SEED_FILES if plan[f][0] == 'load']
+            for file_name in reversed(reload_files):
+                for table in SEED_TABLES[file_name]:
+                    connection.execute(table.delete())
+            unchanged = all(action == 'skip' for action, _ in plan.values())
+            clear_manifest(connection, reload_files + ([] if unchanged else [POST_LOAD_STEP]))
+
+        if unchanged:
+            if post_load_completed(manifest):
+                logging.info("corpus unchanged, nothing to insert")
+                return
+            logging.info("corpus unchanged, finishing the cleanup of an interrupted run")
+            run_clean_records(engine)
+            return
+
+        loader = BulkLoader(connection, batch_size=batch_size)
+        for file_name, (rows, write_batch) in seed_writers(loader, workers).items():
+            action, last_batch = plan[file_name]
+            file_batch_size = batch_size if action == 'load' else manifest[file_name].batch_size
+
+            if action == 'skip':
+                logging.info("%s unchanged, skipping", file_name)
+                if file_name == CONVERSATION_DATA:
+                    deque(rows(), maxlen=0)  # lines still need the line mapping
+                continue
+
+            logging.info("%s %s from batch %s ...", 'resuming' if action == 'resume' else 'loading',
+                         file_name, last_batch + 1)
+            with metrics.step(STEP_NAMES[file_name]):
+                row_count = 0
+                for batch_number, batch in enumerate(batched(rows(), file_batch_size), 1):
+                    row_count += len(batch)
+                    if batch_number <= last_batch:
+                        continue
+                    with connection.begin() as transaction:
+                        write_batch(loader, batch)
+                        save_checkpoint(connection, file_name, content_hash=hashes[file_name],
+                                        last_batch=batch_number, row_count=row_count,
+                                        batch_size=file_batch_size, completed=False)
+                        with metrics.phase('commit'):
+                            transaction.commit()
+                with connection.begin():
+                    save_checkpoint(connection, file_name, content_hash=hashes[file_name],
+                                    last_batch=-(-row_count // file_batch_size),
+                                    row_count=row_count, batch_size=file_batch_size, completed=True)
+        loader.report()
+
+    run_clean_records(engine)
+
+
+def post_load_completed(manifest):
+    entry = manifest.get(POST_LOAD_STEP)
+    return entry is not None and bool(entry.completed)
+
+
+def finish_seed(engine):
+    """
+    Record the version of the corpus files and rebuild what is derived from the rows.
+
+    The search index and the aggregate tables are rebuilt when the version
+    changed or when an earlier run failed before they were rebuilt.
+    """
+    with engine.connect() as connection:
+        completed = post_load_completed(load_manifest(connection))
+    if record_corpus_version(engine) or not completed:
+        run_rebuild_search_index(engine)
+        run_rebuild_stats(engine)
+    with engine.begin() as connection:
+        save_checkpoint(connection, POST_LOAD_STEP, completed=True)
+
+
+def dedupe(dry_run=False):
+    """Merge duplicate characters of an already seeded database."""
     engine = create_engine(DATABASE_URI)
+    with engine.begin() as connection:
+        report = dedupe_characters(connection, dry_run=dry_run)
+        if report['duplicates'] and not dry_run:
+            bump_corpus_version(connection, 'dedupe:' + ','.join(sorted(report['duplicates'])))
+            rebuild_stats(connection)
+        return report
+
+
+def record_corpus_version(engine):
+    """Record the version of the corpus files, which API responses use for their ETags."""
+    version = content_version(os.path.join(CORPUS_PATH, f) for f in SEED_FILES)
+    with engine.begin() as connection:
+        return save_corpus_version(connection, version)
+
+
+def run_rebuild_search_index(engine):
+    with get_metrics().step('search_index'), engine.begin() as connection:
+        rebuild_search_index(connection)
+
+
+def run_rebuild_stats(engine):
+    with get_metrics().step('stats'), engine.begin() as connection:
+        rebuild_stats(connection)
+
+
+def orm_main(engine):
+    metrics = get_metrics()
     Session = sessionmaker(bind=engine)
-    session = Session()
+    session = metrics.instrument_session(Session())
 
     try:
-        insert_movies(session)
-        insert_characters(session)
-        line_to_conv_mapping = insert_conversations(session)
-        insert_lines(session, line_to_conv_mapping)
-        clean_records(session)
+        with metrics.step('movies'):
+            insert_movies(session)
+        with metrics.step('characters'):
+            insert_characters(session)
+        with metrics.step('conversations'):
+            line_to_conv_mapping = insert_conversations(session)
+        with metrics.step('lines'):
+            insert_lines(session, line_to_conv_mapping)
+        with metrics.step('cleanup'):
+            clean_records(session)
     except:
         session.rollback()
         raise
@@ -183,6 +485,44 @@ def main():
         session.close()
 
 
+def main(mode=DEFAULT_SEED_MODE, batch_size=DEFAULT_BATCH_SIZE, workers=1, database_uri=None,
+         metrics=None):
+    """
+    Insert the corpus data into the database.
+
+    If metrics (a SeedMetrics instance) is given, it collects timing, throughput,
+    memory and statement counts of every step.
+    """
+    engine = create_engine(database_uri or DATABASE_URI)
+    if metrics is None:
+        metrics = NullMetrics()
+    else:
+        metrics.info.update(mode=mode, batch_size=batch_size, workers=workers,
+                            dialect=engine.dialect.name)
+
+    with metrics.activate(engine):
+        if mode == 'bulk':
+            bulk_main(engine, batch_size=batch_size, workers=workers)
+        elif mode == 'incremental':
+            incremental_main(engine, batch_size=batch_size, workers=workers)
+        else:
+            orm_main(engine)
+    finish_seed(engine)
+    return metrics
+
+
 if __name__ == '__main__':
     logging.basicConfig(format='[%(levelname)s] %(message)s', level=logging.INFO)
-    main()
+    parser = argparse.ArgumentParser(description='Insert the corpus data into the database.')
+    parser.add_argument('--mode', choices=SEED_MODES, default=DEFAULT_SEED_MODE,
+                        help='incremental: bulk inserts of changed files with checkpoints, '
+                             'bulk: one transaction of bulk inserts, orm: session based inserts')
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument('--workers', type=int, default=1, help='parse the corpus on a process pool')
+    parser.add_argument('--metrics', metavar='FILE', help='write per-step metrics as JSON to FILE')
+    args = parser.parse_args()
+    metrics = main(mode=args.mode, batch_size=args.batch_size, workers=args.workers,
+                   metrics=SeedMetrics() if args.metrics else None)
+    if args.metrics:
+        with open(args.metrics, 'w') as f:
+            f.write(metrics.to_json(indent=2))
@@ -0,0 +1,289 @@
+"""
+Binary snapshot of the corpus that the API memory-maps, so that all workers share its pages.
+
+Layout: the magic bytes, the length of a JSON header and the header, then
+8 byte aligned sections (offsets in the header are relative to the first):
+
+- per table, fixed-width little-endian records: 'q' for integers, 'd' for
+  floats and (offset 'Q', length 'I') into the string heap for strings;
+- per table, the row numbers sorted by ID and, for integer IDs, the sorted
+  IDs, for binary search;
+- per relationship, the offsets and targets of Relation;
+- the string heap, UTF-8 strings that are stored once however often they occur.
+"""
+import datetime
+import json
+import math
+import mmap
+import os
+import struct
+from array import array
+from bisect import bisect_left
+from collections import namedtuple
+
+from sqlalchemy import Float, Integer
+
+from db.corpus import MODELS, Corpus, Relation, column_keys
+
+MAGIC = b'CORPUS01'
+NULL_INT = -1 << 63
+NULL_LENGTH = 0xFFFFFFFF
+FORMATS = {'int': 'q', 'float': 'd', 'str': 'QI'}
+
+SnapshotVersion = namedtuple('SnapshotVersion', ['version', 'seeded_at'])
+
+
+def column_kind(model, key):
+    column_type = getattr(model, key).type
+    if isinstance(column_type, Integer):
+        return 'int'
+    if isinstance(column_type, Float):
+        return 'float'
+    return 'str'
+
+
+def aligned(size):
+    return -(-size // 8) * 8
+
+
+class Heap:
+
+    def __init__(self):
+        self.data = bytearray()
+        self.offsets = {}
+
+    def add(self, value):
+        """(offset, length) of value, adding it if it is not in the heap yet."""
+        if value is None:
+            return 0, NULL_LENGTH
+        position = self.offsets.get(value)
+        if position is None:
+            encoded = value.encode()
+            position = self.offsets[value] = (len(self.data), len(encoded))
+            self.data += encoded
+        return position
+
+
+def encode_value(kind, value, heap):
+    if kind == 'str':
+        return heap.add(value)
+    if value is None:
+        return (NULL_INT,) if kind == 'int' else (math.nan,)
+    return (value,)
+
+
+def write_snapshot(corpus, path):
+    """Write corpus to path, replacing the file atomically."""
+    sections = []
+    offset = 0
+
+    def add_section(data):
+        nonlocal offset
+        position = offset
+        sections.append(data + bytes(aligned(len(data)) - len(data)))
+        offset += aligned(len(data))
+        return position
+
+    heap = Heap()
+    header = {'tables': {}, 'relations': {}}
+    for model in MODELS:
+        table = corpus.tables[model]
+        kinds = [(key, column_kind(model, key)) for key in column_keys(model)]
+        record = struct.Struct('<' + ''.join(FORMATS[kind] for _, kind in kinds))
+        records = bytearray(record.size * len(table))
+        for row in range(len(table)):
+            values = []
+            for key, kind in kinds:
+                values.extend(encode_value(kind, table.columns[key][row], heap))
+            record.pack_into(records, row * record.size, *values)
+
+        rows_by_id = table.rows_by_id()
+        spec = {
+            'rows': len(table),
+            'columns': kinds,
+            'records': add_section(bytes(records)),
+            'rows_by_id': add_section(array('q', rows_by_id).tobytes()),
+        }
+        if dict(kinds)['id'] == 'int':
+            sorted_ids = array('q', (table.ids[row] for row in rows_by_id))
+            spec['sorted_ids'] = add_section(sorted_ids.tobytes())
+        header['tables'][model.__tablename__] = spec
+
+    for (model, name), relation in corpus.relations.items():
+        header['relations'][f'{model.__tablename__}.{name}'] = {
+            'offsets': add_section(array('q', relation.offsets).tobytes()),
+            'targets': add_section(array('q', relation.targets).tobytes()),
+            'count': len(relation.targets),
+        }
+
+    header['heap'] = [add_section(bytes(heap.data)), len(heap.data)]
+    if corpus.version is not None:
+        header['version'] = [corpus.version.version, corpus.version.seeded_at.isoformat()]
+
+    header_data = json.dumps(header).encode()
+    prefix = MAGIC + struct.pack('<Q', len(header_data)) + header_data
+    prefix += bytes(aligned(len(prefix)) - len(prefix))
+
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(prefix)
+        for section in sections:
+            f.write(section)
+    os.replace(tmp_path, path)  # workers that mapped the old file keep reading it
+
+
+class MappedColumn:
+    """The values of one column of a MappedTable, as a sequence."""
+
+    def __init__(self, table, key):
+        self.table = table
+        self.key = key
+
+    def __len__(self):
+        return len(self.table)
+
+    def __getitem__(self, row):
+        return self.table.value(row, self.key)
+
+
+class MappedIndex:
+    """Row numbers by ID, found by binary search over the IDs in sorted order."""
+
+    def __init__(self, sorted_ids, rows, id_type):
+        self.sorted_ids = sorted_ids
+        self.rows = rows
+        self.id_type = id_type
+
+    def get(self, key, default=None):
+        if not isinstance(key, self.id_type):
+            return default
+        i = bisect_left(self.sorted_ids, key)
+        if i < len(self.rows) and self.sorted_ids[i] == key:
+            return self.rows[i]
+        return default
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+
+class SortedColumn:
+    """The values of a column in the order of rows, as a sequence for bisect."""
+
+    def __init__(self, column, rows):
+        self.column = column
+        self.rows = rows
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __getitem__(self, i):
+        return self.column[self.rows[i]]
+
+
+class MappedTable:
+    """A table of the snapshot file with the interface of corpus.Table, decoded on access."""
+
+    def __init__(self, buffer, base, spec, heap):
+        self.buffer = buffer
+        self.heap = heap
+        self.size = spec['rows']
+        self.keys = tuple(key for key, _ in spec['columns'])
+        self.record_struct = struct.Struct(
+            '<' + ''.join(FORMATS[kind] for _, kind in spec['columns']))
+        self.records = base + spec['records']
+
+        self.decoders = {}
+        self.fields = {}  # key: (offset in the record, struct, decoder) to read a single value
+        slot = offset = 0
+        for key, kind in spec['columns']:
+            fmt = '<' + FORMATS[kind]
+            self.decoders[key] = self._decoder(kind, slot)
+            self.fields[key] = (offset, struct.Struct(fmt), self._decoder(kind, 0))
+            slot += len(fmt) - 1
+            offset += struct.calcsize(fmt)
+
+        self.columns = {key: MappedColumn(self, key) for key in self.keys}
+        self.ids = self.columns['id']
+        view = memoryview(buffer)
+        self._rows_by_id = view[base + spec['rows_by_id']:][:8 * self.size].cast('q')
+        if 'sorted_ids' in spec:
+            sorted_ids = view[base + spec['sorted_ids']:][:8 * self.size].cast('q')
+            self.index = MappedIndex(sorted_ids, self._rows_by_id, int)
+        else:
+            sorted_ids = SortedColumn(self.ids, self._rows_by_id)
+            self.index = MappedIndex(sorted_ids, self._rows_by_id, str)
+
+    def _decoder(self, kind, slot):
+        heap = self.heap
+        if kind == 'str':
+            def decode(values):
+                offset, length = values[slot], values[slot + 1]
+                return None if length == NULL_LENGTH else heap[offset:offset + length].decode()
+        elif kind == 'int':
+            def decode(values):
+                return None if values[slot] == NULL_INT else values[slot]
+        else:
+            def decode(values):
+                return None if math.isnan(values[slot]) else values[slot]
+        return decode
+
+    def __len__(self):
+        return self.size
+
+    def value(self, row, key):
+        offset, field_struct, decode = self.fields[key]
+        start = self.records + row * self.record_struct.size
+        return decode(field_struct.unpack_from(self.buffer, start + offset))
+
+    def record(self, row, fields=None):
+        start = self.records + row * self.record_struct.size
+        values = self.record_struct.unpack_from(self.buffer, start)
+        return {field: self.decoders[field](values) for field in fields or self.keys}
+
+    def rows_by_id(self):
+        return self._rows_by_id
+
+
+class MappedHeap:
+    """Slices of the string heap section of the file."""
+
+    def __init__(self, buffer, offset):
+        self.buffer = buffer
+        self.offset = offset
+
+    def __getitem__(self, key):
+        return self.buffer[self.offset + key.start:self.offset + key.stop]
+
+
+def open_snapshot(path):
+    """Memory-map the snapshot file at path as a Corpus."""
+    with open(path, 'rb') as f:
+        buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    if buffer[:len(MAGIC)] != MAGIC:
+        raise ValueError(f"{path} is not a corpus snapshot")
+    header_length, = struct.unpack_from('<Q', buffer, len(MAGIC))
+    header_start = len(MAGIC) + 8
+    header = json.loads(buffer[header_start:header_start + header_length])
+    base = aligned(header_start + header_length)
+
+    heap = MappedHeap(buffer, base + header['heap'][0])
+    tables = {
+        model: MappedTable(buffer, base, header['tables'][model.__tablename__], heap)
+        for model in MODELS
+    }
+
+    view = memoryview(buffer)
+    models = {model.__tablename__: model for model in MODELS}
+    relations = {}
+    for key, spec in header['relations'].items():
+        table_name, name = key.split('.')
+        model = models[table_name]
+        offsets = view[base + spec['offsets']:][:8 * (len(tables[model]) + 1)].cast('q')
+        targets = view[base + spec['targets']:][:8 * spec['count']].cast('q')
+        relations[model, name] = Relation(offsets, targets)
+
+    version = None
+    if 'version' in header:
+        version_id, seeded_at = header['version']
+        version = SnapshotVersion(version_id, datetime.datetime.fromisoformat(seeded_at))
+    return Corpus(tables, relations, version)
@@ -0,0 +1,147 @@
+"""Aggregate tables of the corpus, built with set-based INSERT ... SELECT statements."""
+from sqlalchemy import case, func, select, union_all
+
+from db.models import (
+    Character,
+    CharacterPairStats,
+    CharacterStats,
+    Conversation,
+    Genre,
+    GenreStats,
+    Line,
+    Movie,
+    MovieStats,
+    YearStats,
+    convs_chars,
+    movies_genres,
+)
+
+STATS_MODELS = (MovieStats, CharacterPairStats, CharacterStats, GenreStats, YearStats)
+
+
+def collapse_spaces(expression, passes=5):
+    """Replace runs of up to 2 ** passes spaces with one space (every pass halves the runs)."""
+    for _ in range(passes):
+        expression = func.replace(expression, '  ', ' ')
+    return expression
+
+
+def word_count(column):
+    """Words of a text column: the spaces between them plus one, 0 for empty texts."""
+    trimmed = func.trim(collapse_spaces(func.coalesce(column, '')))
+    return case(
+        (trimmed == '', 0),
+        else_=func.length(trimmed) - func.length(func.replace(trimmed, ' ', '')) + 1,
+    )
+
+
+def count_by(column, *aggregates):
+    """Subquery of the rows per value of column (n) and the given aggregates."""
+    return (
+        select(column.label('key'), func.count().label('n'), *aggregates)
+        .where(column.isnot(None))
+        .group_by(column)
+        .subquery()
+    )
+
+
+def zero(column):
+    return func.coalesce(column, 0)
+
+
+def movie_stats():
+    lines = count_by(Line.movie_id, func.sum(word_count(Line.text)).label('words'))
+    characters = count_by(Character.movie_id)
+    conversations = count_by(Conversation.movie_id)
+    return (
+        select(Movie.id, zero(characters.c.n), zero(conversations.c.n), zero(lines.c.n),
+               zero(lines.c.words))
+        .outerjoin(characters, characters.c.key == Movie.id)
+        .outerjoin(conversations, conversations.c.key == Movie.id)
+        .outerjoin(lines, lines.c.key == Movie.id)
+    )
+
+
+def character_pair_stats():
+    """Both directions of every pair of different characters of a conversation."""
+    conv_lines = count_by(Line.conversation_id)
+    pairs = union_all(*(
+        select(first.label('character_id'), second.label('partner_id'),
+               Conversation.id.label('conversation_id'), Conversation.movie_id)
+        .where(first.isnot(None), second.isnot(None), first != second)
+        for first, second in ((Conversation.first_char_id, Conversation.second_char_id),
+                              (Conversation.second_char_id, Conversation.first_char_id))
+    )).subquery()
+    return (
+        select(pairs.c.character_id, pairs.c.partner_id, func.count(),
+               func.sum(zero(conv_lines.c.n)), func.min(pairs.c.movie_id))
+        .outerjoin(conv_lines, conv_lines.c.key == pairs.c.conversation_id)
+        .group_by(pairs.c.character_id, pairs.c.partner_id)
+    )
+
+
+def character_stats():
+    """Per character, from the lines, convs_chars and the already built character_pair_stats."""
+    lines = count_by(Line.character_id, func.sum(word_count(Line.text)).label('words'))
+    conversations = count_by(convs_chars.c.character_id)
+    partners = count_by(CharacterPairStats.character_id)
+    return (
+        select(Character.id, zero(conversations.c.n), zero(lines.c.n), Character.movie_id,
+               zero(partners.c.n), zero(lines.c.words))
+        .outerjoin(lines, lines.c.key == Character.id)
+        .outerjoin(conversations, conversations.c.key == Character.id)
+        .outerjoin(partners, partners.c.key == Character.id)
+    )
+
+
+def genre_stats():
+    """Per genre, from the already built movie_stats."""
+    return (
+        select(Genre.id, zero(func.sum(MovieStats.lines)), func.count(movies_genres.c.movie_id),
+               Genre.name, zero(func.sum(MovieStats.words)))
+        .select_from(Genre)
+        .outerjoin(movies_genres, movies_genres.c.genre_id == Genre.id)
+        .outerjoin(MovieStats, MovieStats.movie_id == movies_genres.c.movie_id)
+        .group_by(Genre.id, Genre.name)
+    )
+
+
+def year_stats():
+    """Per release year, from the already built movie_stats."""
+    return (
+        select(Movie.year, zero(func.sum(MovieStats.lines)), func.count(),
+               zero(func.sum(MovieStats.words)))
+        .select_from(Movie)
+        .outerjoin(MovieStats, MovieStats.movie_id == Movie.id)
+        .where(Movie.year.isnot(None))
+        .group_by(Movie.year)
+    )
+
+
+# In dependency order, each with the columns its select fills
+STATS_STATEMENTS = (
+    (MovieStats, ('movie_id', 'characters', 'conversations', 'lines', 'words'), movie_stats),
+    (CharacterPairStats, ('character_id', 'partner_id', 'conversations', 'lines', 'movie_id'),
+     character_pair_stats),
+    (CharacterStats, ('character_id', 'conversations', 'lines', 'movie_id', 'partners', 'words'),
+     character_stats),
+    (GenreStats, ('genre_id', 'lines', 'movies', 'name', 'words'), genre_stats),
+    (YearStats, ('year', 'lines', 'movies', 'words'), year_stats),
+)
+
+
+def rebuild_stats(connection):
+    """
+    Replace the aggregate tables with the aggregates of the current corpus.
+
+    Every table is filled by one INSERT ... SELECT, so the data never leaves
+    the database. Returns the number of rows per table.
+    """
+    for model in STATS_MODELS:
+        connection.execute(model.__table__.delete())
+    counts = {}
+    for model, columns, statement in STATS_STATEMENTS:
+        table = model.__table__
+        connection.execute(table.insert().from_select(columns, statement()))
+        counts[table.name] = connection.execute(select(func.count()).select_from(table)).scalar()
+    return counts
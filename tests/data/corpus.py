@@ -0,0 +1,77 @@
+"""Write the test data in the format of the Cornell corpus files."""
+import os
+from itertools import chain
+
+from db.seed import CHARACTERS_DATA, CONVERSATION_DATA, LINE_DATA, MOVIE_DATA
+from tests.data.setup_testdb import get_data
+from tests.data import TESTDATA_PATH
+
+DELIMITER = ' +++$+++ '
+
+# A second character with the name and movie of u0, which the seed merges into
+# u0, with one of the lines and one of the conversations of u0
+DUPLICATE_CHARACTER = ('u99999', 'u0')
+DUPLICATE_LINE = 'L1045'
+DUPLICATE_CONVERSATION = 1
+
+
+def format_line(items):
+    return DELIMITER.join(('?' if item is None else str(item)) for item in items) + '\n'
+
+
+def movie_lines(test_data):
+    for m_dict in test_data.values():
+        movie = m_dict['movie_data']
+        genres = [g['name'] for g in m_dict['movie_genres']]
+        yield format_line([movie['id'], movie['title'], movie['year'],
+                           movie['imdb_rating'], movie['num_imdb_votes'], genres])
+
+
+def character_lines(test_data):
+    for m_dict in test_data.values():
+        for char in m_dict['movie_characters']:
+            yield format_line([char['id'], char['name'], char['movie_id'],
+                               char['movie_title'], char['gender'], char['credit_pos']])
+            if char['id'] == DUPLICATE_CHARACTER[1]:
+                yield format_line([DUPLICATE_CHARACTER[0], char['name'], char['movie_id'],
+                                   char['movie_title'], char['gender'], char['credit_pos']])
+
+
+def conversation_lines(test_data):
+    lines = chain.from_iterable(m['movie_lines'] for m in test_data.values())
+    conv_lines = {}
+    for line in sorted(lines, key=lambda l: int(l['id'][1:])):
+        conv_lines.setdefault(line['conversation_id'], []).append(line['id'])
+
+    conversations = chain.from_iterable(m['movie_conversations'] for m in test_data.values())
+    for conv in sorted(conversations, key=lambda c: c['id']):
+        first_char_id = conv['first_char_id']
+        if conv['id'] == DUPLICATE_CONVERSATION:
+            first_char_id = DUPLICATE_CHARACTER[0]
+        yield format_line([first_char_id, conv['second_char_id'],
+                           conv['movie_id'], conv_lines[conv['id']]])
+
+
+def line_lines(test_data):
+    for m_dict in test_data.values():
+        for line in m_dict['movie_lines']:
+            character_id = line['character_id']
+            if line['id'] == DUPLICATE_LINE:
+                character_id = DUPLICATE_CHARACTER[0]
+            yield format_line([line['id'], character_id, line['movie_id'],
+                               line['character_name'], line['text']])
+
+
+def write_corpus(directory):
+    """Write the four corpus files to directory and return it."""
+    test_data = get_data(TESTDATA_PATH)
+    files = {
+        MOVIE_DATA: movie_lines,
+        CHARACTERS_DATA: character_lines,
+        CONVERSATION_DATA: conversation_lines,
+        LINE_DATA: line_lines,
+    }
+    for file_name, lines in files.items():
+        with open(os.path.join(directory, file_name), 'w', encoding='latin-1') as f:
+            f.writelines(lines(test_data))
+    return directory
@@ -4,6 +4,10 @@ from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 
 from config import TestingConfig
+from db.linemap import line_number
+from db.manifest import content_version, save_corpus_version
+from db.search import rebuild_search_index
+from db.stats import rebuild_stats
 from db.models import (
     Base,
     Character,
@@ -55,7 +59,7 @@ def insert_conversations(session, m_dict):
 
 def insert_lines(session, m_dict):
     for l_data in m_dict['movie_lines']:
-        line = Line(**l_data)
+        line = Line(position=line_number(l_data['id']), **l_data)
         conv = session.query(Conversation).get(l_data['conversation_id'])
         conv.lines.append(line)
 
@@ -75,6 +79,10 @@ def main():
         insert_characters(session, m_dict)
         insert_conversations(session, m_dict)
         insert_lines(session, m_dict)
+    session.flush()
+    rebuild_search_index(session.connection())
+    rebuild_stats(session.connection())
+    save_corpus_version(session.connection(), content_version([TESTDATA_PATH]))
     session.commit()
 
 
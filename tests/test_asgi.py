@@ -0,0 +1,146 @@
+import asyncio
+import json
+import unittest
+from unittest import mock
+
+from api.asgi import ASYNC_VIEWS, create_asgi_app
+from api.async_queries import async_database_uri
+from api.streaming import ndjson_chunk
+from config import API_BASE_PATH, TestingConfig
+from tests.test_snapshot import URLS
+
+
+async def asgi_messages(app, url, headers=(), messages=None):
+    """Call an ASGI app with a GET request, return the messages it sent (appended to messages)."""
+    path, _, query = url.partition('?')
+    messages = [] if messages is None else messages
+
+    async def receive():
+        return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+    async def send(message):
+        messages.append(message)
+
+    scope = {
+        'type': 'http',
+        'http_version': '1.1',
+        'method': 'GET',
+        'scheme': 'http',
+        'path': path,
+        'root_path': '',
+        'query_string': query.encode(),
+        'headers': [(name.lower().encode(), value.encode()) for name, value in headers],
+        'server': ('localhost', 80),
+    }
+    await app(scope, receive, send)
+    return messages
+
+
+async def asgi_get(app, url, headers=()):
+    """Call an ASGI app with a GET request, return the status, headers and body of the response."""
+    start, *body = await asgi_messages(app, url, headers)
+    headers = {name.decode(): value.decode() for name, value in start['headers']}
+    return start['status'], headers, b''.join(message['body'] for message in body)
+
+
+class AsgiTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.asgi_app = create_asgi_app(TestingConfig)
+        self.client = self.asgi_app.app.test_client()
+
+    def run_requests(self, *urls, headers=()):
+        async def run():
+            try:
+                return await asyncio.gather(*(asgi_get(self.asgi_app, url, headers)
+                                              for url in urls))
+            finally:
+                await self.asgi_app.db.dispose()
+        return asyncio.run(run())
+
+    def test_same_responses_as_wsgi(self):
+        urls = [f'{API_BASE_PATH}{url}' for url in URLS]
+        urls += [f'{API_BASE_PATH}/search/lines?q=love', f'{API_BASE_PATH}/unknown']
+        for url, (status, headers, body) in zip(urls, self.run_requests(*urls)):
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEqual(status, response.status_code)
+                self.assertEqual(body, response.get_data())
+                self.assertEqual(headers['content-type'], response.headers['Content-Type'])
+                self.assertEqual(headers.get('etag'), response.headers.get('ETag'))
+
+    def test_concurrent_requests(self):
+        urls = [f'{API_BASE_PATH}/movies/m{i % 20}' for i in range(100)]
+        responses = self.run_requests(*urls)
+        self.assertEqual({status for status, _, _ in responses}, {200})
+        for url, (_, _, body) in zip(urls, responses):
+            self.assertEqual(json.loads(body)['id'], url.rsplit('/', 1)[1])
+
+    def test_concurrent_relationship_queries(self):
+        ((_, headers, body),) = self.run_requests(f'{API_BASE_PATH}/movies/m0')
+        self.assertEqual(len(json.loads(body)['conversations']), 201)
+        # The movie and its characters, conversations and genres
+        self.assertEqual(headers['x-query-count'], '4')
+
+    def test_response_cache(self):
+        url = f'{API_BASE_PATH}/movies/m0'
+        ((_, _, body),) = self.run_requests(url)
+        ((_, headers, cached_body),) = self.run_requests(url)
+        self.assertEqual(cached_body, body)
+        self.assertEqual(headers['x-query-count'], '0')
+
+    def test_conditional_get(self):
+        urls = [f'{API_BASE_PATH}/{url}' for url in ('movies/m0', 'movies/m999', 'lines?ids=')]
+        headers = [('If-Modified-Since', 'Fri, 31 Dec 9999 23:59:59 GMT')]
+        responses = self.run_requests(*urls, headers=headers)
+        self.assertEqual([status for status, _, _ in responses], [304, 404, 400])
+        self.assertEqual(responses[0][2], b'')
+
+    def test_batch_ids_out_of_range(self):
+        ((status, _, _),) = self.run_requests(f'{API_BASE_PATH}/conversations?ids={1 << 63}')
+        self.assertEqual(status, 400)
+
+    def test_streamed_chunks(self):
+        class SmallBatchConfig(TestingConfig):
+            STREAM_BATCH_SIZE = 10
+
+        url = f'{API_BASE_PATH}/movies/m0/lines?stream=1'
+        expected = self.client.get(url).get_data()
+        self.asgi_app = create_asgi_app(SmallBatchConfig)
+        # Chunks produced and messages sent, in the order they happened
+        events = []
+
+        def produce_chunk(rows, serialize):
+            events.append('chunk')
+            return ndjson_chunk(rows, serialize)
+
+        async def run():
+            try:
+                return await asgi_messages(self.asgi_app, url, messages=events)
+            finally:
+                await self.asgi_app.db.dispose()
+
+        for in_thread in (False, True):
+            events.clear()
+            with self.subTest(in_thread=in_thread), mock.patch.dict(ASYNC_VIEWS), \
+                    mock.patch('api.asgi.ndjson_chunk', produce_chunk), \
+                    mock.patch('api.streaming.ndjson_chunk', produce_chunk):
+                if in_thread:
+                    # Without its async view the Flask view streams from a thread
+                    del ASYNC_VIEWS['routes.get_movie_lines']
+                asyncio.run(run())
+                _, *body, end = [event for event in events if event != 'chunk']
+                self.assertEqual(end, {'type': 'http.response.body', 'body': b''})
+                self.assertEqual(b''.join(message['body'] for message in body), expected)
+                self.assertEqual({message['body'].count(b'\n') for message in body[:-1]}, {10})
+                # Every chunk is sent before the next one is produced
+                self.assertEqual(events[1:-1],
+                                 [event for message in body for event in ('chunk', message)])
+
+    def test_async_database_uri(self):
+        self.assertEqual(str(async_database_uri('sqlite:////tmp/corpus.db')),
+                         'sqlite+aiosqlite:////tmp/corpus.db')
+        self.assertEqual(str(async_database_uri('postgresql+psycopg2://u@db/corpus')),
+                         'postgresql+asyncpg://u@db/corpus')
+        with self.assertRaises(ValueError):
+            async_database_uri('mysql://u@db/corpus')
@@ -0,0 +1,203 @@
+import json
+import threading
+import time
+import unittest
+from unittest import mock
+
+from api.blueprints import routes
+from api.cache import RedisCache, ResponseCache, redis_cache
+from api.factory import create_app
+from api.instrument import QUERY_COUNT_HEADER
+from config import API_BASE_PATH, TestingConfig
+
+
+class Clock:
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class FakeRedis:
+    """The part of the redis-py client the RedisCache uses, in memory."""
+
+    def __init__(self):
+        self.values = {}  # name: (value, expires)
+        self.lock = threading.Lock()
+
+    def _get(self, name):
+        value, expires = self.values.get(name, (None, None))
+        if expires is not None and expires <= time.monotonic():
+            del self.values[name]
+            return None
+        return value
+
+    def get(self, name):
+        with self.lock:
+            return self._get(name)
+
+    def set(self, name, value, ex=None, px=None, nx=False):
+        with self.lock:
+            if nx and self._get(name) is not None:
+                return None
+            if ex is not None:
+                px = ex * 1000
+            expires = time.monotonic() + px / 1000 if px is not None else None
+            self.values[name] = (value.encode() if isinstance(value, str) else value, expires)
+            return True
+
+    def exists(self, name):
+        with self.lock:
+            return int(self._get(name) is not None)
+
+    def delete(self, name):
+        with self.lock:
+            return int(self.values.pop(name, None) is not None)
+
+
+class ResponseCacheTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = Clock()
+        self.cache = ResponseCache(max_bytes=10, ttl=60, clock=self.clock)
+        self.cache.get('a', 'v1')  # sets the version
+
+    def test_lru_eviction(self):
+        self.cache.set('a', b'aaaa', 'application/json', 'v1')
+        self.cache.set('b', b'bbbb', 'application/json', 'v1')
+        self.assertEqual(self.cache.get('a', 'v1'), (b'aaaa', 'application/json'))
+        self.cache.set('c', b'cccc', 'application/json', 'v1')
+
+        self.assertIsNone(self.cache.get('b', 'v1'))
+        self.assertIsNotNone(self.cache.get('a', 'v1'))
+        self.assertIsNotNone(self.cache.get('c', 'v1'))
+        stats = self.cache.stats()
+        self.assertEqual((stats['hits'], stats['evictions'], stats['bytes']), (3, 1, 8))
+
+    def test_oversized_body_is_not_stored(self):
+        self.cache.set('a', b'a' * 11, 'application/json', 'v1')
+        self.assertIsNone(self.cache.get('a', 'v1'))
+        self.assertEqual(self.cache.stats()['bytes'], 0)
+
+    def test_expiry(self):
+        self.cache.set('a', b'aaaa', 'application/json', 'v1')
+        self.clock.now = 61
+        self.assertIsNone(self.cache.get('a', 'v1'))
+        self.assertEqual(self.cache.stats()['expirations'], 1)
+
+    def test_version_change_clears(self):
+        self.cache.set('a', b'aaaa', 'application/json', 'v1')
+        self.assertIsNone(self.cache.get('a', 'v2'))
+        self.cache.set('b', b'bbbb', 'application/json', 'v1')  # stale writer
+        self.assertIsNone(self.cache.get('b', 'v2'))
+        self.assertEqual(self.cache.stats()['entries'], 0)
+
+
+class CachedRoutesTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.app = create_app(config=TestingConfig)
+        self.client = self.app.test_client()
+
+    def test_cached_movie(self):
+        url = f'{API_BASE_PATH}/movies/m0'
+        first = self.client.get(url)
+        second = self.client.get(url)
+        self.assertGreater(int(first.headers[QUERY_COUNT_HEADER]), 0)
+        self.assertEqual(int(second.headers[QUERY_COUNT_HEADER]), 0)
+        self.assertEqual(second.get_data(), first.get_data())
+        self.assertEqual(second.get_etag(), first.get_etag())
+        self.assertEqual(second.mimetype, 'application/json')
+
+        self.assertEqual(self.client.get(f'{API_BASE_PATH}/movies/m999').status_code, 404)
+        self.assertEqual(self.client.get(f'{API_BASE_PATH}/movies/m999').status_code, 404)
+
+        stats = json.loads(self.client.get(f'{API_BASE_PATH}/metrics/cache').get_data())
+        self.assertEqual((stats['entries'], stats['hits'], stats['misses']), (1, 1, 3))
+
+    def test_streams_are_not_cached(self):
+        url = f'{API_BASE_PATH}/conversations/1/lines?stream=1'
+        self.client.get(url)
+        response = self.client.get(url)
+        self.assertGreater(int(response.headers[QUERY_COUNT_HEADER]), 0)
+        self.assertEqual(self.app.extensions['response_cache'].stats()['entries'], 0)
+
+    def test_concurrent_misses_are_coalesced(self):
+        render = routes.collect_movie_data
+        renders = []
+
+        def slow_render(movie, fieldset=None):
+            renders.append(movie.id)
+            time.sleep(0.2)
+            return render(movie, fieldset)
+
+        responses = []
+        def get():
+            responses.append(self.app.test_client().get(f'{API_BASE_PATH}/movies/m0'))
+
+        with mock.patch.object(routes, 'collect_movie_data', slow_render):
+            threads = [threading.Thread(target=get) for _ in range(4)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        self.assertEqual(renders, ['m0'])
+        self.assertEqual(len({r.get_data() for r in responses}), 1)
+        self.assertEqual(sorted(int(r.headers[QUERY_COUNT_HEADER]) > 0 for r in responses),
+                         [False, False, False, True])
+
+    def test_endpoint_ttl(self):
+        cache = self.app.extensions['response_cache']
+        self.app.config['RESPONSE_CACHE_TTLS'] = {'routes.get_movie': 1}
+        with mock.patch.object(cache, 'set', wraps=cache.set) as set_:
+            self.client.get(f'{API_BASE_PATH}/movies/m0')
+        self.assertEqual(set_.call_args.kwargs['ttl'], 1)
+
+
+class RedisCacheTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.redis = FakeRedis()
+        self.apps = [create_app(config=TestingConfig) for _ in range(2)]
+        for app in self.apps:  # two workers sharing one store
+            app.extensions['response_cache'] = redis_cache(app.config, client=self.redis)
+
+    def test_shared_between_workers(self):
+        url = f'{API_BASE_PATH}/characters/u0'
+        first = self.apps[0].test_client().get(url)
+        second = self.apps[1].test_client().get(url)
+        self.assertEqual(second.get_data(), first.get_data())
+        self.assertEqual(second.mimetype, 'application/json')
+        self.assertEqual(int(second.headers[QUERY_COUNT_HEADER]), 0)
+        self.assertEqual(self.apps[1].extensions['response_cache'].stats()['hits'], 1)
+
+    def test_namespaced_by_version(self):
+        cache = RedisCache(self.redis, ttl=60)
+        cache.set('key', b'{}', 'application/json', 'v1')
+        self.assertEqual(cache.get('key', 'v1'), (b'{}', 'application/json'))
+        self.assertIsNone(cache.get('key', 'v2'))
+        self.assertTrue(all(name.startswith('cornell:v1:') for name in self.redis.values))
+
+    def test_concurrent_misses_are_coalesced_across_workers(self):
+        render = routes.collect_movie_data
+        renders = []
+
+        def slow_render(movie, fieldset=None):
+            renders.append(movie.id)
+            time.sleep(0.2)
+            return render(movie, fieldset)
+
+        with mock.patch.object(routes, 'collect_movie_data', slow_render):
+            threads = [threading.Thread(target=self.apps[i % 2].test_client().get,
+                                        args=(f'{API_BASE_PATH}/movies/m1',))
+                       for i in range(4)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        self.assertEqual(renders, ['m1'])
+        self.assertFalse(any(name.endswith(':lock') for name in self.redis.values))
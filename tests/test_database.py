@@ -0,0 +1,103 @@
+import unittest
+
+from sqlalchemy import create_engine
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+
+from api import fdb
+from api.database import InstrumentedQueuePool, ReplicaSet, engine_options
+from api.factory import create_app
+from config import API_BASE_PATH, TestingConfig
+
+UNAVAILABLE_URI = 'sqlite:////nonexistent/directory/corpus.db'
+
+
+class PoolConfig(TestingConfig):
+    DB_POOL_SIZE = 3
+    DB_MAX_OVERFLOW = 2
+    CACHE_BACKEND = 'none'
+
+
+class ReplicaConfig(PoolConfig):
+    REPLICA_URIS = [TestingConfig.SQLALCHEMY_DATABASE_URI]
+
+
+class FailoverConfig(PoolConfig):
+    REPLICA_URIS = [UNAVAILABLE_URI, TestingConfig.SQLALCHEMY_DATABASE_URI]
+
+
+class UnavailableReplicaConfig(PoolConfig):
+    REPLICA_URIS = [UNAVAILABLE_URI]
+
+
+class DatabaseTestCase(unittest.TestCase):
+
+    def pools(self, client):
+        return client.get(f'{API_BASE_PATH}/metrics/pools').get_json()
+
+    def test_pool_options(self):
+        app = create_app(config=PoolConfig)
+        with app.app_context():
+            pool = fdb.engine.pool
+        self.assertIsInstance(pool, InstrumentedQueuePool)
+        self.assertEqual(pool.size(), 3)
+        self.assertEqual(pool.max_overflow, 2)
+        self.assertTrue(pool._pre_ping)  # pylint: disable=protected-access
+
+    def test_memory_database_without_pool_options(self):
+        self.assertEqual(engine_options({}, 'sqlite://'), {})
+
+    def test_checkout_wait_metrics(self):
+        engine = create_engine(TestingConfig.SQLALCHEMY_DATABASE_URI,
+                               poolclass=InstrumentedQueuePool, pool_size=1, max_overflow=0,
+                               pool_timeout=0.05)
+        with engine.connect():
+            with self.assertRaises(PoolTimeoutError):
+                engine.connect()
+        stats = engine.pool.stats.as_dict()
+        self.assertEqual(stats['checkouts'], 1)
+        self.assertEqual(stats['timeouts'], 1)
+        self.assertGreaterEqual(stats['wait_seconds_max'], 0.05)
+        engine.dispose()
+
+    def test_get_routes_use_replica(self):
+        client = create_app(config=ReplicaConfig).test_client()
+        before = self.pools(client)
+        response = client.get(f'{API_BASE_PATH}/movies/m0')
+        self.assertEqual(response.status_code, 200)
+
+        after = self.pools(client)
+        self.assertEqual(after['primary']['checkouts'], before['primary']['checkouts'])
+        self.assertGreater(after['replicas']['replica_0']['checkouts'],
+                           before['replicas']['replica_0']['checkouts'])
+        self.assertEqual(after['replicas']['replica_0']['checked_out'], 0)
+
+    def test_failover_to_healthy_replica(self):
+        client = create_app(config=FailoverConfig).test_client()
+        for _ in range(3):
+            self.assertEqual(client.get(f'{API_BASE_PATH}/lines/L1045').status_code, 200)
+
+        replicas = self.pools(client)['replicas']
+        self.assertFalse(replicas['replica_0']['healthy'])
+        self.assertEqual(replicas['replica_0']['failures'], 1)
+        self.assertTrue(replicas['replica_1']['healthy'])
+
+    def test_failover_to_primary(self):
+        client = create_app(config=UnavailableReplicaConfig).test_client()
+        before = self.pools(client)['primary']['checkouts']
+        self.assertEqual(client.get(f'{API_BASE_PATH}/lines/L1045').status_code, 200)
+        self.assertGreater(self.pools(client)['primary']['checkouts'], before)
+
+    def test_replica_retried_after_interval(self):
+        now = [0.0]
+        engine = create_engine(UNAVAILABLE_URI)
+        replicas = ReplicaSet({'replica_0': engine}, check_interval=1, retry_interval=10,
+                              clock=lambda: now[0])
+        self.assertIsNone(replicas.choose())
+
+        engine.dispose()
+        replicas.engines['replica_0'] = good = create_engine(TestingConfig.SQLALCHEMY_DATABASE_URI)
+        now[0] = 5
+        self.assertIsNone(replicas.choose())
+        now[0] = 11
+        self.assertIs(replicas.choose(), good)
+        good.dispose()
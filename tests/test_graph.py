@@ -0,0 +1,70 @@
+import json
+import unittest
+
+from api.factory import create_app
+from api.instrument import QUERY_COUNT_HEADER
+from config import API_BASE_PATH, TestingConfig
+
+
+class GraphTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.app = create_app(config=TestingConfig)
+        self.client = self.app.test_client()
+
+    def get_json(self, url):
+        response = self.client.get(f'{API_BASE_PATH}{url}')
+        self.assertEqual(response.status_code, 200)
+        return json.loads(response.get_data())
+
+    def test_character_neighbors(self):
+        neighbors = self.get_json('/characters/u0/neighbors')
+        pairs = self.get_json('/stats/characters/u0')['pairs']
+        self.assertEqual(neighbors['id'], 'u0')
+        self.assertEqual(
+            [(n['id'], n['conversations'], n['lines']) for n in neighbors['neighbors']],
+            [(p['partner_id'], p['conversations'], p['lines']) for p in pairs],
+        )
+        self.assertEqual(neighbors['neighbors'][0]['name'], 'CAMERON')
+
+    def test_movie_graph(self):
+        graph = self.get_json('/movies/m0/graph')
+        movie = self.get_json('/movies/m0?include=characters')
+        self.assertEqual(graph['movie_id'], 'm0')
+        self.assertEqual({node['id'] for node in graph['nodes']},
+                         {c['id'] for c in movie['characters']})
+
+        edges = {(edge['source'], edge['target']): edge for edge in graph['edges']}
+        self.assertEqual(len(edges), len(graph['edges']))
+        for source, target in edges:
+            self.assertLess(source, target)
+            self.assertNotIn((target, source), edges)
+
+        # Every edge of the movie is one neighbor of both of its characters
+        for node in graph['nodes']:
+            neighbors = self.get_json(f"/characters/{node['id']}/neighbors")['neighbors']
+            expected = {
+                edge['target'] if edge['source'] == node['id'] else edge['source']:
+                    (edge['conversations'], edge['lines'])
+                for edge in graph['edges'] if node['id'] in (edge['source'], edge['target'])
+            }
+            self.assertEqual({n['id']: (n['conversations'], n['lines']) for n in neighbors},
+                             expected)
+
+    def test_built_once(self):
+        self.get_json('/movies/m0/graph')
+        for url in ('/movies/m1/graph', '/characters/u0/neighbors'):
+            response = self.client.get(f'{API_BASE_PATH}{url}')
+            self.assertEqual(response.headers[QUERY_COUNT_HEADER], '0')
+
+    def test_rebuilt_for_new_version(self):
+        self.get_json('/characters/u0/neighbors')
+        holder = self.app.extensions['corpus_indexes']['character_graph']
+        graph = holder.index
+        holder.version = None
+        self.get_json('/characters/u0/neighbors')
+        self.assertIsNot(holder.index, graph)
+
+    def test_404(self):
+        for url in ('/movies/m999/graph', '/characters/unknown/neighbors'):
+            self.assertEqual(self.client.get(f'{API_BASE_PATH}{url}').status_code, 404)
@@ -0,0 +1,54 @@
+import json
+import sys
+import unittest
+from unittest import mock
+
+from api.factory import create_app
+from api.json_backends import JSON_BACKENDS
+from config import API_BASE_PATH, TestingConfig
+
+URLS = (
+    '/movies/m0',
+    '/movies?limit=20',
+    '/conversations/1/lines?stream=1',
+    '/movies/unknown',
+)
+
+
+class JSONBackendsTestCase(unittest.TestCase):
+
+    def get_responses(self, backend):
+        client = create_app(config=TestingConfig, json_backend=backend).test_client()
+        responses = {}
+        for url in URLS:
+            response = client.get(API_BASE_PATH + url)
+            responses[url] = (response.status_code, response.data.decode())
+        return responses
+
+    def test_backends_match_stdlib(self):
+        expected = self.get_responses('stdlib')
+        for backend in JSON_BACKENDS:
+            responses = self.get_responses(backend)
+            for url, (status, body) in responses.items():
+                self.assertEqual(status, expected[url][0], url)
+                self.assertEqual([json.loads(l) for l in body.splitlines()],
+                                 [json.loads(l) for l in expected[url][1].splitlines()], url)
+
+    def test_sorted_keys(self):
+        app = create_app(config=TestingConfig, json_backend='orjson')
+        if app.extensions['json_backend'] != 'orjson':
+            self.skipTest('orjson is not installed')
+        with app.app_context():
+            self.assertEqual(app.json.response({'b': 1, 'a': [2]}).get_data(), b'{"a":[2],"b":1}\n')
+
+    def test_missing_library_falls_back_to_stdlib(self):
+        with mock.patch.dict(sys.modules, {'orjson': None, 'ujson': None}):
+            for backend in ('orjson', 'ujson'):
+                app = create_app(config=TestingConfig, json_backend=backend)
+                self.assertEqual(app.extensions['json_backend'], 'stdlib')
+                response = app.test_client().get(API_BASE_PATH + '/genres/1')
+                self.assertEqual(response.status_code, 200)
+
+    def test_unknown_backend(self):
+        with self.assertRaises(ValueError):
+            create_app(config=TestingConfig, json_backend='yaml')
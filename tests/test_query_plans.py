@@ -0,0 +1,99 @@
+import unittest
+
+from sqlalchemy import event
+
+from api import fdb
+from api.factory import create_app
+from config import API_BASE_PATH, TestingConfig
+from tests.test_snapshot import URLS
+
+# Tables that grow with the corpus: a route must never read all their rows
+HOT_TABLES = ('lines', 'characters', 'conversations', 'convs_chars', 'movie_genres')
+
+# Routes whose rows have to come out of an index in the requested order
+DIALOG_URLS = (
+    '/conversations/1/lines',
+    '/conversations/1/lines?stream=1',
+    '/movies/m0/lines',
+    '/movies/m3/lines?stream=1',
+)
+
+PLAN_URLS = URLS + (
+    '/sample/lines?n=100&seed=1',
+    '/sample/conversations?n=100&seed=1&genre=comedy',
+    '/search/lines?q=love',
+    '/search/lines?q=you&movie_id=m0',
+    '/stats/movies/m0',
+    '/stats/characters/u0',
+    '/stats/genres',
+    '/stats/years',
+)
+
+
+class PlanConfig(TestingConfig):
+    CACHE_BACKEND = 'none'
+
+
+def full_scans(plan):
+    """The steps of a plan that visit every row (or index entry) of a hot table."""
+    scans = [['SCAN', table] for table in HOT_TABLES]
+    return [detail for detail in plan if detail.split()[:2] in scans]
+
+
+class QueryPlanTestCase(unittest.TestCase):
+    """EXPLAIN QUERY PLAN of the SELECT statements of every route on SQLite."""
+
+    def setUp(self):
+        self.app = create_app(config=PlanConfig)
+        self.client = self.app.test_client()
+        with self.app.app_context():
+            self.engine = fdb.engine
+        if self.engine.dialect.name != 'sqlite':
+            self.skipTest('query plans are checked on SQLite')
+
+    def route_plans(self, url):
+        """
+        The plan of every SELECT statement executed while the route answers url.
+
+        The route is requested once before, so that the in-memory indexes it
+        builds on first use are not counted.
+        """
+        self.client.get(API_BASE_PATH + url)
+        statements = []
+
+        def capture(conn, cursor, statement, parameters, context, executemany):
+            if statement.lstrip().upper().startswith('SELECT'):
+                statements.append((statement, parameters))
+
+        event.listen(self.engine, 'before_cursor_execute', capture)
+        try:
+            self.client.get(API_BASE_PATH + url)
+        finally:
+            event.remove(self.engine, 'before_cursor_execute', capture)
+        self.assertTrue(statements, url)
+
+        with self.engine.connect() as connection:
+            return [
+                (statement, [row[-1] for row in connection.exec_driver_sql(
+                    f'EXPLAIN QUERY PLAN {statement}', parameters)])
+                for statement, parameters in statements
+            ]
+
+    def test_no_full_scans(self):
+        for url in PLAN_URLS:
+            for statement, plan in self.route_plans(url):
+                with self.subTest(url=url, statement=statement):
+                    self.assertEqual(full_scans(plan), [])
+
+    def test_dialog_order_from_index(self):
+        for url in DIALOG_URLS:
+            for statement, plan in self.route_plans(url):
+                with self.subTest(url=url, statement=statement):
+                    self.assertFalse([detail for detail in plan if 'TEMP B-TREE' in detail])
+
+    def test_full_scans(self):
+        self.assertEqual(full_scans(['SCAN lines', 'SEARCH movies USING INDEX ix (id=?)']),
+                         ['SCAN lines'])
+        covering_scan = 'SCAN characters USING COVERING INDEX ix_characters_movie_id'
+        self.assertEqual(full_scans([covering_scan]), [covering_scan])
+        self.assertEqual(full_scans(['SCAN movies', 'SCAN lines_fts VIRTUAL TABLE INDEX 0:M2']), [])
@@ -1,10 +1,18 @@
 import json
 import unittest
 
+from sqlalchemy import event
+
+from api import fdb
 from api.factory import create_app
+from api.instrument import QUERY_COUNT_HEADER
 from config import API_BASE_PATH, TestingConfig
 
 
+class UncachedConfig(TestingConfig):
+    CACHE_BACKEND = 'none'
+
+
 class RoutesTestCase(unittest.TestCase):
 
     def setUp(self):
@@ -22,6 +30,10 @@ class RoutesTestCase(unittest.TestCase):
         self.assertEqual(len(response_data['characters']), 12)
         self.assertEqual(len(response_data['conversations']), 201)
 
+    def test_get_movie_id_query_count(self):
+        response = self.client.get(f'{API_BASE_PATH}/movies/m0')
+        self.assertLessEqual(int(response.headers[QUERY_COUNT_HEADER]), 4)
+
     def test_get_movie_id_404(self):
         response = self.client.get(f'{API_BASE_PATH}/movies/m999')
         self.assertEqual(response.status_code, 404)
@@ -31,9 +43,9 @@ class RoutesTestCase(unittest.TestCase):
         self.assertEqual(response.status_code, 200)
 
         response_data = json.loads(response.get_data())
-        self.assertEqual(len(response_data['results']), 5)
-        self.assertIn('m0', [m['id'] for m in response_data['results']])
-        self.assertNotIn('m10', [m['id'] for m in response_data['results']])
+        # In ID order, the IDs are strings
+        self.assertEqual([m['id'] for m in response_data['results']],
+                         ['m0', 'm1', 'm10', 'm11', 'm12'])
         self.assertTrue('next' in response_data['links'])
         self.assertFalse('prev' in response_data['links'])
         self.assertDictEqual(
@@ -50,3 +62,253 @@ class RoutesTestCase(unittest.TestCase):
     def test_get_movies_pagination_404(self):
         response = self.client.get(f'{API_BASE_PATH}/movies?start=20')
         self.assertEqual(response.status_code, 404)
+
+    def test_get_movies_query_count(self):
+        for limit in (1, 5, 50):
+            response = self.client.get(f'{API_BASE_PATH}/movies?limit={limit}')
+            self.assertEqual(response.status_code, 200)
+            self.assertLessEqual(int(response.headers[QUERY_COUNT_HEADER]), 5)
+
+    def test_get_movies_pagination_unaligned_start(self):
+        response = self.client.get(f'{API_BASE_PATH}/movies?start=3&limit=5')
+        response_data = json.loads(response.get_data())
+
+        all_ids = [m['id'] for m in json.loads(
+            self.client.get(f'{API_BASE_PATH}/movies?limit=20').get_data())['results']]
+        self.assertEqual([m['id'] for m in response_data['results']], all_ids[3:8])
+        self.assertIn('start=0', response_data['links']['prev'])
+        self.assertIn('start=8', response_data['links']['next'])
+
+    def test_get_movies_cursor_pagination(self):
+        ids = []
+        url = f'{API_BASE_PATH}/movies?after=&limit=6'
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            response_data = json.loads(response.get_data())
+            self.assertNotIn('total_items', response_data['meta'])
+            ids.extend(m['id'] for m in response_data['results'])
+            url = response_data['links'].get('next')
+
+        self.assertEqual(len(ids), 20)
+        self.assertEqual(ids, sorted(ids))
+
+    def test_get_movies_cursor_count(self):
+        for count in ('exact', 'estimate'):
+            response = self.client.get(f'{API_BASE_PATH}/movies?after=&count={count}')
+            self.assertEqual(json.loads(response.get_data())['meta']['total_items'], 20)
+
+    def test_get_movies_cursor_400(self):
+        for query in ('after=not-a-cursor', 'after=&count=maybe', 'after=&limit=0'):
+            response = self.client.get(f'{API_BASE_PATH}/movies?{query}')
+            self.assertEqual(response.status_code, 400)
+
+    def test_get_conversation_lines_ndjson(self):
+        url = f'{API_BASE_PATH}/conversations/1/lines'
+        expected = json.loads(self.client.get(url).get_data())
+
+        for query, headers in (('?stream=1', {}), ('', {'Accept': 'application/x-ndjson'})):
+            response = self.client.get(url + query, headers=headers)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.mimetype, 'application/x-ndjson')
+            lines = [json.loads(l) for l in response.get_data(as_text=True).splitlines()]
+            self.assertEqual(lines, expected)
+
+    def test_get_movie_lines(self):
+        response = self.client.get(f'{API_BASE_PATH}/movies/m0/lines')
+        self.assertEqual(response.status_code, 200)
+        lines = json.loads(response.get_data())
+        self.assertTrue(all(l['movie_id'] == 'm0' for l in lines))
+
+        response = self.client.get(f'{API_BASE_PATH}/movies/m0/lines?stream=1')
+        streamed = [json.loads(l) for l in response.get_data(as_text=True).splitlines()]
+        self.assertEqual(streamed, lines)
+
+    def test_conversation_lines_in_dialog_order(self):
+        # 'L1000' sorts before 'L998' as a string
+        url = f'{API_BASE_PATH}/conversations/172'
+        streamed = self.client.get(f'{url}/lines?stream=1').get_data().splitlines()
+        for lines in (json.loads(self.client.get(f'{url}/lines').get_data()),
+                      [json.loads(l) for l in streamed]):
+            self.assertEqual([l['id'] for l in lines], ['L998', 'L999', 'L1000'])
+            self.assertEqual([l['position'] for l in lines], [998, 999, 1000])
+
+        response = self.client.get(f'{url}?include=lines')
+        self.assertEqual(json.loads(response.get_data())['lines'], ['L998', 'L999', 'L1000'])
+
+    def test_get_movie_lines_404(self):
+        for query in ('', '?stream=1'):
+            response = self.client.get(f'{API_BASE_PATH}/movies/m999/lines{query}')
+            self.assertEqual(response.status_code, 404)
+
+    def test_batch_lines(self):
+        response = self.client.get(f'{API_BASE_PATH}/lines?ids=L1045,L999999,L1044,L1045')
+        self.assertEqual(response.status_code, 200)
+        self.assertLessEqual(int(response.headers[QUERY_COUNT_HEADER]), 1)
+
+        response_data = json.loads(response.get_data())
+        self.assertEqual([l['id'] for l in response_data['results']], ['L1045', 'L1044'])
+        self.assertEqual(response_data['missing'], ['L999999'])
+
+    def test_batch_movies_characters_conversations(self):
+        batches = (
+            ('movies', ['m2', 'm0']),
+            ('characters', ['u2', 'u0']),
+            ('conversations', [2, 1]),
+        )
+        for resource, ids in batches:
+            response = self.client.get(f'{API_BASE_PATH}/{resource}?ids=' + ','.join(map(str, ids)))
+            self.assertEqual(response.status_code, 200)
+            response_data = json.loads(response.get_data())
+            self.assertEqual([o['id'] for o in response_data['results']], ids)
+            self.assertEqual(response_data['missing'], [])
+
+    def test_batch_400(self):
+        too_many = ','.join(f'L{i}' for i in range(TestingConfig.MAX_BATCH_SIZE + 1))
+        for url in ('lines', 'lines?ids=', f'lines?ids={too_many}', 'conversations?ids=1,x'):
+            response = self.client.get(f'{API_BASE_PATH}/{url}')
+            self.assertEqual(response.status_code, 400)
+
+    def test_batch_400_ids_out_of_range(self):
+        for ids in (f'1,{1 << 63}', f'{-1 << 63},-{(1 << 63) + 1}', '99999999999999999999999'):
+            response = self.client.get(f'{API_BASE_PATH}/conversations?ids={ids}')
+            self.assertEqual(response.status_code, 400, ids)
+        response = self.client.get(f'{API_BASE_PATH}/conversations?ids=1,{(1 << 63) - 1}')
+        self.assertEqual(json.loads(response.get_data())['missing'], [(1 << 63) - 1])
+
+        too_large = 1 << 63
+        for url in (f'conversations/{too_large}', f'conversations/{too_large}/lines',
+                    f'genres/{too_large}'):
+            self.assertEqual(self.client.get(f'{API_BASE_PATH}/{url}').status_code, 404, url)
+
+    def test_conditional_get(self):
+        # Without the response cache, so that the query count is the one of the 304
+        self.client = create_app(config=UncachedConfig).test_client()
+        url = f'{API_BASE_PATH}/movies/m0'
+        response = self.client.get(url)
+        etag, _ = response.get_etag()
+        last_modified = response.headers['Last-Modified']
+        self.assertIsNotNone(etag)
+        self.assertIsNotNone(response.last_modified)
+        self.assertTrue(response.cache_control.public)
+        self.assertEqual(response.cache_control.max_age, TestingConfig.CACHE_MAX_AGE)
+        self.assertIn('Accept', response.vary)
+
+        response = self.client.get(url, headers={'If-None-Match': f'"{etag}"'})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.get_etag()[0], etag)
+        self.assertEqual(response.get_data(), b'')
+        self.assertEqual(int(response.headers[QUERY_COUNT_HEADER]), 0)
+
+        response = self.client.get(url, headers={'If-Modified-Since': last_modified})
+        self.assertEqual(response.status_code, 304)
+
+        response = self.client.get(url, headers={'If-None-Match': '"stale"'})
+        self.assertEqual(response.status_code, 200)
+
+        for url in ('lines/L1045', 'movies/m0/lines', 'conversations/1', 'movies?limit=5',
+                    'sample/lines?n=5&seed=1'):
+            etag, _ = self.client.get(f'{API_BASE_PATH}/{url}').get_etag()
+            response = self.client.get(f'{API_BASE_PATH}/{url}',
+                                       headers={'If-None-Match': f'"{etag}"'})
+            self.assertEqual(response.status_code, 304, url)
+            self.assertEqual(response.get_etag()[0], etag)
+            self.assertEqual(int(response.headers[QUERY_COUNT_HEADER]), 0, url)
+
+    def test_conditional_get_of_errors(self):
+        response = self.client.get(f'{API_BASE_PATH}/movies/m0')
+        validators = (
+            {'If-Modified-Since': 'Fri, 31 Dec 9999 23:59:59 GMT'},
+            {'If-None-Match': '*'},
+            {'If-None-Match': f'"{response.get_etag()[0]}"'},
+        )
+        for url, status in (('movies/m999', 404), ('movies?start=999', 404), ('lines?ids=', 400),
+                            ('sample/lines?n=0', 400), ('sample/lines?n=5', 200)):
+            for headers in validators:
+                with self.subTest(url=url, headers=headers):
+                    response = self.client.get(f'{API_BASE_PATH}/{url}', headers=headers)
+                    self.assertEqual(response.status_code, status)
+                    self.assertIsNone(response.get_etag()[0])
+
+    def test_etags_per_entity_and_representation(self):
+        urls = ('movies/m0', 'movies/m1', 'movies/m0/lines', 'movies/m0/lines?stream=1',
+                'lines?ids=L1045')
+        etags = {self.client.get(f'{API_BASE_PATH}/{url}').get_etag()[0] for url in urls}
+        self.assertEqual(len(etags), len(urls))
+
+        response = self.client.get(f'{API_BASE_PATH}/movies/m999')
+        self.assertEqual(response.status_code, 404)
+        self.assertIsNone(response.get_etag()[0])
+
+    def test_sparse_fieldsets(self):
+        statements = []
+        def before_cursor_execute(conn, cursor, statement, *args):
+            statements.append(statement)
+        with self.app.app_context():
+            event.listen(fdb.engine, 'before_cursor_execute', before_cursor_execute)
+        try:
+            response = self.client.get(f'{API_BASE_PATH}/movies?after=&limit=3&fields=title,year')
+        finally:
+            with self.app.app_context():
+                event.remove(fdb.engine, 'before_cursor_execute', before_cursor_execute)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(statements), 1)
+        self.assertNotIn('imdb_rating', statements[0])
+        response_data = json.loads(response.get_data())
+        self.assertEqual([set(m) for m in response_data['results']], [{'id', 'title', 'year'}] * 3)
+        self.assertIn('fields=title', response_data['links']['next'])
+
+    def test_includes(self):
+        full = json.loads(self.client.get(f'{API_BASE_PATH}/movies/m0').get_data())
+        response = self.client.get(f'{API_BASE_PATH}/movies/m0?include=genres')
+        self.assertLessEqual(int(response.headers[QUERY_COUNT_HEADER]), 2)
+        movie = json.loads(response.get_data())
+        self.assertEqual(
+            movie, {k: v for k, v in full.items() if k not in ('characters', 'conversations')})
+
+        response = self.client.get(f'{API_BASE_PATH}/characters/u0?fields=name&include=lines')
+        character = json.loads(response.get_data())
+        self.assertEqual(set(character), {'id', 'name', 'lines'})
+        self.assertIn('L1045', character['lines'])
+
+        response = self.client.get(
+            f'{API_BASE_PATH}/conversations?ids=1,2&include=lines,characters')
+        conversations = json.loads(response.get_data())['results']
+        self.assertEqual([c['id'] for c in conversations], [1, 2])
+        self.assertTrue(all(c['lines'] and c['characters'] for c in conversations))
+
+    def test_fieldsets_400(self):
+        urls = ('movies/m0?fields=budget', 'movies?include=lines', 'characters/u0?include=genres')
+        for url in urls:
+            response = self.client.get(f'{API_BASE_PATH}/{url}')
+            self.assertEqual(response.status_code, 400)
+
+    def test_search_lines(self):
+        response = self.client.get(f'{API_BASE_PATH}/search/lines?q=they do not&limit=5')
+        self.assertEqual(response.status_code, 200)
+        response_data = json.loads(response.get_data())
+        results = response_data['results']
+        self.assertEqual(results[0]['id'], 'L1045')
+        self.assertEqual(results, sorted(results, key=lambda l: -l['score']))
+        self.assertIn('next', response_data['links'])
+
+        next_page = json.loads(self.client.get(response_data['links']['next']).get_data())
+        self.assertFalse({l['id'] for l in results} & {l['id'] for l in next_page['results']})
+
+    def test_search_lines_filters(self):
+        for query, check in (('movie_id=m0', lambda l: l['movie_id'] == 'm0'),
+                             ('character_id=u2', lambda l: l['character_id'] == 'u2')):
+            response = self.client.get(f'{API_BASE_PATH}/search/lines?q=you&limit=100&{query}')
+            results = json.loads(response.get_data())['results']
+            self.assertTrue(results)
+            self.assertTrue(all(check(l) for l in results), query)
+
+        response = self.client.get(
+            f'{API_BASE_PATH}/search/lines?q=you&limit=100&genre=no-such-genre')
+        self.assertEqual(json.loads(response.get_data())['results'], [])
+
+    def test_search_lines_400(self):
+        for query in ('', 'q=', 'q=%22(*', 'q=love&limit=0', 'q=love&start=-1'):
+            response = self.client.get(f'{API_BASE_PATH}/search/lines?{query}')
+            self.assertEqual(response.status_code, 400)
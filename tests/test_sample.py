@@ -0,0 +1,77 @@
+import json
+import unittest
+
+from sqlalchemy import select
+
+from api import fdb
+from api.factory import create_app
+from api.instrument import QUERY_COUNT_HEADER
+from config import API_BASE_PATH, TestingConfig
+from db.models import Genre, Movie
+from db.sampling import Ranges
+
+
+class SampleTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.app = create_app(config=TestingConfig)
+        self.client = self.app.test_client()
+
+    def sample(self, url):
+        response = self.client.get(f'{API_BASE_PATH}{url}')
+        self.assertEqual(response.status_code, 200)
+        return response, json.loads(response.get_data())
+
+    def test_reproducible_with_seed(self):
+        _, first = self.sample('/sample/lines?n=50&seed=7')
+        _, second = self.sample('/sample/lines?n=50&seed=7')
+        _, other = self.sample('/sample/lines?n=50&seed=8')
+        ids = [line['id'] for line in first['results']]
+        self.assertEqual(len(set(ids)), 50)
+        self.assertEqual(first, second)
+        self.assertNotEqual(ids, [line['id'] for line in other['results']])
+        self.assertEqual(first['meta'], {'n': 50, 'seed': 7, 'genre': None})
+
+    def test_without_seed(self):
+        response, data = self.sample('/sample/conversations?n=5')
+        self.assertIsNone(response.headers.get('ETag'))
+        self.assertTrue(response.cache_control.no_store)
+
+        _, again = self.sample(f"/sample/conversations?n=5&seed={data['meta']['seed']}")
+        self.assertEqual(again['results'], data['results'])
+
+    def test_genre(self):
+        with self.app.app_context():
+            comedies = set(fdb.session.execute(
+                select(Movie.id).join(Movie.genres).where(Genre.name == 'comedy')).scalars())
+        for url in ('/sample/lines?n=200&seed=1&genre=comedy',
+                    '/sample/conversations?n=200&seed=1&genre=comedy'):
+            _, data = self.sample(url)
+            self.assertEqual(len(data['results']), 200)
+            self.assertLessEqual({record['movie_id'] for record in data['results']}, comedies)
+
+        _, data = self.sample('/sample/lines?n=10&seed=1&genre=unknown')
+        self.assertEqual(data['results'], [])
+
+    def test_one_query_per_sample(self):
+        self.sample('/sample/lines?n=10&seed=1')
+        response, _ = self.sample('/sample/lines?n=1000&seed=2')
+        self.assertEqual(response.headers[QUERY_COUNT_HEADER], '1')
+
+    def test_fields(self):
+        _, data = self.sample('/sample/conversations?n=3&seed=1&fields=movie_id')
+        self.assertEqual([set(record) for record in data['results']], [{'id', 'movie_id'}] * 3)
+
+    def test_400(self):
+        for query in ('n=0', 'n=1001', 'n=10&seed=x', 'n=2&seed=-1', f'n=2&seed={1 << 63}',
+                      'n=2&seed=99999999999999999999999999'):
+            response = self.client.get(f'{API_BASE_PATH}/sample/lines?{query}')
+            self.assertEqual(response.status_code, 400, query)
+        _, data = self.sample(f'/sample/lines?n=2&seed={(1 << 63) - 1}')
+        self.assertEqual(data['meta']['seed'], (1 << 63) - 1)
+
+    def test_ranges(self):
+        ranges = Ranges([range(10, 13), range(0), range(20, 22)])
+        self.assertEqual(len(ranges), 5)
+        self.assertEqual(list(ranges), [10, 11, 12, 20, 21])
+        self.assertEqual(len(Ranges([])), 0)
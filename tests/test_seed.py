@@ -0,0 +1,388 @@
+import json
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from sqlalchemy import create_engine, event, func, select
+
+from benchmarks.seed import benchmark, compare
+from db import seed
+from db.dedupe import dedupe_characters
+from db.instrument import SeedMetrics
+from db import linemap
+from db.linemap import LineConversationMap
+from db.manifest import load_corpus_version, load_manifest
+from db.models import Base, Character, Conversation, Line, Movie, convs_chars
+from db.parse import parallel_prepare_data, parse_list
+from db.search import search_lines, search_terms
+from db.seed import write_lines
+from tests.data.corpus import (
+    DELIMITER,
+    DUPLICATE_CHARACTER,
+    DUPLICATE_CONVERSATION,
+    DUPLICATE_LINE,
+    write_corpus,
+)
+
+
+def dump_tables(engine):
+    with engine.connect() as connection:
+        return {
+            table.name: sorted(connection.execute(table.select()).fetchall(), key=repr)
+            for table in Base.metadata.sorted_tables
+            if table.name not in ('seed_manifest', 'corpus_version')
+        }
+
+
+class SeedTestCase(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp_dir = tempfile.TemporaryDirectory()
+        cls.corpus_path = write_corpus(cls.tmp_dir.name)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tmp_dir.cleanup()
+
+    def seed_database(self, name, corpus_path=None, create=True, **kwargs):
+        database_uri = 'sqlite:///' + os.path.join(self.tmp_dir.name, name)
+        engine = create_engine(database_uri)
+        if create:
+            Base.metadata.drop_all(engine)
+            Base.metadata.create_all(engine)
+
+        with mock.patch.object(seed, 'CORPUS_PATH', corpus_path or self.corpus_path), \
+                mock.patch.object(seed, 'DATABASE_URI', database_uri), \
+                mock.patch('builtins.print'):
+            seed.main(**kwargs)
+        return engine
+
+    def test_bulk_matches_orm(self):
+        orm_tables = dump_tables(self.seed_database('orm.db', mode='orm'))
+        bulk_tables = dump_tables(self.seed_database('bulk.db', mode='bulk', batch_size=1000))
+        parallel_tables = dump_tables(self.seed_database('parallel.db', mode='bulk', workers=2))
+        incremental_tables = dump_tables(self.seed_database('incremental.db', mode='incremental'))
+
+        self.assertEqual(len(bulk_tables['lines']), 9051)
+        self.assertEqual(len(bulk_tables['conversations']), 2554)
+        self.assertEqual(sum(row.lines for row in bulk_tables['movie_stats']), 9051)
+        for table_name, rows in orm_tables.items():
+            self.assertEqual(bulk_tables[table_name], rows, table_name)
+            self.assertEqual(parallel_tables[table_name], rows, table_name)
+            self.assertEqual(incremental_tables[table_name], rows, table_name)
+
+    def test_incremental_skips_unchanged_files(self):
+        engine = self.seed_database('unchanged.db', mode='incremental')
+        with engine.connect() as connection:
+            version = load_corpus_version(connection)
+        self.assertIsNotNone(version)
+
+        with mock.patch.object(seed.BulkLoader, 'write') as write:
+            self.seed_database('unchanged.db', create=False, mode='incremental')
+        write.assert_not_called()
+        with engine.connect() as connection:
+            self.assertEqual(load_corpus_version(connection), version)
+
+    def test_incremental_resumes_after_failure(self):
+        expected = dump_tables(self.seed_database('expected.db', mode='bulk'))
+
+        written_batches = []
+        def failing_write_lines(loader, batch, aliases):
+            if len(written_batches) == 3:
+                raise RuntimeError('connection lost')
+            written_batches.append(batch[0]['id'])
+            write_lines(loader, batch, aliases)
+
+        with mock.patch.object(seed, 'write_lines', failing_write_lines):
+            with self.assertRaises(RuntimeError):
+                self.seed_database('resume.db', mode='incremental', batch_size=1000)
+
+        engine = create_engine('sqlite:///' + os.path.join(self.tmp_dir.name, 'resume.db'))
+        with engine.connect() as connection:
+            entry = load_manifest(connection)[seed.LINE_DATA]
+        self.assertEqual((entry.last_batch, entry.row_count, entry.completed), (3, 3000, False))
+
+        with mock.patch.object(seed.BulkLoader, 'write', autospec=True,
+                               side_effect=seed.BulkLoader.write) as write:
+            self.seed_database('resume.db', create=False, mode='incremental', batch_size=1000)
+        written_tables = {call.args[1].name for call in write.call_args_list}
+        self.assertEqual(written_tables, {'lines'})
+        self.assertEqual(dump_tables(engine), expected)
+
+    def test_incremental_finishes_interrupted_post_load(self):
+        expected = dump_tables(self.seed_database('expected_post_load.db', mode='bulk'))
+        for step in ('run_clean_records', 'run_rebuild_stats'):
+            name = f'{step}.db'
+            with mock.patch.object(seed, step, side_effect=RuntimeError('connection lost')):
+                with self.assertRaises(RuntimeError):
+                    self.seed_database(name, mode='incremental')
+
+            with mock.patch.object(seed.BulkLoader, 'write') as write:
+                engine = self.seed_database(name, create=False, mode='incremental')
+            write.assert_not_called()
+            self.assertEqual(dump_tables(engine), expected, step)
+
+    def test_incremental_reloads_changed_file(self):
+        engine = self.seed_database('changed.db', mode='incremental')
+        with engine.connect() as connection:
+            version = load_corpus_version(connection).version
+
+        with tempfile.TemporaryDirectory() as corpus_path:
+            write_corpus(corpus_path)
+            line_path = os.path.join(corpus_path, seed.LINE_DATA)
+            with open(line_path, encoding='latin-1') as f:
+                corpus_lines = f.read().replace('They do not!', 'They do not.')
+            with open(line_path, 'w', encoding='latin-1') as f:
+                f.write(corpus_lines)
+
+            with mock.patch.object(seed.BulkLoader, 'write', autospec=True,
+                                   side_effect=seed.BulkLoader.write) as write:
+                self.seed_database('changed.db', corpus_path=corpus_path, create=False,
+                                   mode='incremental')
+
+        written_tables = {call.args[1].name for call in write.call_args_list}
+        self.assertEqual(written_tables, {'lines'})
+        engine = create_engine('sqlite:///' + os.path.join(self.tmp_dir.name, 'changed.db'))
+        with engine.connect() as connection:
+            text = connection.execute(select(Line.text).where(Line.id == 'L1045')).scalar()
+            self.assertEqual(text, 'They do not.')
+            num_lines = connection.execute(select(func.count()).select_from(Line)).scalar()
+            self.assertEqual(num_lines, 9051)
+            self.assertNotEqual(load_corpus_version(connection).version, version)
+            found = connection.execute(search_lines('sqlite', search_terms('they do not.'))).first()
+            self.assertEqual((found.id, found.text), ('L1045', 'They do not.'))
+
+    def test_incremental_reload_keeps_merged_characters(self):
+        dup_id, real_id = DUPLICATE_CHARACTER
+        engine = self.seed_database('merged.db', mode='incremental')
+
+        def swap_last_conversation_characters(rows):
+            first, second, *rest = rows[-1].split(DELIMITER)
+            return rows[:-1] + [DELIMITER.join([second, first, *rest])]
+
+        edits = (
+            (seed.LINE_DATA,
+             lambda rows: [row.replace('They do not!', 'They do not.') for row in rows]),
+            (seed.CONVERSATION_DATA, swap_last_conversation_characters),
+        )
+        with tempfile.TemporaryDirectory() as corpus_path:
+            write_corpus(corpus_path)
+            for file_name, edit in edits:
+                path = os.path.join(corpus_path, file_name)
+                with open(path, encoding='latin-1') as f:
+                    rows = f.readlines()
+                with open(path, 'w', encoding='latin-1') as f:
+                    f.writelines(edit(rows))
+
+                self.seed_database('merged.db', corpus_path=corpus_path, create=False,
+                                   mode='incremental')
+                with engine.connect() as connection:
+                    line_character = connection.execute(
+                        select(Line.character_id).where(Line.id == DUPLICATE_LINE)).scalar()
+                    conversation_character = connection.execute(
+                        select(Conversation.first_char_id)
+                        .where(Conversation.id == DUPLICATE_CONVERSATION)).scalar()
+                    orphans = connection.execute(
+                        select(func.count()).select_from(Line)
+                        .where(Line.character_id.notin_(select(Character.id)))
+                    ).scalar()
+                    duplicates = connection.execute(
+                        select(func.count()).where(Character.id == dup_id)).scalar()
+                self.assertEqual((line_character, conversation_character), (real_id, real_id))
+                self.assertEqual((orphans, duplicates), (0, 0), file_name)
+
+    def test_metrics_report(self):
+        for mode in ('orm', 'bulk'):
+            metrics = SeedMetrics()
+            self.seed_database(f'metrics_{mode}.db', mode=mode, metrics=metrics)
+            report = json.loads(metrics.to_json())
+
+            self.assertEqual(report['info']['mode'], mode)
+            self.assertGreater(report['statements'], 0)
+            steps = report['steps']
+            self.assertLessEqual({'movies', 'characters', 'conversations', 'lines', 'cleanup'},
+                                 set(steps))
+            self.assertEqual(steps['lines']['rows'], 9051)
+            self.assertEqual(steps['conversations']['rows'], 2554)
+            self.assertGreater(steps['lines']['rows_per_second'], 0)
+            self.assertGreater(steps['lines']['phases']['flush'], 0)
+            self.assertGreater(report['peak_rss_kib'], 0)
+            self.assertLessEqual(sum(step['rss_growth_kib'] for step in steps.values()),
+                                 report['peak_rss_kib'])
+
+            self.assertEqual(compare(report, report), [])
+            slower = json.loads(metrics.to_json())
+            slower['steps']['lines']['rows_per_second'] /= 2
+            slower['steps']['lines']['statements'] += 1
+            slower['peak_rss_kib'] *= 2
+            self.assertEqual(len(compare(slower, report)), 3)
+
+    def test_benchmark_without_baseline_fails(self):
+        report = {'info': {'mode': 'bulk'}, 'peak_rss_kib': 1, 'steps': {}}
+        baseline_path = os.path.join(self.tmp_dir.name, 'seed_baseline.json')
+        with mock.patch('benchmarks.seed.run_benchmark', return_value=report), \
+                mock.patch('sys.stdout'), mock.patch('sys.stderr'):
+            self.assertEqual(len(benchmark(baseline_path=baseline_path)), 1)
+            self.assertEqual(benchmark(baseline_path=baseline_path, update_baseline=True), [])
+            self.assertEqual(benchmark(baseline_path=baseline_path), [])
+
+    def test_parallel_parser_matches_prepare_data(self):
+        files = (
+            (seed.MOVIE_DATA, Movie.file_mapping),
+            (seed.CONVERSATION_DATA, Conversation.file_mapping),
+            (seed.LINE_DATA, Line.file_mapping),
+        )
+        with mock.patch.object(seed, 'CORPUS_PATH', self.corpus_path):
+            for file_name, fields in files:
+                expected = list(seed.prepare_data(file_name, fields))
+                batches = parallel_prepare_data(
+                    os.path.join(self.corpus_path, file_name), fields, workers=2, chunk_size=4096
+                )
+                self.assertEqual([row for batch in batches for row in batch], expected)
+
+
+class DedupeTestCase(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp_dir = tempfile.TemporaryDirectory()
+        cls.corpus_path = write_corpus(cls.tmp_dir.name)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tmp_dir.cleanup()
+
+    def setUp(self):
+        self.engine = create_engine('sqlite:///' + os.path.join(self.tmp_dir.name, 'dedupe.db'))
+        Base.metadata.drop_all(self.engine)
+        Base.metadata.create_all(self.engine)
+        with mock.patch.object(seed, 'CORPUS_PATH', self.corpus_path):
+            seed.bulk_main(self.engine)
+
+    def add_duplicate(self, connection, dup_id, real_id, num_lines):
+        real = connection.execute(select(Character.__table__).where(Character.id == real_id)).one()
+        connection.execute(Character.__table__.insert().values(dict(real._mapping, id=dup_id)))
+        line_ids = connection.execute(
+            select(Line.id).where(Line.character_id == real_id).order_by(Line.id).limit(num_lines)
+        ).scalars().all()
+        connection.execute(
+            Line.__table__.update().where(Line.id.in_(line_ids)).values(character_id=dup_id))
+        connection.execute(
+            Conversation.__table__.update()
+            .where(Conversation.first_char_id == real_id)
+            .values(first_char_id=dup_id)
+        )
+        connection.execute(convs_chars.update().where(convs_chars.c.character_id == real_id)
+                           .values(character_id=dup_id))
+
+    def count_statements(self, fn):
+        statements = []
+        def before_cursor_execute(*args):
+            statements.append(args[2])
+        event.listen(self.engine, 'before_cursor_execute', before_cursor_execute)
+        try:
+            with self.engine.begin() as connection:
+                report = fn(connection)
+        finally:
+            event.remove(self.engine, 'before_cursor_execute', before_cursor_execute)
+        return report, len(statements)
+
+    def test_dry_run(self):
+        with self.engine.begin() as connection:
+            self.add_duplicate(connection, 'u10000', 'u0', 10)
+        with self.engine.begin() as connection:
+            report = dedupe_characters(connection, dry_run=True)
+            self.assertEqual(report['duplicates'], {'u10000': 'u0'})
+            self.assertEqual(report['references']['lines'], 10)
+            duplicate = select(Character).where(Character.id == 'u10000')
+            self.assertIsNotNone(connection.execute(duplicate).first())
+
+    def test_dedupe_merges_references(self):
+        with self.engine.connect() as connection:
+            num_lines = connection.execute(
+                select(func.count()).where(Line.character_id == 'u0')).scalar()
+
+        with self.engine.begin() as connection:
+            self.add_duplicate(connection, 'u10000', 'u0', 1)
+        _, few_statements = self.count_statements(dedupe_characters)
+
+        with self.engine.begin() as connection:
+            self.add_duplicate(connection, 'u10000', 'u0', 100)
+            self.add_duplicate(connection, 'u10002', 'u2', 100)
+        report, many_statements = self.count_statements(dedupe_characters)
+
+        self.assertEqual(report['duplicates'], {'u10000': 'u0', 'u10002': 'u2'})
+        self.assertEqual(few_statements, many_statements)
+        with self.engine.connect() as connection:
+            dup_ids = ['u10000', 'u10002']
+            self.assertEqual(connection.execute(
+                select(func.count()).where(Character.id.in_(dup_ids))).scalar(), 0)
+            self.assertEqual(connection.execute(
+                select(func.count()).where(Line.character_id.in_(dup_ids))).scalar(), 0)
+            self.assertEqual(connection.execute(
+                select(func.count()).where(Conversation.first_char_id.in_(dup_ids))).scalar(), 0)
+            self.assertEqual(connection.execute(
+                select(func.count()).where(convs_chars.c.character_id.in_(dup_ids))).scalar(), 0)
+            self.assertEqual(connection.execute(
+                select(func.count()).where(Line.character_id == 'u0')).scalar(), num_lines)
+
+
+class LineConversationMapTestCase(unittest.TestCase):
+
+    def test_lookup(self):
+        expected = {f'L{n}': n // 3 + 1 for n in range(1000, 0, -1)}
+        expected.update({'L0': 7, 'L007': 8, 'X12': 9})
+
+        with mock.patch.object(linemap, 'RUN_SIZE', 64):
+            mapping = LineConversationMap()
+            for line_id, conv_id in expected.items():
+                mapping[line_id] = conv_id
+
+        for line_id, conv_id in expected.items():
+            self.assertEqual(mapping[line_id], conv_id)
+        self.assertNotIn('L1001', mapping)
+        with self.assertRaises(KeyError):
+            mapping['L5000']  # pylint: disable=pointless-statement
+
+    def test_conversation_id_over_32_bits(self):
+        mapping = LineConversationMap()
+        mapping['L1'] = 1
+        mapping['L2'] = 2
+        mapping['L2'] = 1 << 32
+        mapping['L3'] = (1 << 32) + 1
+        self.assertEqual([mapping[f'L{n}'] for n in (1, 2, 3)], [1, 1 << 32, (1 << 32) + 1])
+
+    def test_line_number_over_32_bits(self):
+        mapping = LineConversationMap()
+        mapping['L1'] = 1
+        mapping[f'L{1 << 32}'] = 2
+        mapping[f'L{1 << 40}'] = 3
+        self.assertEqual(mapping['L1'], 1)
+        self.assertEqual(mapping[f'L{1 << 32}'], 2)
+        self.assertEqual(mapping[f'L{1 << 40}'], 3)
+        self.assertNotIn(f'L{1 << 33}', mapping)
+
+    def test_last_assignment_wins(self):
+        mapping = LineConversationMap()
+        mapping['L1'] = 1
+        mapping['L2'] = 1
+        self.assertEqual(mapping['L1'], 1)
+        mapping['L1'] = 2
+        self.assertEqual(mapping['L1'], 2)
+        self.assertEqual(mapping.get('L2'), 1)
+
+
+class ParseListTestCase(unittest.TestCase):
+
+    def test_parse_list(self):
+        self.assertEqual(parse_list("['L194', 'L195', 'L196']"), ['L194', 'L195', 'L196'])
+        self.assertEqual(parse_list("['comedy']"), ['comedy'])
+        self.assertEqual(parse_list("[]"), [])
+        self.assertEqual(parse_list("[\"rock 'n' roll\", 'drama']"), ["rock 'n' roll", 'drama'])
+
+    def test_parse_list_malformed(self):
+        for value in ("'L1', 'L2'", "['L1', L2]", "['L1"):
+            with self.assertRaises(ValueError):
+                parse_list(value)
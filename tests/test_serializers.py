@@ -0,0 +1,36 @@
+import unittest
+
+from sqlalchemy import inspect
+
+from api import fdb
+from api.factory import create_app
+from api.serializers import serializer_for
+from config import TestingConfig
+from db.models import Character, Conversation, Genre, Line, Movie
+
+
+class SerializersTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.app = create_app(config=TestingConfig)
+        self.context = self.app.app_context()
+        self.context.push()
+
+    def tearDown(self):
+        self.context.pop()
+
+    def test_serializers_match_mapper_columns(self):
+        for model in (Character, Conversation, Genre, Line, Movie):
+            serializer = serializer_for(model)
+            self.assertIs(serializer, serializer_for(model))
+
+            objects = model.query.limit(20).all()
+            rows = fdb.session.execute(
+                serializer.select().where(model.id.in_([obj.id for obj in objects]))
+            ).all()
+            expected = [{c.key: getattr(obj, c.key) for c in inspect(obj).mapper.column_attrs}
+                        for obj in objects]
+
+            self.assertEqual([serializer(obj) for obj in objects], expected, model.__name__)
+            self.assertCountEqual([serializer.from_row(row) for row in rows], expected,
+                                  model.__name__)
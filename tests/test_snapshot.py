@@ -0,0 +1,131 @@
+import json
+import os
+import tempfile
+import unittest
+
+from api import fdb
+from api.factory import create_app
+from api.instrument import QUERY_COUNT_HEADER
+from config import API_BASE_PATH, TestingConfig
+from db.corpus import Corpus
+from db.snapshot_file import open_snapshot, write_snapshot
+
+
+class SnapshotConfig(TestingConfig):
+    SNAPSHOT_MODE = True
+
+
+URLS = (
+    '/characters/u0',
+    '/characters/u0?fields=name&include=conversations,lines',
+    '/characters/unknown',
+    '/characters?ids=u5,u0,unknown',
+    '/characters?ids=u5,u0&include=lines',
+    '/conversations/1',
+    '/conversations/1?include=characters,lines',
+    '/conversations/999999',
+    '/conversations?ids=3,1,999999&include=lines',
+    '/conversations/1/lines',
+    '/conversations/1/lines?stream=1',
+    '/conversations/999999/lines',
+    '/genres/1',
+    '/genres/999',
+    '/lines/L1045',
+    '/lines/unknown',
+    '/lines?ids=L1045,L985,unknown',
+    '/movies/m0',
+    '/movies/m0?fields=title,year',
+    '/movies/m0?include=genres,characters',
+    '/movies/unknown',
+    '/movies/m0/lines',
+    '/movies/m3/lines?stream=1',
+    '/movies/unknown/lines',
+    '/movies',
+    '/movies?start=3&limit=4',
+    '/movies?start=15&limit=10&include=genres',
+    '/movies?start=100',
+    '/movies?ids=m3,m1,unknown',
+    '/movies?after=&limit=3&count=exact',
+    '/movies?after=&limit=50&count=estimate&include=conversations',
+)
+# Routes that use the database in snapshot mode too, in the order of the
+# requests: the graph index is built on the first graph request
+DATABASE_URLS = (
+    '/search/lines?q=love',
+    '/stats/movies/m0',
+    '/stats/genres',
+    '/movies/m0/graph',
+    '/sample/lines?n=3&seed=1',
+    '/sample/conversations?n=3&seed=1',
+)
+
+
+class SnapshotTestCase(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp_dir = tempfile.TemporaryDirectory()
+        cls.snapshot_path = os.path.join(cls.tmp_dir.name, 'corpus.snapshot')
+        cls.sql_app = create_app(config=TestingConfig)
+        with cls.sql_app.app_context(), fdb.engine.connect() as connection:
+            write_snapshot(Corpus.load(connection), cls.snapshot_path)
+
+        class SnapshotFileConfig(TestingConfig):
+            SNAPSHOT_PATH = cls.snapshot_path
+
+        cls.snapshot_file_config = SnapshotFileConfig
+        cls.snapshot_app = create_app(config=SnapshotConfig)
+        cls.snapshot_file_app = create_app(config=SnapshotFileConfig)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tmp_dir.cleanup()
+
+    def test_responses_match_sql(self):
+        sql_client = self.sql_app.test_client()
+        for app in (self.snapshot_app, self.snapshot_file_app):
+            snapshot_client = app.test_client()
+            for url in URLS:
+                expected = sql_client.get(API_BASE_PATH + url)
+                response = snapshot_client.get(API_BASE_PATH + url)
+                self.assertEqual(response.status_code, expected.status_code, url)
+                self.assertEqual(response.get_data(), expected.get_data(), url)
+                self.assertEqual(response.get_etag(), expected.get_etag(), url)
+                self.assertEqual(int(response.headers[QUERY_COUNT_HEADER]), 0, url)
+
+    def test_database_routes(self):
+        for config in (SnapshotConfig, self.snapshot_file_config):
+            client = create_app(config=config).test_client()
+            for url in DATABASE_URLS:
+                response = client.get(API_BASE_PATH + url)
+                self.assertEqual(response.status_code, 200, url)
+                self.assertGreater(int(response.headers[QUERY_COUNT_HEADER]), 0, url)
+
+    def test_snapshot_file_matches_corpus(self):
+        with self.sql_app.app_context(), fdb.engine.connect() as connection:
+            corpus = Corpus.load(connection)
+        mapped = open_snapshot(self.snapshot_path)
+        self.assertEqual(mapped.version, tuple(corpus.version))
+        for model, table in corpus.tables.items():
+            mapped_table = mapped.tables[model]
+            self.assertEqual(len(mapped_table), len(table))
+            self.assertEqual([mapped_table.record(row) for row in range(len(table))],
+                             [table.record(row) for row in range(len(table))])
+            self.assertEqual(list(mapped_table.rows_by_id()), list(table.rows_by_id()))
+            for row in (0, len(table) - 1):
+                self.assertEqual(mapped_table.index.get(table.ids[row]), row)
+            self.assertIsNone(mapped_table.index.get('unknown'))
+        for key, relation in corpus.relations.items():
+            self.assertEqual(list(mapped.relations[key].offsets), list(relation.offsets))
+            self.assertEqual(list(mapped.relations[key].targets), list(relation.targets))
+
+    def test_cursor_pages_match_sql(self):
+        for app in (self.sql_app, self.snapshot_app, self.snapshot_file_app):
+            client = app.test_client()
+            url, ids = f'{API_BASE_PATH}/movies?after=&limit=3', []
+            while url:
+                response_data = json.loads(client.get(url).get_data())
+                ids.extend(m['id'] for m in response_data['results'])
+                url = response_data['links'].get('next')
+            self.assertEqual(ids, sorted(ids))
+            self.assertEqual(len(ids), 20)
@@ -0,0 +1,94 @@
+import json
+import unittest
+
+from sqlalchemy import event, func, select
+
+from api import fdb
+from api.factory import create_app
+from config import API_BASE_PATH, TestingConfig
+from db.models import Line
+
+
+class StatsTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.app = create_app(config=TestingConfig)
+        self.client = self.app.test_client()
+
+    def get_json(self, url):
+        response = self.client.get(f'{API_BASE_PATH}{url}')
+        self.assertEqual(response.status_code, 200)
+        return json.loads(response.get_data())
+
+    def statements(self, url):
+        statements = []
+        def before_cursor_execute(*args):
+            statements.append(args[2])
+        with self.app.app_context():
+            engine = fdb.engine
+        event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+        try:
+            self.client.get(f'{API_BASE_PATH}{url}')
+        finally:
+            event.remove(engine, 'before_cursor_execute', before_cursor_execute)
+        return statements
+
+    def test_movie_stats(self):
+        movie = self.get_json('/movies/m0')
+        lines = self.get_json('/movies/m0/lines')
+        stats = self.get_json('/stats/movies/m0')
+        self.assertEqual(stats, {
+            'movie_id': 'm0',
+            'characters': len(movie['characters']),
+            'conversations': len(movie['conversations']),
+            'lines': len(lines),
+            'words': sum(len(line['text'].split()) for line in lines),
+        })
+
+    def test_movie_stats_404(self):
+        response = self.client.get(f'{API_BASE_PATH}/stats/movies/unknown')
+        self.assertEqual(response.status_code, 404)
+
+    def test_character_stats(self):
+        stats = self.get_json('/stats/characters/u0')
+        with self.app.app_context():
+            texts = fdb.session.execute(
+                select(Line.text).where(Line.character_id == 'u0')).scalars().all()
+        self.assertEqual(stats['lines'], len(texts))
+        self.assertEqual(stats['words'], sum(len(text.split()) for text in texts))
+        character = self.get_json('/characters/u0?include=conversations')
+        self.assertEqual(stats['conversations'], len(character['conversations']))
+        self.assertEqual(stats['partners'], len(stats['pairs']))
+        self.assertEqual(stats['pairs'][0], {'partner_id': 'u2', 'conversations': 25, 'lines': 69})
+        conversations = [pair['conversations'] for pair in stats['pairs']]
+        self.assertEqual(conversations, sorted(conversations, reverse=True))
+
+        partner = self.get_json('/stats/characters/u2')
+        self.assertIn({'partner_id': 'u0', 'conversations': 25, 'lines': 69}, partner['pairs'])
+
+    def test_genre_stats(self):
+        movies = self.get_json('/movies?limit=100&include=genres')['results']
+        stats = self.get_json('/stats/genres')
+        names = [genre['name'] for genre in stats]
+        self.assertEqual(names, sorted(names))
+        for genre in stats:
+            self.assertEqual(genre['movies'],
+                             sum(genre['name'] in movie['genres'] for movie in movies))
+        with self.app.app_context():
+            total_lines = fdb.session.execute(select(func.count()).select_from(Line)).scalar()
+        drama = next(genre for genre in stats if genre['name'] == 'drama')
+        self.assertLess(drama['lines'], total_lines)
+
+    def test_year_stats(self):
+        movies = self.get_json('/movies?limit=100&fields=year')['results']
+        stats = self.get_json('/stats/years')
+        self.assertEqual(sum(year['movies'] for year in stats), len(movies))
+        self.assertEqual([year['year'] for year in stats], sorted(year['year'] for year in stats))
+
+    def test_no_aggregation_at_request_time(self):
+        for url in ('/stats/movies/m0', '/stats/characters/u0', '/stats/genres', '/stats/years'):
+            statements = self.statements(url)
+            self.assertTrue(statements, url)
+            for statement in statements:
+                self.assertNotIn('GROUP BY', statement.upper(), url)
+                self.assertNotIn('COUNT(', statement.upper(), url)